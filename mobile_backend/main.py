@@ -19,9 +19,15 @@ import uvicorn
 # Import from existing restaurant_billing modules
 import sys
 sys.path.append(str(Path(__file__).parent.parent))
-from restaurant_billing.db import get_conn, list_menu_items, create_order, get_order_by_invoice, list_open_orders, mark_order_paid
+from restaurant_billing.db import (
+	list_menu_items, create_order, get_order_by_invoice, list_open_orders, mark_order_paid,
+	add_menu_item, update_menu_item, delete_menu_item, get_pool_stats, get_lock_stats,
+)
+from restaurant_billing.async_db import run_db, get_async_db, shutdown_async_db
 from restaurant_billing.auth import get_user, verify_password, user_can
+from restaurant_billing.cart import Cart
 from restaurant_billing.config import CONFIG
+from restaurant_billing.kot import send_kot
 
 app = FastAPI(title="HUNGER Restaurant Mobile API", version="1.0.0")
 
@@ -71,6 +77,10 @@ class ConnectionManager:
 
 manager = ConnectionManager()
 
+@app.on_event("shutdown")
+def _shutdown_db_executor():
+	shutdown_async_db()
+
 # Pydantic models
 class LoginRequest(BaseModel):
     username: str
@@ -134,10 +144,17 @@ def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
         )
 
 # API Endpoints
+def _authenticate(username: str, password: str) -> Optional[dict]:
+	user = get_user(username)
+	if not user or not verify_password(username, password):
+		return None
+	return user
+
 @app.post("/api/auth/login", response_model=TokenResponse)
 async def login(request: LoginRequest):
-    user = get_user(request.username)
-    if not user or not verify_password(request.username, request.password):
+    # Password hashing is deliberately slow; keep it off the event loop too
+    user = await run_db(_authenticate, request.username, request.password)
+    if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -162,90 +179,63 @@ async def login(request: LoginRequest):
 
 @app.get("/api/menu")
 async def get_menu(token_data: dict = Depends(verify_token)):
-	return list_menu_items()
+	return await run_db(list_menu_items)
 
 @app.post("/api/menu")
 async def create_menu_item(req: MenuUpsert, token_data: dict = Depends(verify_token)):
 	if token_data.get("role") not in ("ADMIN", "SUPER_ADMIN"):
 		raise HTTPException(status_code=403, detail="Insufficient permissions")
-	with get_conn() as conn:
-		cur = conn.execute(
-			"""
-			INSERT INTO MenuItems(name, price, category, gst_slab, hsn_code, food_type)
-			VALUES(?,?,?,?,?,?)
-			""",
-			(req.name, req.price, req.category, req.gst_slab, req.hsn_code, req.food_type)
-		)
-		item_id = cur.lastrowid
+	item_id = await run_db(add_menu_item, req.name, req.price, req.category, req.gst_slab, req.hsn_code, req.food_type)
 	await manager.broadcast(json.dumps({"type": "menu_updated", "action": "create", "id": item_id}))
 	return {"id": item_id}
 
 @app.put("/api/menu/{item_id}")
-async def update_menu_item(item_id: int, req: MenuUpsert, token_data: dict = Depends(verify_token)):
+async def edit_menu_item(item_id: int, req: MenuUpsert, token_data: dict = Depends(verify_token)):
 	if token_data.get("role") not in ("ADMIN", "SUPER_ADMIN"):
 		raise HTTPException(status_code=403, detail="Insufficient permissions")
-	with get_conn() as conn:
-		cur = conn.execute(
-			"""
-			UPDATE MenuItems SET name=?, price=?, category=?, gst_slab=?, hsn_code=?, food_type=?
-			WHERE id=?
-			""",
-			(req.name, req.price, req.category, req.gst_slab, req.hsn_code, req.food_type, item_id)
-		)
-		if cur.rowcount == 0:
-			raise HTTPException(status_code=404, detail="Menu item not found")
+	if not await run_db(update_menu_item, item_id, req.name, req.price, req.category, req.gst_slab, req.hsn_code, req.food_type):
+		raise HTTPException(status_code=404, detail="Menu item not found")
 	await manager.broadcast(json.dumps({"type": "menu_updated", "action": "update", "id": item_id}))
 	return {"ok": True}
 
 @app.delete("/api/menu/{item_id}")
-async def delete_menu_item(item_id: int, token_data: dict = Depends(verify_token)):
+async def remove_menu_item(item_id: int, token_data: dict = Depends(verify_token)):
 	if token_data.get("role") not in ("ADMIN", "SUPER_ADMIN"):
 		raise HTTPException(status_code=403, detail="Insufficient permissions")
-	with get_conn() as conn:
-		cur = conn.execute("DELETE FROM MenuItems WHERE id=?", (item_id,))
-		if cur.rowcount == 0:
-			raise HTTPException(status_code=404, detail="Menu item not found")
+	if not await run_db(delete_menu_item, item_id):
+		raise HTTPException(status_code=404, detail="Menu item not found")
 	await manager.broadcast(json.dumps({"type": "menu_updated", "action": "delete", "id": item_id}))
 	return {"ok": True}
 
 @app.get("/api/orders/open")
 async def get_open_orders(token_data: dict = Depends(verify_token)):
-    return list_open_orders()
+    return await run_db(list_open_orders)
+
+def _place_order(request: CreateOrderRequest) -> str:
+	# Same tax rules as the desktop order screen; repeated items merge into one line
+	cart = Cart(service_charge_percent=CONFIG.default_service_charge_percent, gst_enabled=CONFIG.gst_enabled)
+	for item in request.items:
+		cart.add(item.id, item.name, item.rate, item.gst_slab, item.hsn_code, item.quantity)
+	invoice_number = create_order(
+		table_number=request.table_number,
+		customer_name=request.customer_name,
+		customer_gstin=request.customer_gstin,
+		place_of_supply=request.place_of_supply,
+		totals=cart.totals(),
+		items=cart.items(),
+	)
+	if CONFIG.kot_enabled:
+		# Tickets are queued in the shared database; the desktop app's spooler prints them.
+		# The order is already committed: a ticket failure must not make the client resubmit it
+		try:
+			send_kot(invoice_number)
+		except Exception as e:
+			print(f"[WARNING] Could not queue kitchen tickets for {invoice_number}: {e}")
+	return invoice_number
 
 @app.post("/api/orders")
 async def create_new_order(request: CreateOrderRequest, token_data: dict = Depends(verify_token)):
-    # Calculate totals (simplified - would need proper GST calculation)
-    subtotal = sum(item.rate * item.quantity for item in request.items)
-    totals = {
-        "subtotal": subtotal,
-        "service_charge": 0.0,
-        "cgst": 0.0,
-        "sgst": 0.0,
-        "igst": 0.0,
-        "total": subtotal,
-        "hsn_breakdown": {}
-    }
-    
-    # Convert to dict format expected by create_order
-    items_dict = []
-    for item in request.items:
-        items_dict.append({
-            "id": item.id,
-            "name": item.name,
-            "rate": item.rate,
-            "gst_slab": item.gst_slab,
-            "hsn_code": item.hsn_code,
-            "quantity": item.quantity
-        })
-    
-    invoice_number = create_order(
-        table_number=request.table_number,
-        customer_name=request.customer_name,
-        customer_gstin=request.customer_gstin,
-        place_of_supply=request.place_of_supply,
-        totals=totals,
-        items=items_dict
-    )
+    invoice_number = await run_db(_place_order, request)
     
     # Broadcast order creation
     await manager.broadcast(json.dumps({
@@ -262,7 +252,7 @@ async def mark_order_as_paid(invoice_number: str, token_data: dict = Depends(ver
     if not user_can({"role": token_data["role"]}, "checkout_bill"):
         raise HTTPException(status_code=403, detail="Insufficient permissions")
     
-    success = mark_order_paid(invoice_number)
+    success = await run_db(mark_order_paid, invoice_number)
     if not success:
         raise HTTPException(status_code=404, detail="Order not found")
     
@@ -280,12 +270,18 @@ async def get_order_details(invoice_number: str, token_data: dict = Depends(veri
     if not user_can({"role": token_data["role"]}, "lookup_bill"):
         raise HTTPException(status_code=403, detail="Insufficient permissions")
     
-    order = get_order_by_invoice(invoice_number)
+    order = await run_db(get_order_by_invoice, invoice_number)
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     
     return order
 
+@app.get("/api/admin/db-stats")
+async def get_db_stats(token_data: dict = Depends(verify_token)):
+	if token_data.get("role") not in ("ADMIN", "SUPER_ADMIN"):
+		raise HTTPException(status_code=403, detail="Insufficient permissions")
+	return {"pool": get_pool_stats(), "locks": get_lock_stats(), "async": get_async_db().stats()}
+
 # WebSocket endpoint
 @app.websocket("/ws/{user_id}")
 async def websocket_endpoint(websocket: WebSocket, user_id: str):
@@ -6,5 +6,21 @@ __all__ = [
 	"invoice",
 	"payments",
 	"printing",
+	"receipt",
+	"restaurant_profile",
 	"config",
+	"maintenance",
+	"migrations",
+	"archive",
+	"async_db",
+	"cart",
+	"einvoice_batch",
+	"gst_audit",
+	"gst_returns",
+	"invoice_regen",
+	"invoice_store",
+	"kot",
+	"printer_connections",
+	"raster_cache",
+	"spooler",
 ]
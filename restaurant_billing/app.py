@@ -12,10 +12,12 @@ except ImportError:
     print("Warning: PIL (Pillow) not available. Logo functionality will be disabled.")
 
 from .config import CONFIG
-from .db import init_db, get_order_by_invoice, list_menu_items, create_order, list_open_orders, mark_order_paid
+from .db import init_db, get_order_by_invoice, list_menu_items, create_order, add_order_items, list_open_orders, mark_order_paid
 from .auth import verify_password, get_user, seed_super_admin, user_can, A_MANAGE_USERS, A_MANAGE_MENU, A_VIEW_REPORTS, A_CREATE_ORDER, A_CHECKOUT_BILL, A_CONFIGURE_SETTINGS, A_LOOKUP_BILL
 from .telegram_bot import send_message
-from .gst import compute_gst_for_order_items
+from .cart import Cart
+from .restaurant_profile import get_restaurant_profile
+from .spooler import enqueue_invoice_print, start_spooler, stop_spooler, print_job_counts
 from .utils import format_currency_inr
 from .payments import generate_upi_qr, tk_image_from_path
 from .updater import run_update, check_and_notify_updates, get_update_settings, save_update_settings
@@ -74,7 +76,7 @@ class RestaurantApp(tk.Tk):
 		self._set_window_icon(logo_path)
 		self._enter_fullscreen(CONFIG.fullscreen)
 		self.current_user = None
-		self.cart_items = []
+		self.cart = Cart(service_charge_percent=CONFIG.default_service_charge_percent, gst_enabled=CONFIG.gst_enabled)
 		self._login_flow()
 		self._build_ui(logo_path)
 		self._apply_permissions()
@@ -136,10 +138,13 @@ class RestaurantApp(tk.Tk):
 			logo_lbl.pack(side="left", padx=(0, 8))
 		except Exception:
 			pass
-		title_lbl = ttk.Label(header, text=CONFIG.restaurant_legal_name, font=("Segoe UI", 18, "bold"))
+		title_lbl = ttk.Label(header, text=get_restaurant_profile().name, font=("Segoe UI", 18, "bold"))
 		title_lbl.pack(side="left")
 		user_lbl = ttk.Label(header, text=f"User: {self.current_user['full_name']} ({self.current_user['role']})")
 		user_lbl.pack(side="right")
+		self.print_status_lbl = ttk.Label(header, text="")
+		self.print_status_lbl.pack(side="right", padx=12)
+		self._refresh_print_status()
 
 		toolbar = ttk.Frame(root)
 		toolbar.pack(fill="x", padx=12, pady=(0,8))
@@ -159,6 +164,8 @@ class RestaurantApp(tk.Tk):
 		self.btn_print.pack(side="left", padx=4)
 		self.btn_printer_config = ttk.Button(toolbar, text="Printer Config", command=self._open_printer_config)
 		self.btn_printer_config.pack(side="left", padx=4)
+		self.btn_print_queue = ttk.Button(toolbar, text="Print Queue", command=self._open_print_queue)
+		self.btn_print_queue.pack(side="left", padx=4)
 		self.btn_lookup = ttk.Button(toolbar, text="Find Bill", command=self._lookup_bill)
 		self.btn_lookup.pack(side="left", padx=4)
 		self.btn_settings = ttk.Button(toolbar, text="Settings", command=self._open_settings)
@@ -260,7 +267,7 @@ class RestaurantApp(tk.Tk):
 		# Cart
 		cart_frame = ttk.LabelFrame(right, text="Cart")
 		cart_frame.pack(fill="y", padx=6, pady=6)
-		self.cart_items: list = []
+		self.cart = Cart(service_charge_percent=CONFIG.default_service_charge_percent, gst_enabled=CONFIG.gst_enabled)
 		self.cart_list = tk.Listbox(cart_frame, height=10, width=36)
 		self.cart_list.pack(padx=6, pady=6)
 		qty_var = tk.StringVar(value="1")
@@ -268,6 +275,10 @@ class RestaurantApp(tk.Tk):
 		qty_entry.pack(padx=6)
 		add_btn = ttk.Button(cart_frame, text="Add", command=lambda: self._add_to_cart(qty_var))
 		add_btn.pack(pady=4)
+		set_qty_btn = ttk.Button(cart_frame, text="Set Qty", command=lambda: self._set_cart_quantity(qty_var))
+		set_qty_btn.pack(pady=4)
+		remove_btn = ttk.Button(cart_frame, text="Remove", command=self._remove_from_cart)
+		remove_btn.pack(pady=4)
 
 		# Table and totals
 		meta = ttk.LabelFrame(right, text="Details")
@@ -286,6 +297,9 @@ class RestaurantApp(tk.Tk):
 		save_btn = ttk.Button(meta, text="Save Order", command=self._save_order)
 		save_btn.pack(padx=6, pady=6)
 		self._update_save_enabled(save_btn)
+		add_on_btn = ttk.Button(meta, text="Add to Table", command=self._add_to_open_order)
+		add_on_btn.pack(padx=6, pady=(0,6))
+		self._update_save_enabled(add_on_btn)
 
 	def _update_save_enabled(self, btn: ttk.Button):
 		allowed = user_can(self.current_user, A_CREATE_ORDER)
@@ -302,28 +316,64 @@ class RestaurantApp(tk.Tk):
 			qty = int(qty_var.get() or "1")
 		except ValueError:
 			qty = 1
-		entry = {"id": item_id, "name": name, "rate": float(price), "gst_slab": float(gst_slab), "hsn_code": hsn, "quantity": qty}
-		self.cart_items.append(entry)
-		self.cart_list.insert(tk.END, f"{name} x{qty} @ {price}")
+		new_line = item_id not in self.cart
+		line = self.cart.add(item_id, name, float(price), float(gst_slab), hsn, qty)
+		self._show_cart_line(line, new_line)
 		self._recalc_totals()
 
-	def _collect_items_dict(self):
-		items = {}
-		for it in self.cart_items:
-			items[it["name"]] = {"quantity": it["quantity"], "rate": it["rate"], "gst_slab": it["gst_slab"], "hsn_code": it["hsn_code"]}
-		return items
+	def _cart_position(self, item_id: int) -> int:
+		return [l.item_id for l in self.cart].index(item_id)
+
+	def _show_cart_line(self, line, new_line: bool) -> None:
+		text = f"{line.name} x{line.quantity} @ {format_currency_inr(line.rate / 100)}"
+		if new_line:
+			self.cart_list.insert(tk.END, text)
+		else:
+			pos = self._cart_position(line.item_id)
+			self.cart_list.delete(pos)
+			self.cart_list.insert(pos, text)
+
+	def _selected_cart_item(self):
+		selection = self.cart_list.curselection()
+		if not selection:
+			return None
+		return [l.item_id for l in self.cart][selection[0]]
+
+	def _set_cart_quantity(self, qty_var: tk.StringVar):
+		item_id = self._selected_cart_item()
+		if item_id is None:
+			return
+		try:
+			qty = int(qty_var.get() or "1")
+		except ValueError:
+			return
+		if qty <= 0:
+			self._remove_from_cart()
+			return
+		self._show_cart_line(self.cart.set_quantity(item_id, qty), False)
+		self._recalc_totals()
+
+	def _remove_from_cart(self):
+		item_id = self._selected_cart_item()
+		if item_id is None:
+			return
+		self.cart_list.delete(self._cart_position(item_id))
+		self.cart.remove(item_id)
+		self._recalc_totals()
 
 	def _recalc_totals(self):
 		try:
 			service_pct = float(self.service_var.get() or 0)
 		except ValueError:
 			service_pct = 0.0
-		res = compute_gst_for_order_items(self._collect_items_dict(), intra_state=True, service_charge_percent=service_pct)
+		# The cart keeps running totals; only the service charge percentage may have changed
+		self.cart.set_service_charge_percent(service_pct)
+		res = self.cart.totals()
 		self._last_totals = res
 		self.totals_var.set(f"Subtotal: {format_currency_inr(res['subtotal'])} | CGST: {format_currency_inr(res['cgst'])} | SGST: {format_currency_inr(res['sgst'])} | Total: {format_currency_inr(res['total'])}")
 
 	def _save_order(self):
-		if not self.cart_items:
+		if not len(self.cart):
 			messagebox.showwarning("Empty", "No items in cart")
 			return
 		try:
@@ -335,10 +385,11 @@ class RestaurantApp(tk.Tk):
 			customer_name=None,
 			customer_gstin=None,
 			place_of_supply=None,
-			totals=self._last_totals,
-			items=self.cart_items,
+			totals=self.cart.totals(),
+			items=self.cart.items(),
 			status='OPEN',
 		)
+		self._send_kot(invoice)
 		try:
 			from .invoice import save_invoice_text
 			from .einvoice import save_einvoice_json
@@ -353,22 +404,119 @@ class RestaurantApp(tk.Tk):
 			self._last_invoice = invoice
 			messagebox.showinfo("Saved", f"Order saved. Invoice: {invoice}")
 
+	def _send_kot(self, invoice: str) -> None:
+		if not CONFIG.kot_enabled:
+			return
+		try:
+			from .kot import send_kot
+			send_kot(invoice)
+		except Exception as e:
+			print(f"[WARNING] Could not queue kitchen tickets for {invoice}: {e}")
+
+	def _add_to_open_order(self):
+		if not len(self.cart):
+			messagebox.showwarning("Empty", "No items in cart")
+			return
+		try:
+			table_no = int(self.table_var.get() or "1")
+		except ValueError:
+			table_no = 1
+		# The table's most recent open order gets the add-ons
+		orders = [o for o in list_open_orders() if o["table_number"] == table_no]
+		if not orders:
+			messagebox.showwarning("No Open Order", f"Table {table_no} has no open order. Use Save Order.")
+			return
+		invoice = max(orders, key=lambda o: o["invoice_date"])["invoice_number"]
+		if not add_order_items(invoice, self.cart.items()):
+			messagebox.showerror("Error", f"Order {invoice} is no longer open.")
+			return
+		self._send_kot(invoice)
+		self._last_invoice = invoice
+		self.cart.clear()
+		self.cart_list.delete(0, tk.END)
+		self._recalc_totals()
+		messagebox.showinfo("Saved", f"Items added to table {table_no} (invoice {invoice}).")
+
 	def _print_last_invoice(self):
 		if not getattr(self, "_last_invoice", None):
 			messagebox.showwarning("No Invoice", "Save an order first.")
 			return
 		try:
-			from .printing_fixed import print_invoice_full_width, configure_printer_for_full_width
-			# Configure printer for full-width printing
-			configure_printer_for_full_width()
-			# Print with full-width formatting
-			success = print_invoice_full_width(self._last_invoice)
-			if success:
-				messagebox.showinfo("Print", f"Invoice printed successfully with full-width formatting!")
-			else:
-				messagebox.showwarning("Print", f"Printing may have failed. Check printer connection.")
+			# The spooler prints in the background (full width) and retries while the printer is offline
+			enqueue_invoice_print(self._last_invoice)
+			self._refresh_print_status()
 		except Exception as e:
-			messagebox.showerror("Print", f"Failed: {e}")
+			messagebox.showerror("Print", f"Failed to queue invoice: {e}")
+
+	def _refresh_print_status(self, repeat: bool = True):
+		try:
+			counts = print_job_counts()
+			waiting = counts["QUEUED"] + counts["PRINTING"]
+			text = f"Print queue: {waiting} waiting" + (f", {counts['FAILED']} failed" if counts["FAILED"] else "")
+		except Exception:
+			text = ""
+		self.print_status_lbl.configure(text=text)
+		if repeat:
+			self.after(2000, self._refresh_print_status)
+
+	def _open_print_queue(self):
+		from .spooler import cancel_print_job, list_print_jobs, retry_print_job
+
+		win = tk.Toplevel(self)
+		win.title("Print Queue")
+		cols = ("job", "printer", "document", "status", "attempts", "error")
+		tree = ttk.Treeview(win, columns=cols, show="headings", height=14)
+		for c in cols:
+			tree.heading(c, text=c.upper())
+		tree.pack(fill="both", expand=True, padx=6, pady=6)
+
+		def refresh():
+			for item in tree.get_children():
+				tree.delete(item)
+			for job in list_print_jobs():
+				document = job["payload"].get("invoice_number", job["kind"])
+				tree.insert("", "end", iid=str(job["job_id"]), values=(
+					job["job_id"], job["printer"], document, job["status"], job["attempts"], job["last_error"] or ""
+				))
+			self._refresh_print_status(repeat=False)
+
+		def selected_job():
+			selection = tree.selection()
+			if not selection:
+				messagebox.showwarning("No Selection", "Select a print job.", parent=win)
+				return None
+			return int(selection[0])
+
+		def retry():
+			job_id = selected_job()
+			if job_id is not None and not retry_print_job(job_id):
+				messagebox.showinfo("Print Queue", "Only FAILED jobs can be retried.", parent=win)
+			refresh()
+
+		def cancel():
+			job_id = selected_job()
+			if job_id is not None and not cancel_print_job(job_id):
+				messagebox.showinfo("Print Queue", "Only QUEUED or FAILED jobs can be cancelled.", parent=win)
+			refresh()
+
+		from .printer_connections import printer_connection_stats
+		stats_lbl = ttk.Label(win, text="")
+		stats_lbl.pack(fill="x", padx=6)
+
+		def refresh_stats():
+			stats_lbl.configure(text="\n".join(
+				f"{name}: {s['jobs']} jobs, avg send {s['avg_send_ms']:.1f} ms, max {s['max_send_ms']:.1f} ms, "
+				f"{s['errors']} errors, {s['reconnects']} reconnects" + (f" (last: {s['last_error']})" if s["last_error"] else "")
+				for name, s in printer_connection_stats().items()
+			))
+
+		btn_frame = ttk.Frame(win)
+		btn_frame.pack(fill="x", padx=6, pady=6)
+		ttk.Button(btn_frame, text="Refresh", command=lambda: (refresh(), refresh_stats())).pack(side="left", padx=4)
+		ttk.Button(btn_frame, text="Retry", command=retry).pack(side="left", padx=4)
+		ttk.Button(btn_frame, text="Cancel", command=cancel).pack(side="left", padx=4)
+		refresh()
+		refresh_stats()
 
 	def _open_printer_config(self):
 		"""Open printer configuration dialog"""
@@ -420,6 +568,11 @@ class RestaurantApp(tk.Tk):
 			return
 		invoice = selection[0]
 		if mark_order_paid(invoice):
+			if CONFIG.print_on_checkout:
+				try:
+					enqueue_invoice_print(invoice)
+				except Exception as e:
+					print(f"[WARNING] Could not queue receipt for {invoice}: {e}")
 			messagebox.showinfo("Success", f"Order {invoice} marked as PAID.")
 			self._refresh_orders()
 		else:
@@ -467,19 +620,15 @@ class RestaurantApp(tk.Tk):
 		dlg = MenuItemDialog(self, "Add Menu Item")
 		if dlg.result:
 			try:
-				from .db import get_conn
-				with get_conn() as conn:
-					conn.execute(
-						"INSERT INTO MenuItems (name, price, category, gst_slab, hsn_code, food_type) VALUES (?, ?, ?, ?, ?, ?)",
-						(
-							dlg.result["name"],
-							float(dlg.result["price"]),
-							dlg.result["category"],
-							float(dlg.result["gst"]),
-							dlg.result["hsn"],
-							dlg.result["type"]
-						)
-					)
+				from .db import add_menu_item
+				add_menu_item(
+					dlg.result["name"],
+					float(dlg.result["price"]),
+					dlg.result["category"],
+					float(dlg.result["gst"]),
+					dlg.result["hsn"],
+					dlg.result["type"]
+				)
 				messagebox.showinfo("Success", "Menu item added successfully!")
 				self._refresh_menu_mgmt()
 			except Exception as e:
@@ -513,19 +662,16 @@ class RestaurantApp(tk.Tk):
 		dlg = MenuItemDialog(self, "Edit Menu Item", current_data)
 		if dlg.result:
 			try:
-				with get_conn() as conn:
-					conn.execute(
-						"UPDATE MenuItems SET name=?, price=?, category=?, gst_slab=?, hsn_code=?, food_type=? WHERE id=?",
-						(
-							dlg.result["name"],
-							float(dlg.result["price"]),
-							dlg.result["category"],
-							float(dlg.result["gst"]),
-							dlg.result["hsn"],
-							dlg.result["type"],
-							item_id
-						)
-					)
+				from .db import update_menu_item
+				update_menu_item(
+					item_id,
+					dlg.result["name"],
+					float(dlg.result["price"]),
+					dlg.result["category"],
+					float(dlg.result["gst"]),
+					dlg.result["hsn"],
+					dlg.result["type"]
+				)
 				messagebox.showinfo("Success", "Menu item updated successfully!")
 				self._refresh_menu_mgmt()
 			except Exception as e:
@@ -551,8 +697,8 @@ class RestaurantApp(tk.Tk):
 		# Confirm deletion
 		if messagebox.askyesno("Confirm Delete", f"Are you sure you want to delete '{item_name}'?"):
 			try:
-				with get_conn() as conn:
-					conn.execute("DELETE FROM MenuItems WHERE id = ?", (item_id,))
+				from .db import delete_menu_item
+				delete_menu_item(item_id)
 				messagebox.showinfo("Success", "Menu item deleted successfully!")
 				self._refresh_menu_mgmt()
 			except Exception as e:
@@ -809,7 +955,7 @@ class MenuItemDialog(simpledialog.Dialog):
 		wrap.pack(fill="both", expand=True)
 		amount = getattr(self, "_last_totals", {}).get("total", 0.0)
 		vpa = getattr(CONFIG, "upi_vpa", None) or "test@upi"
-		payee = CONFIG.restaurant_legal_name
+		payee = get_restaurant_profile().upi_payee_name
 		path = generate_upi_qr(vpa, payee, amount=amount, note=f"Table {getattr(self, 'table_var', tk.StringVar(value='')).get() if hasattr(self,'table_var') else ''}")
 		img = tk_image_from_path(path)
 		lbl = ttk.Label(wrap, image=img)
@@ -1000,6 +1146,10 @@ class UpdateSettingsDialog(simpledialog.Dialog):
 
 def bootstrap() -> None:
 	init_db()
+	start_spooler()
 	logo = Path.cwd() / "logo.png"
-	app = RestaurantApp(logo)
-	app.mainloop()
+	try:
+		app = RestaurantApp(logo)
+		app.mainloop()
+	finally:
+		stop_spooler()
@@ -0,0 +1,337 @@
+"""
+Hot/cold split for order history.
+
+PAID and CANCELLED orders older than ``CONFIG.archive_after_days`` are moved
+out of the hot database into one SQLite file per Indian financial year
+(``data/archive/orders_FY2425.db``). Lookups and day-range reports fall back to
+the archives by ATTACHing them; the sales rollups keep archived totals so
+daily reports never need to open them.
+"""
+
+import re
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .config import CONFIG
+from .db import (
+	get_conn, transaction, with_lock_retry, financial_year_code,
+	_fetch_order, _fetch_orders, _order_summary, _IN_CHUNK,
+)
+
+
+ARCHIVE_SCHEMA_VERSION = 2
+
+ARCHIVE_SCHEMA_SQL = (
+	"""
+	CREATE TABLE IF NOT EXISTS Orders (
+		order_id INTEGER PRIMARY KEY,
+		table_number INTEGER,
+		customer_name TEXT,
+		customer_gstin TEXT,
+		place_of_supply TEXT,
+		invoice_number TEXT,
+		invoice_date TEXT,
+		subtotal REAL NOT NULL DEFAULT 0,
+		cgst REAL NOT NULL DEFAULT 0,
+		sgst REAL NOT NULL DEFAULT 0,
+		igst REAL NOT NULL DEFAULT 0,
+		service_charge REAL NOT NULL DEFAULT 0,
+		total REAL NOT NULL DEFAULT 0,
+		status TEXT NOT NULL,
+		invoice_day TEXT GENERATED ALWAYS AS (substr(invoice_date, 1, 10)) VIRTUAL
+	)
+	""",
+	# Not UNIQUE: pre-sequence databases may hold duplicate numbers and every row must survive the move
+	"CREATE INDEX IF NOT EXISTS idx_orders_invoice ON Orders(invoice_number)",
+	"CREATE INDEX IF NOT EXISTS idx_orders_status_day ON Orders(status, invoice_day)",
+	"""
+	CREATE TABLE IF NOT EXISTS OrderItems (
+		id INTEGER PRIMARY KEY,
+		order_id INTEGER NOT NULL REFERENCES Orders(order_id) ON DELETE CASCADE,
+		item_id INTEGER NOT NULL,
+		item_name TEXT NOT NULL,
+		hsn_code TEXT NOT NULL,
+		quantity INTEGER NOT NULL,
+		rate REAL NOT NULL,
+		gst_slab REAL NOT NULL,
+		line_amount REAL NOT NULL
+	)
+	""",
+	"CREATE INDEX IF NOT EXISTS idx_order_items_order ON OrderItems(order_id)",
+	# Version 2
+	"""
+	CREATE TABLE IF NOT EXISTS OrderTaxSummary (
+		order_id INTEGER NOT NULL REFERENCES Orders(order_id) ON DELETE CASCADE,
+		hsn_code TEXT NOT NULL,
+		rate REAL NOT NULL,
+		taxable REAL NOT NULL,
+		cgst REAL NOT NULL DEFAULT 0,
+		sgst REAL NOT NULL DEFAULT 0,
+		igst REAL NOT NULL DEFAULT 0,
+		PRIMARY KEY (order_id, hsn_code, rate)
+	) WITHOUT ROWID
+	""",
+)
+
+ORDER_COLUMNS = (
+	"order_id", "table_number", "customer_name", "customer_gstin", "place_of_supply", "invoice_number", "invoice_date",
+	"subtotal", "cgst", "sgst", "igst", "service_charge", "total", "status",
+)
+ORDER_ITEM_COLUMNS = ("id", "order_id", "item_id", "item_name", "hsn_code", "quantity", "rate", "gst_slab", "line_amount")
+TAX_SUMMARY_COLUMNS = ("order_id", "hsn_code", "rate", "taxable", "cgst", "sgst", "igst")
+
+_ARCHIVE_NAME = re.compile(r"^orders_FY(\d{4})\.db$")
+
+
+def archive_file(fy_code: str) -> Path:
+	return CONFIG.archive_path / f"orders_FY{fy_code}.db"
+
+
+def list_archives() -> List[Tuple[str, Path]]:
+	"""Existing archive files as (fy_code, path), newest financial year first."""
+	if not CONFIG.archive_path.exists():
+		return []
+	found = []
+	for path in CONFIG.archive_path.iterdir():
+		m = _ARCHIVE_NAME.match(path.name)
+		if m:
+			found.append((m.group(1), path))
+	return sorted(found, reverse=True)
+
+
+def _fy_bounds(fy_code: str) -> Tuple[str, str]:
+	"""First and last day (YYYY-MM-DD) of a financial year code such as "2425"."""
+	start = 2000 + int(fy_code[:2])
+	return f"{start}-04-01", f"{start + 1}-03-31"
+
+
+def _ensure_archive_schema(conn: sqlite3.Connection) -> None:
+	if conn.execute("PRAGMA user_version").fetchone()[0] >= ARCHIVE_SCHEMA_VERSION:
+		return
+	for stmt in ARCHIVE_SCHEMA_SQL:
+		conn.execute(stmt)
+	conn.execute(f"PRAGMA user_version = {ARCHIVE_SCHEMA_VERSION}")
+
+
+@contextmanager
+def attached_archives(conn: sqlite3.Connection, archives: List[Tuple[str, Path]]) -> Iterator[List[str]]:
+	"""ATTACH archive files to ``conn`` for the duration of the block; yields their schema names.
+
+	ATTACH is not allowed inside a transaction, so use this from read paths only.
+	"""
+	names: List[str] = []
+	try:
+		for fy_code, path in archives:
+			name = f"arc{fy_code}"
+			conn.execute("ATTACH DATABASE ? AS " + name, (str(path),))
+			names.append(name)
+		yield names
+	finally:
+		for name in names:
+			conn.execute(f"DETACH DATABASE {name}")
+
+
+def get_archived_order(invoice_number: str) -> Optional[Dict[str, Any]]:
+	"""Find an order in the archives, newest financial year first."""
+	archives = list_archives()
+	# New-style numbers carry their FY ("T1-2425-0042"); look in that year first
+	hinted = [a for a in archives if f"-{a[0]}-" in f"-{invoice_number}"]
+	ordered = hinted + [a for a in archives if a not in hinted]
+	with get_conn() as conn:
+		# SQLite caps attached databases (10 by default), so go in batches
+		for i in range(0, len(ordered), 8):
+			with attached_archives(conn, ordered[i:i + 8]) as names:
+				for name in names:
+					order = _fetch_order(conn, invoice_number, name)
+					if order is not None:
+						order["archived"] = True
+						return order
+	return None
+
+
+def get_archived_orders(invoice_numbers: List[str]) -> Dict[str, Dict[str, Any]]:
+	"""Batch archive lookup: {invoice_number: order} for the numbers found in any archive."""
+	found: Dict[str, Dict[str, Any]] = {}
+	archives = list_archives()
+	with get_conn() as conn:
+		for i in range(0, len(archives), 8):
+			with attached_archives(conn, archives[i:i + 8]) as names:
+				for name in names:
+					pending = [n for n in invoice_numbers if n not in found]
+					if not pending:
+						return found
+					for number, order in _fetch_orders(conn, pending, name).items():
+						order["archived"] = True
+						found[number] = order
+	return found
+
+
+def archives_for_range(start_day: str, end_day: str) -> List[Tuple[str, Path]]:
+	"""Archive files whose financial year overlaps start_day..end_day, newest first."""
+	return [a for a in list_archives() if _fy_bounds(a[0])[0] <= end_day and _fy_bounds(a[0])[1] >= start_day]
+
+
+def list_archived_orders_by_day(start_day: str, end_day: str, status: str = 'PAID') -> List[Dict[str, Any]]:
+	archives = archives_for_range(start_day, end_day)
+	if not archives:
+		return []
+	out: List[Dict[str, Any]] = []
+	with get_conn() as conn:
+		for i in range(0, len(archives), 8):
+			with attached_archives(conn, archives[i:i + 8]) as names:
+				for name in names:
+					cur = conn.execute(
+						f"""
+						SELECT order_id, table_number, invoice_number, invoice_date, status, subtotal, total FROM {name}.Orders
+						WHERE status = ? AND invoice_day BETWEEN ? AND ? ORDER BY invoice_day
+						""",
+						(status, start_day, end_day),
+					)
+					out.extend(_order_summary(r) for r in cur.fetchall())
+	out.sort(key=lambda o: o["invoice_date"] or "")
+	return out
+
+
+def add_archived_sales_to_rollups(conn: sqlite3.Connection) -> None:
+	"""Fold archived PAID orders into DailySales/HourlySales (used by ``rebuild_sales_rollups``)."""
+	for _, path in list_archives():
+		with get_conn(path) as arc:
+			daily = arc.execute(
+				"""
+				SELECT invoice_day, COUNT(*), SUM(subtotal), SUM(cgst), SUM(sgst), SUM(igst), SUM(service_charge), SUM(total)
+				FROM Orders WHERE status = 'PAID' GROUP BY invoice_day
+				"""
+			).fetchall()
+			hourly = arc.execute(
+				"SELECT substr(invoice_date, 1, 13), COUNT(*), SUM(subtotal), SUM(total) FROM Orders WHERE status = 'PAID' GROUP BY 1"
+			).fetchall()
+		_add_to_rollups(conn, daily, hourly)
+
+
+def _add_to_rollups(conn: sqlite3.Connection, daily: List[tuple], hourly: List[tuple]) -> None:
+	conn.executemany(
+		"""
+		INSERT INTO DailySales(sales_day, order_count, subtotal, cgst, sgst, igst, service_charge, total)
+		VALUES (?,?,?,?,?,?,?,?)
+		ON CONFLICT(sales_day) DO UPDATE SET
+			order_count = order_count + excluded.order_count, subtotal = subtotal + excluded.subtotal,
+			cgst = cgst + excluded.cgst, sgst = sgst + excluded.sgst, igst = igst + excluded.igst,
+			service_charge = service_charge + excluded.service_charge, total = total + excluded.total
+		""",
+		daily,
+	)
+	conn.executemany(
+		"""
+		INSERT INTO HourlySales(sales_hour, order_count, subtotal, total) VALUES (?,?,?,?)
+		ON CONFLICT(sales_hour) DO UPDATE SET
+			order_count = order_count + excluded.order_count, subtotal = subtotal + excluded.subtotal,
+			total = total + excluded.total
+		""",
+		hourly,
+	)
+
+
+def _copy_to_archives(orders: List[tuple], items: List[tuple], summaries: List[tuple]) -> None:
+	"""Write a batch into the per-FY archive files. Idempotent, so a rerun after a crash is safe."""
+	by_fy: Dict[str, Tuple[List[tuple], List[tuple], List[tuple]]] = {}
+	fy_of_order: Dict[int, str] = {}
+	date_idx = ORDER_COLUMNS.index("invoice_date")
+	for row in orders:
+		fy = financial_year_code(datetime.fromisoformat(row[date_idx][:10]))
+		fy_of_order[row[0]] = fy
+		by_fy.setdefault(fy, ([], [], []))[0].append(row)
+	for row in items:
+		by_fy[fy_of_order[row[1]]][1].append(row)
+	for row in summaries:
+		by_fy[fy_of_order[row[0]]][2].append(row)
+
+	CONFIG.archive_path.mkdir(parents=True, exist_ok=True)
+	for fy, (fy_orders, fy_items, fy_summaries) in by_fy.items():
+		with transaction(archive_file(fy)) as arc:
+			_ensure_archive_schema(arc)
+			arc.executemany(
+				f"INSERT OR IGNORE INTO Orders({', '.join(ORDER_COLUMNS)}) VALUES({', '.join('?' * len(ORDER_COLUMNS))})",
+				fy_orders,
+			)
+			arc.executemany(
+				f"INSERT OR IGNORE INTO OrderItems({', '.join(ORDER_ITEM_COLUMNS)}) VALUES({', '.join('?' * len(ORDER_ITEM_COLUMNS))})",
+				fy_items,
+			)
+			arc.executemany(
+				f"INSERT OR IGNORE INTO OrderTaxSummary({', '.join(TAX_SUMMARY_COLUMNS)}) VALUES({', '.join('?' * len(TAX_SUMMARY_COLUMNS))})",
+				fy_summaries,
+			)
+
+
+@with_lock_retry
+def _remove_from_hot(order_ids: List[int]) -> None:
+	"""Delete archived orders from the hot database without taking their sales out of the rollups."""
+	with transaction() as conn:
+		conn.execute("CREATE TEMP TABLE IF NOT EXISTS archive_batch(order_id INTEGER PRIMARY KEY)")
+		conn.execute("DELETE FROM temp.archive_batch")
+		conn.executemany("INSERT INTO temp.archive_batch(order_id) VALUES (?)", [(i,) for i in order_ids])
+		daily = conn.execute(
+			"""
+			SELECT invoice_day, COUNT(*), SUM(subtotal), SUM(cgst), SUM(sgst), SUM(igst), SUM(service_charge), SUM(total)
+			FROM Orders WHERE status = 'PAID' AND order_id IN (SELECT order_id FROM temp.archive_batch) GROUP BY invoice_day
+			"""
+		).fetchall()
+		hourly = conn.execute(
+			"""
+			SELECT substr(invoice_date, 1, 13), COUNT(*), SUM(subtotal), SUM(total)
+			FROM Orders WHERE status = 'PAID' AND order_id IN (SELECT order_id FROM temp.archive_batch) GROUP BY 1
+			"""
+		).fetchall()
+		# The delete trigger subtracts these orders from the rollups; add them straight back
+		conn.execute("DELETE FROM Orders WHERE order_id IN (SELECT order_id FROM temp.archive_batch)")
+		_add_to_rollups(conn, daily, hourly)
+		conn.execute("DELETE FROM temp.archive_batch")
+
+
+def archive_closed_orders(older_than_days: Optional[int] = None, batch_size: int = _IN_CHUNK) -> Dict[str, int]:
+	"""Move PAID/CANCELLED orders older than the cutoff into yearly archives. Returns counts per FY."""
+	days = CONFIG.archive_after_days if older_than_days is None else older_than_days
+	cutoff = (datetime.utcnow() - timedelta(days=days)).strftime("%Y-%m-%d")
+	moved: Dict[str, int] = {}
+	date_idx = ORDER_COLUMNS.index("invoice_date")
+	while True:
+		with get_conn() as conn:
+			orders = conn.execute(
+				f"""
+				SELECT {', '.join(ORDER_COLUMNS)} FROM Orders
+				WHERE status IN ('PAID', 'CANCELLED') AND invoice_day < ? ORDER BY order_id LIMIT ?
+				""",
+				(cutoff, batch_size),
+			).fetchall()
+			if not orders:
+				break
+			ids = [row[0] for row in orders]
+			items: List[tuple] = []
+			summaries: List[tuple] = []
+			# Stay under SQLite's bound-variable limit whatever the batch size
+			for i in range(0, len(ids), _IN_CHUNK):
+				chunk = ids[i:i + _IN_CHUNK]
+				marks = ",".join("?" * len(chunk))
+				items += conn.execute(
+					f"SELECT {', '.join(ORDER_ITEM_COLUMNS)} FROM OrderItems WHERE order_id IN ({marks})", chunk
+				).fetchall()
+				summaries += conn.execute(
+					f"SELECT {', '.join(TAX_SUMMARY_COLUMNS)} FROM OrderTaxSummary WHERE order_id IN ({marks})", chunk
+				).fetchall()
+		# Archive first, then delete: a crash in between leaves a copy in both places, never in neither
+		_copy_to_archives(orders, items, summaries)
+		_remove_from_hot(ids)
+		for row in orders:
+			fy = financial_year_code(datetime.fromisoformat(row[date_idx][:10]))
+			moved[fy] = moved.get(fy, 0) + 1
+	return moved
+
+
+def compact_hot_db() -> None:
+	"""Checkpoint the WAL and VACUUM the hot database after a large archive run."""
+	with get_conn() as conn:
+		conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+		conn.execute("VACUUM")
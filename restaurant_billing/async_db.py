@@ -0,0 +1,105 @@
+"""
+Async access to the blocking database helpers.
+
+The mobile API is asyncio-based, but every helper in ``db``/``auth`` is a
+blocking sqlite3 call. ``AsyncDB.run`` moves such calls onto a small dedicated
+thread pool (``CONFIG.db_async_workers``) so a slow write never stalls the
+event loop, and records per-call queue wait and run time.
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+from .config import CONFIG
+
+
+T = TypeVar("T")
+
+
+class AsyncDB:
+	def __init__(self, workers: Optional[int] = None, slow_ms: Optional[float] = None):
+		self.workers = workers or CONFIG.db_async_workers
+		self.slow_ms = CONFIG.db_async_slow_ms if slow_ms is None else slow_ms
+		self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="db")
+		self._lock = threading.Lock()
+		self._stats: Dict[str, Dict[str, float]] = {}
+		self._in_flight = 0
+
+	async def run(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+		"""Await ``func(*args, **kwargs)`` executed on a DB worker thread."""
+		name = getattr(func, "__name__", repr(func))
+		submitted = time.perf_counter()
+		timings = {}
+
+		def call() -> T:
+			started = time.perf_counter()
+			timings["wait"] = started - submitted
+			try:
+				return func(*args, **kwargs)
+			finally:
+				timings["run"] = time.perf_counter() - started
+
+		with self._lock:
+			self._in_flight += 1
+		try:
+			return await asyncio.get_running_loop().run_in_executor(self._executor, call)
+		finally:
+			with self._lock:
+				self._in_flight -= 1
+			if timings:
+				self._record(name, timings.get("wait", 0.0), timings.get("run", 0.0))
+
+	def _record(self, name: str, wait: float, run: float) -> None:
+		with self._lock:
+			entry = self._stats.setdefault(name, {"calls": 0, "wait_s": 0.0, "run_s": 0.0, "max_run_s": 0.0})
+			entry["calls"] += 1
+			entry["wait_s"] += wait
+			entry["run_s"] += run
+			entry["max_run_s"] = max(entry["max_run_s"], run)
+		total_ms = (wait + run) * 1000
+		if total_ms >= self.slow_ms:
+			print(f"[WARNING] Slow DB call {name}: {total_ms:.0f} ms (queued {wait * 1000:.0f} ms)")
+
+	def stats(self) -> Dict[str, Any]:
+		with self._lock:
+			calls = {
+				name: {
+					"calls": int(e["calls"]),
+					"avg_wait_ms": round(e["wait_s"] * 1000 / e["calls"], 3),
+					"avg_run_ms": round(e["run_s"] * 1000 / e["calls"], 3),
+					"max_run_ms": round(e["max_run_s"] * 1000, 3),
+				}
+				for name, e in self._stats.items()
+			}
+			return {"workers": self.workers, "in_flight": self._in_flight, "calls": calls}
+
+	def shutdown(self) -> None:
+		self._executor.shutdown(wait=True)
+
+
+_ASYNC_DB: Optional[AsyncDB] = None
+_ASYNC_DB_LOCK = threading.Lock()
+
+
+def get_async_db() -> AsyncDB:
+	global _ASYNC_DB
+	with _ASYNC_DB_LOCK:
+		if _ASYNC_DB is None:
+			_ASYNC_DB = AsyncDB()
+		return _ASYNC_DB
+
+
+async def run_db(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+	"""Shorthand for ``get_async_db().run(...)``."""
+	return await get_async_db().run(func, *args, **kwargs)
+
+
+def shutdown_async_db() -> None:
+	global _ASYNC_DB
+	with _ASYNC_DB_LOCK:
+		if _ASYNC_DB is not None:
+			_ASYNC_DB.shutdown()
+			_ASYNC_DB = None
@@ -0,0 +1,182 @@
+"""
+Incremental order cart.
+
+Lines are keyed by menu item id (OrderItems allows one row per item per
+order), so adding an item twice raises its quantity instead of creating a
+duplicate. Every add/remove/quantity change adjusts the running subtotal and
+per-HSN/rate taxes by that one line's delta, using the same per-line paise
+rounding as ``gst.compute_order_tax``, so the totals always equal a full
+recompute.
+"""
+
+from dataclasses import dataclass
+from datetime import date
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .gst import HsnTax, OrderTax, get_rate_index, to_bp, to_paise, to_rupees, _apply_rate
+
+
+@dataclass(slots=True)
+class CartLine:
+	item_id: int
+	name: str
+	rate: int  # paise
+	slab_bp: int
+	hsn_code: str
+	quantity: int
+	cgst_bp: int
+	sgst_bp: int
+	taxable: int = 0
+	cgst: int = 0
+	sgst: int = 0
+	igst: int = 0
+
+	def _retax(self, intra_state: bool, gst_enabled: bool) -> None:
+		self.taxable = self.rate * self.quantity
+		if not gst_enabled:
+			self.cgst = self.sgst = self.igst = 0
+		elif intra_state:
+			self.cgst = _apply_rate(self.taxable, self.cgst_bp)
+			self.sgst = _apply_rate(self.taxable, self.sgst_bp)
+			self.igst = 0
+		else:
+			self.cgst = self.sgst = 0
+			self.igst = _apply_rate(self.taxable, self.slab_bp)
+
+
+class Cart:
+	def __init__(
+		self,
+		intra_state: bool = True,
+		service_charge_percent: float = 0.0,
+		gst_enabled: bool = True,
+		on_day: Optional[str] = None,
+	):
+		self.intra_state = intra_state
+		self.gst_enabled = gst_enabled
+		self.on_day = on_day or date.today().isoformat()
+		self._service_bp = to_bp(service_charge_percent)
+		self._lines: Dict[int, CartLine] = {}
+		self._groups: Dict[Tuple[str, int], HsnTax] = {}  # keyed by (hsn_code, slab_bp)
+		self._group_lines: Dict[Tuple[str, int], int] = {}
+		self.subtotal = 0
+		self.cgst = 0
+		self.sgst = 0
+		self.igst = 0
+
+	def __len__(self) -> int:
+		return len(self._lines)
+
+	def __iter__(self) -> Iterator[CartLine]:
+		return iter(self._lines.values())
+
+	def __contains__(self, item_id: int) -> bool:
+		return item_id in self._lines
+
+	def line(self, item_id: int) -> Optional[CartLine]:
+		return self._lines.get(item_id)
+
+	def _account(self, line: CartLine, sign: int) -> None:
+		self.subtotal += sign * line.taxable
+		self.cgst += sign * line.cgst
+		self.sgst += sign * line.sgst
+		self.igst += sign * line.igst
+		key = (line.hsn_code, line.slab_bp)
+		hsn = self._groups.get(key)
+		if hsn is None:
+			hsn = self._groups[key] = HsnTax()
+		hsn.taxable += sign * line.taxable
+		hsn.cgst += sign * line.cgst
+		hsn.sgst += sign * line.sgst
+		hsn.igst += sign * line.igst
+
+	def add(self, item_id: int, name: str, rate: float, gst_slab: float, hsn_code: str, quantity: int = 1) -> CartLine:
+		"""Add ``quantity`` of a menu item; an item already in the cart just gets the extra quantity."""
+		line = self._lines.get(item_id)
+		if line is not None:
+			return self.set_quantity(item_id, line.quantity + int(quantity))
+		slab_bp = to_bp(gst_slab)
+		cgst_bp, sgst_bp = get_rate_index().rates(slab_bp, self.on_day) if self.gst_enabled else (0, 0)
+		line = CartLine(int(item_id), name, to_paise(rate), slab_bp, str(hsn_code), int(quantity), cgst_bp, sgst_bp)
+		line._retax(self.intra_state, self.gst_enabled)
+		self._lines[line.item_id] = line
+		key = (line.hsn_code, line.slab_bp)
+		self._group_lines[key] = self._group_lines.get(key, 0) + 1
+		self._account(line, 1)
+		return line
+
+	def set_quantity(self, item_id: int, quantity: int) -> Optional[CartLine]:
+		"""Change a line's quantity; zero or less removes it. Returns the line, or None if removed."""
+		if quantity <= 0:
+			self.remove(item_id)
+			return None
+		line = self._lines[item_id]
+		self._account(line, -1)
+		line.quantity = int(quantity)
+		line._retax(self.intra_state, self.gst_enabled)
+		self._account(line, 1)
+		return line
+
+	def remove(self, item_id: int) -> None:
+		line = self._lines.get(item_id)
+		if line is None:
+			return
+		self._account(line, -1)
+		del self._lines[item_id]
+		key = (line.hsn_code, line.slab_bp)
+		self._group_lines[key] -= 1
+		if not self._group_lines[key]:
+			del self._group_lines[key]
+			del self._groups[key]
+
+	def clear(self) -> None:
+		self._lines.clear()
+		self._groups.clear()
+		self._group_lines.clear()
+		self.subtotal = self.cgst = self.sgst = self.igst = 0
+
+	def set_service_charge_percent(self, percent: float) -> None:
+		self._service_bp = to_bp(percent)
+
+	@property
+	def service_charge(self) -> int:
+		return _apply_rate(self.subtotal, self._service_bp)
+
+	@property
+	def total(self) -> int:
+		return self.subtotal + self.service_charge + self.cgst + self.sgst + self.igst
+
+	def order_tax(self) -> OrderTax:
+		by_hsn: Dict[str, HsnTax] = {}
+		for (hsn, _), g in self._groups.items():
+			h = by_hsn.get(hsn)
+			if h is None:
+				h = by_hsn[hsn] = HsnTax()
+			h.taxable += g.taxable
+			h.cgst += g.cgst
+			h.sgst += g.sgst
+			h.igst += g.igst
+		return OrderTax(
+			subtotal=self.subtotal,
+			service_charge=self.service_charge,
+			cgst=self.cgst,
+			sgst=self.sgst,
+			igst=self.igst,
+			by_hsn=by_hsn,
+			by_hsn_rate={key: HsnTax(g.taxable, g.cgst, g.sgst, g.igst) for key, g in self._groups.items()},
+			gst_enabled=self.gst_enabled,
+		)
+
+	def totals(self) -> Dict[str, Any]:
+		"""Rupee totals in the shape ``create_order`` expects."""
+		return self.order_tax().as_totals()
+
+	def items(self) -> List[Dict[str, Any]]:
+		"""Lines as ``create_order`` item dicts."""
+		return [
+			{
+				"id": l.item_id, "name": l.name, "rate": to_rupees(l.rate), "gst_slab": l.slab_bp / 100,
+				"hsn_code": l.hsn_code, "quantity": l.quantity,
+			}
+			for l in self._lines.values()
+		]
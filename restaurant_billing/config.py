@@ -11,9 +11,28 @@ class AppConfig:
 	developed_by: str = "Varchaswaa Media Pvt Ltd"
 	rights_owner: str = "Varchaswaa Media Pvt Ltd"
 	db_path: Path = Path.cwd() / "data" / "restaurant.db"
+	archive_path: Path = Path.cwd() / "data" / "archive"  # per-financial-year databases of closed orders
+	archive_after_days: int = 180  # PAID/CANCELLED orders older than this move out of the hot database
+	returns_path: Path = Path.cwd() / "data" / "returns"  # GSTR-1 / GSTR-3B exports
+	db_pool_size: int = 4  # long-lived SQLite connections kept open per database file
+	db_pool_timeout: float = 30.0  # seconds to wait for a free connection before failing
+	# SQLite concurrency settings (desktop app and mobile API share the same file)
+	db_journal_mode: str = "WAL"  # WAL lets readers proceed while one writer commits
+	db_synchronous: str = "NORMAL"  # safe with WAL; FULL fsyncs on every commit
+	db_busy_timeout_ms: int = 5000  # how long SQLite itself waits on a locked database
+	db_lock_retries: int = 4  # extra attempts for write transactions that still hit "database is locked"
+	db_lock_retry_base_delay: float = 0.05  # seconds; doubled on every retry, with jitter
+	# Async access from the mobile API: blocking DB calls run on this many executor threads
+	db_async_workers: int = 4  # keep <= db_pool_size so executor threads never queue on the pool
+	db_async_slow_ms: float = 250.0  # calls slower than this (queue wait + run) are logged
 	assets_path: Path = Path.cwd() / "assets"
 	invoices_path: Path = Path.cwd() / "invoices"
 	default_state_code: str = "27"  # Maharashtra by default
+	# Invoice numbering: <prefix>-<FY>-<serial>, e.g. "T1-2526-0042"
+	invoice_terminal_prefix: str = ""  # per-terminal prefix so terminals never share a counter
+	invoice_series_per_financial_year: bool = True  # restart numbering every April (FY "2526" = 2025-26)
+	invoice_serial_width: int = 4
+	invoice_block_size: int = 1  # >1 reserves this many numbers per terminal at a time (unused ones become gaps)
 	currency_symbol: str = "₹"
 	default_service_charge_percent: float = 0.0  # optional, can be set 5-10
 	fullscreen: bool = True  # Enable fullscreen for touch screens
@@ -30,11 +49,16 @@ class AppConfig:
 	upi_vpa: Optional[str] = None
 	upi_payee_name: Optional[str] = None
 	# Printing configuration for POSIFLOW KP206B-UB
-	printer_type: str = "os"  # os | escpos_usb | escpos_network
+	printer_type: str = "os"  # os | escpos_usb | escpos_network | escpos_file
 	escpos_vendor_id: Optional[int] = None  # Will be auto-detected for POSIFLOW
 	escpos_product_id: Optional[int] = None  # Will be auto-detected for POSIFLOW
 	escpos_host: Optional[str] = None  # for network printers
 	escpos_port: int = 9100
+	escpos_device: Optional[str] = None  # for escpos_file: a raw device such as /dev/usb/lp0, or a capture file
+	escpos_timeout: float = 5.0  # seconds to connect to / write to a network printer
+	escpos_keepalive: bool = True  # keep one open connection per network printer instead of one per receipt
+	escpos_reconnect_base_delay: float = 0.5  # seconds; doubled after every failed connect, with jitter
+	escpos_reconnect_max_delay: float = 30.0  # cap on the wait between connect attempts
 	paper_width_chars: int = 30  # 58mm paper width for POSIFLOW KP206B-UB (30 chars per line, Font Size 8, precise margins)
 	printer_encoding: str = "utf-8"  # Better Unicode support
 	printer_name: str = "POSIFLOW KP206B-UB"  # Friendly printer name
@@ -42,6 +66,19 @@ class AppConfig:
 	paper_width_mm: int = 58  # 58mm paper width
 	print_speed_mm_per_sec: int = 90  # 90mm/s print speed
 	thermal_printer: bool = True  # Thermal receipt printer
+	printer_dots_per_mm: int = 8  # head density: 8 = 203 dpi, 12 = 300 dpi
+	# Receipt images, rasterised once per image/width/density and cached under assets/raster
+	receipt_logo_path: Optional[Path] = Path.cwd() / "logo.png"  # None: no logo on receipts
+	receipt_banner_path: Optional[Path] = None  # static header banner image printed under the logo
+	# Print spooler: jobs wait in PrintJobs and are printed by background threads
+	print_on_checkout: bool = True  # queue the receipt when an order is marked PAID
+	print_max_attempts: int = 8  # then the job is FAILED until retried from the Print Queue
+	print_retry_base_delay: float = 2.0  # seconds; doubled on every failed attempt, with jitter
+	print_retry_max_delay: float = 120.0  # cap on the wait between attempts
+	print_poll_seconds: float = 1.0  # how often idle workers look for jobs queued by other processes
+	# Kitchen order tickets: stations and category routes live in KitchenStations / KitchenRoutes
+	kot_enabled: bool = False  # print tickets when an order is saved or items are added; set up the stations first
+	kot_default_station: str = "kitchen"  # station for categories without a route
 	# GST Configuration
 	gst_enabled: bool = False  # Enable/disable GST calculation (disabled by default)
 	restaurant_gst_number: Optional[str] = None  # Restaurant GST number
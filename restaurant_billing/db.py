@@ -1,179 +1,499 @@
+import atexit
+import functools
+import random
 import sqlite3
+import threading
+import time
 from contextlib import contextmanager
+from datetime import datetime
 from pathlib import Path
-from typing import Iterable, Optional, Tuple, List, Dict, Any
+from typing import Iterable, Optional, Set, Tuple, List, Dict, Any
 
 from .config import CONFIG
 
 
-SCHEMA_SQL = """
-PRAGMA foreign_keys = ON;
-
-CREATE TABLE IF NOT EXISTS Restaurant (
-	name TEXT NOT NULL,
-	address TEXT NOT NULL,
-	gstin TEXT NOT NULL,
-	state_code TEXT NOT NULL,
-	fssai_license TEXT
-);
-
-CREATE TABLE IF NOT EXISTS GSTSettings (
-	slab_rate REAL NOT NULL,
-	cgst_rate REAL NOT NULL,
-	sgst_rate REAL NOT NULL,
-	applicable_from TEXT NOT NULL
-);
-
-CREATE TABLE IF NOT EXISTS MenuItems (
-	id INTEGER PRIMARY KEY AUTOINCREMENT,
-	name TEXT NOT NULL,
-	price REAL NOT NULL,
-	category TEXT NOT NULL,
-	gst_slab REAL NOT NULL,
-	hsn_code TEXT NOT NULL,
-	food_type TEXT NOT NULL CHECK(food_type IN ('veg','non-veg'))
-);
-
-CREATE TABLE IF NOT EXISTS Orders (
-	order_id INTEGER PRIMARY KEY AUTOINCREMENT,
-	table_number INTEGER,
-	customer_name TEXT,
-	customer_gstin TEXT,
-	place_of_supply TEXT,
-	invoice_number TEXT,
-	invoice_date TEXT,
-	subtotal REAL NOT NULL DEFAULT 0,
-	cgst REAL NOT NULL DEFAULT 0,
-	sgst REAL NOT NULL DEFAULT 0,
-	igst REAL NOT NULL DEFAULT 0,
-	service_charge REAL NOT NULL DEFAULT 0,
-	total REAL NOT NULL DEFAULT 0,
-	status TEXT NOT NULL DEFAULT 'OPEN' -- OPEN, PAID, CANCELLED
-);
-CREATE INDEX IF NOT EXISTS idx_orders_invoice ON Orders(invoice_number);
-
-CREATE TABLE IF NOT EXISTS OrderItems (
-	id INTEGER PRIMARY KEY AUTOINCREMENT,
-	order_id INTEGER NOT NULL REFERENCES Orders(order_id) ON DELETE CASCADE,
-	item_id INTEGER NOT NULL REFERENCES MenuItems(id),
-	item_name TEXT NOT NULL,
-	hsn_code TEXT NOT NULL,
-	quantity INTEGER NOT NULL,
-	rate REAL NOT NULL,
-	gst_slab REAL NOT NULL,
-	line_amount REAL NOT NULL,
-	UNIQUE(order_id, item_id)
-);
-
--- Users for role-based access
-CREATE TABLE IF NOT EXISTS Users (
-	id INTEGER PRIMARY KEY AUTOINCREMENT,
-	username TEXT NOT NULL UNIQUE,
-	full_name TEXT,
-	role TEXT NOT NULL CHECK(role IN ('SUPER_ADMIN','ADMIN','CAPTAIN')),
-	password_hash TEXT NOT NULL,
-	password_salt TEXT NOT NULL,
-	is_active INTEGER NOT NULL DEFAULT 1,
-	created_at TEXT NOT NULL DEFAULT (datetime('now'))
-);
-CREATE INDEX IF NOT EXISTS idx_users_username ON Users(username);
-
--- State codes for GST compliance
-CREATE TABLE IF NOT EXISTS StateCodes (
-	code TEXT PRIMARY KEY,
-	name TEXT NOT NULL,
-	is_union_territory INTEGER NOT NULL DEFAULT 0
-);
-"""
+def connection_pragmas() -> List[str]:
+	"""PRAGMAs applied once when a pooled connection is opened."""
+	return [
+		f"PRAGMA busy_timeout = {int(CONFIG.db_busy_timeout_ms)}",
+		f"PRAGMA journal_mode = {CONFIG.db_journal_mode}",
+		f"PRAGMA synchronous = {CONFIG.db_synchronous}",
+		"PRAGMA foreign_keys = ON",
+	]
+
+
+class PoolTimeout(sqlite3.OperationalError):
+	"""Raised when no pooled connection becomes free within the pool timeout."""
+
+
+class ConnectionPool:
+	"""Bounded pool of long-lived SQLite connections for one database file.
+
+	A thread keeps the connection it leased for as long as it has a ``get_conn()``
+	scope open, so nested helpers (e.g. ``seed_super_admin`` -> ``create_user``)
+	share one connection and one transaction. Connections are returned to the
+	idle list when the outermost scope exits and are only closed by ``close()``.
+	"""
+
+	def __init__(self, db_path: Path, max_size: int = 4, timeout: float = 30.0):
+		self.db_path = Path(db_path)
+		self.max_size = max(1, int(max_size))
+		self.timeout = timeout
+		self._idle: List[sqlite3.Connection] = []
+		self._open_count = 0
+		self._cond = threading.Condition()
+		self._local = threading.local()
+		self._closed = False
+		self._stats = {"acquired": 0, "reused": 0, "opened": 0, "waited": 0, "in_use": 0}
+
+	def _open(self) -> sqlite3.Connection:
+		conn = sqlite3.connect(str(self.db_path), timeout=CONFIG.db_busy_timeout_ms / 1000.0, check_same_thread=False)
+		for pragma in connection_pragmas():
+			conn.execute(pragma)
+		return conn
+
+	def held_by_current_thread(self) -> bool:
+		return getattr(self._local, "lease", None) is not None
+
+	def acquire(self) -> Tuple[sqlite3.Connection, bool]:
+		"""Lease a connection to the calling thread. Returns (conn, outermost)."""
+		lease = getattr(self._local, "lease", None)
+		if lease is not None:
+			lease[1] += 1
+			with self._cond:
+				self._stats["acquired"] += 1
+				self._stats["reused"] += 1
+			return lease[0], False
+
+		conn = None
+		with self._cond:
+			self._stats["acquired"] += 1
+			if not self._idle and self._open_count >= self.max_size:
+				self._stats["waited"] += 1
+				if not self._cond.wait_for(lambda: bool(self._idle) or self._open_count < self.max_size, self.timeout):
+					raise PoolTimeout(f"No free database connection after {self.timeout}s")
+			if self._idle:
+				conn = self._idle.pop()
+				self._stats["reused"] += 1
+			else:
+				self._open_count += 1
+				self._stats["opened"] += 1
+			self._stats["in_use"] += 1
+
+		if conn is None:
+			try:
+				conn = self._open()
+			except BaseException:
+				with self._cond:
+					self._open_count -= 1
+					self._stats["in_use"] -= 1
+					self._cond.notify()
+				raise
+		self._local.lease = [conn, 1]
+		return conn, True
+
+	def release(self, conn: sqlite3.Connection) -> None:
+		lease = self._local.lease
+		lease[1] -= 1
+		if lease[1] > 0:
+			return
+		self._local.lease = None
+		with self._cond:
+			self._stats["in_use"] -= 1
+			if self._closed:
+				self._open_count -= 1
+				conn.close()
+			else:
+				self._idle.append(conn)
+			self._cond.notify()
+
+	def stats(self) -> Dict[str, int]:
+		with self._cond:
+			out = dict(self._stats)
+			out["open"] = self._open_count
+			out["idle"] = len(self._idle)
+			return out
+
+	def close(self) -> None:
+		"""Close idle connections. Leased connections close when they are released."""
+		with self._cond:
+			self._closed = True
+			idle, self._idle = self._idle, []
+			self._open_count -= len(idle)
+		for conn in idle:
+			try:
+				conn.close()
+			except sqlite3.Error:
+				pass
+
+
+_POOLS: Dict[str, ConnectionPool] = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def get_pool(db_path: Optional[Path] = None) -> ConnectionPool:
+	key = str(Path(db_path or CONFIG.db_path).resolve())
+	pool = _POOLS.get(key)
+	if pool is None:
+		with _POOLS_LOCK:
+			pool = _POOLS.get(key)
+			if pool is None:
+				pool = ConnectionPool(Path(key), CONFIG.db_pool_size, CONFIG.db_pool_timeout)
+				_POOLS[key] = pool
+	return pool
+
+
+def get_pool_stats(db_path: Optional[Path] = None) -> Dict[str, int]:
+	"""Counters for the pool serving ``db_path``: acquired, reused, opened, waited, in_use, open, idle."""
+	return get_pool(db_path).stats()
 
 
-SEED_SQL: Iterable[str] = (
-	# Minimal restaurant details (edit via UI later)
-	f"INSERT INTO Restaurant(name, address, gstin, state_code, fssai_license) VALUES (\n '{CONFIG.restaurant_legal_name}',\n '123, MG Road, Mumbai, Maharashtra 400001',\n '27ABCDE1234F1Z5',\n '27',\n '11518002000000'\n);",
-	# GST slabs commonly used
-	"INSERT INTO GSTSettings(slab_rate, cgst_rate, sgst_rate, applicable_from) VALUES (5, 2.5, 2.5, date('now'));",
-	"INSERT INTO GSTSettings(slab_rate, cgst_rate, sgst_rate, applicable_from) VALUES (12, 6, 6, date('now'));",
-	"INSERT INTO GSTSettings(slab_rate, cgst_rate, sgst_rate, applicable_from) VALUES (18, 9, 9, date('now'));",
-	"INSERT INTO GSTSettings(slab_rate, cgst_rate, sgst_rate, applicable_from) VALUES (28, 14, 14, date('now'));",
-	# Sample menu
-	"INSERT INTO MenuItems(name, price, category, gst_slab, hsn_code, food_type) VALUES ('Paneer Tikka', 240, 'Starters & Appetizers', 5, '996331', 'veg');",
-	"INSERT INTO MenuItems(name, price, category, gst_slab, hsn_code, food_type) VALUES ('Chicken Tikka', 280, 'Starters & Appetizers', 5, '996331', 'non-veg');",
-	"INSERT INTO MenuItems(name, price, category, gst_slab, hsn_code, food_type) VALUES ('Dal Tadka', 220, 'Main Course (Veg)', 5, '996331', 'veg');",
-	"INSERT INTO MenuItems(name, price, category, gst_slab, hsn_code, food_type) VALUES ('Butter Chicken', 360, 'Main Course (Non-Veg)', 5, '996331', 'non-veg');",
-	"INSERT INTO MenuItems(name, price, category, gst_slab, hsn_code, food_type) VALUES ('Naan', 40, 'Breads & Rice', 5, '996331', 'veg');",
-	"INSERT INTO MenuItems(name, price, category, gst_slab, hsn_code, food_type) VALUES ('Jeera Rice', 160, 'Breads & Rice', 5, '996331', 'veg');",
-	"INSERT INTO MenuItems(name, price, category, gst_slab, hsn_code, food_type) VALUES ('Veg Fried Rice', 200, 'Chinese & Continental', 5, '996331', 'veg');",
-	"INSERT INTO MenuItems(name, price, category, gst_slab, hsn_code, food_type) VALUES ('Masala Dosa', 120, 'South Indian', 5, '996331', 'veg');",
-	"INSERT INTO MenuItems(name, price, category, gst_slab, hsn_code, food_type) VALUES ('Lassi', 90, 'Beverages & Desserts', 12, '996331', 'veg');",
-	# State codes (sample)
-	"INSERT INTO StateCodes(code, name, is_union_territory) VALUES ('27', 'Maharashtra', 0);",
-	"INSERT INTO StateCodes(code, name, is_union_territory) VALUES ('07', 'Delhi', 1);",
-	"INSERT INTO StateCodes(code, name, is_union_territory) VALUES ('33', 'Tamil Nadu', 0);",
-	"INSERT INTO StateCodes(code, name, is_union_territory) VALUES ('09', 'Gujarat', 0);",
-	"INSERT INTO StateCodes(code, name, is_union_territory) VALUES ('29', 'Karnataka', 0);",
-)
+def close_all_connections() -> None:
+	with _POOLS_LOCK:
+		pools = list(_POOLS.values())
+		_POOLS.clear()
+	for pool in pools:
+		pool.close()
+
+
+atexit.register(close_all_connections)
+
+
+_LOCK_STATS: Dict[str, float] = {
+	"begins": 0,
+	"begin_wait_seconds": 0.0,
+	"max_begin_wait_seconds": 0.0,
+	"lock_errors": 0,
+	"retries": 0,
+	"gave_up": 0,
+}
+_LOCK_STATS_LOCK = threading.Lock()
+
+
+def _record_lock_stat(name: str, value: float = 1) -> None:
+	with _LOCK_STATS_LOCK:
+		_LOCK_STATS[name] += value
+
+
+def get_lock_stats() -> Dict[str, float]:
+	"""Write-lock contention counters: time spent acquiring write locks, lock errors and retries."""
+	with _LOCK_STATS_LOCK:
+		return dict(_LOCK_STATS)
+
+
+def _is_lock_error(exc: BaseException) -> bool:
+	if not isinstance(exc, sqlite3.OperationalError) or isinstance(exc, PoolTimeout):
+		return False
+	msg = str(exc).lower()
+	return "locked" in msg or "busy" in msg
+
+
+def with_lock_retry(func):
+	"""Retry a write transaction with exponential backoff when the database stays locked.
+
+	Only the outermost call retries: inside an already-open ``get_conn()`` scope the
+	error propagates so the enclosing transaction can be retried as a whole.
+	"""
+	@functools.wraps(func)
+	def wrapper(*args, **kwargs):
+		attempt = 0
+		while True:
+			nested = get_pool().held_by_current_thread()
+			try:
+				return func(*args, **kwargs)
+			except sqlite3.OperationalError as exc:
+				if not _is_lock_error(exc):
+					raise
+				_record_lock_stat("lock_errors")
+				if nested or attempt >= CONFIG.db_lock_retries:
+					_record_lock_stat("gave_up")
+					raise
+				delay = CONFIG.db_lock_retry_base_delay * (2 ** attempt) * random.uniform(0.5, 1.0)
+				_record_lock_stat("retries")
+				time.sleep(delay)
+				attempt += 1
+	return wrapper
 
 
 @contextmanager
 def get_conn(db_path: Optional[Path] = None):
-	db_file = str(db_path or CONFIG.db_path)
-	conn = sqlite3.connect(db_file)
+	"""Borrow a pooled connection. The outermost scope commits on success and rolls back on error."""
+	pool = get_pool(db_path)
+	conn, outermost = pool.acquire()
 	try:
 		yield conn
-		conn.commit()
+		if outermost:
+			conn.commit()
+	except BaseException:
+		if outermost:
+			conn.rollback()
+		raise
 	finally:
-		conn.close()
+		pool.release(conn)
 
 
-def init_db():
-	with get_conn() as conn:
-		conn.executescript(SCHEMA_SQL)
-		# Seed idempotently: try inserts; ignore failures
-		for stmt in SEED_SQL:
-			try:
-				conn.execute(stmt)
-			except sqlite3.Error:
-				pass
+@contextmanager
+def transaction(db_path: Optional[Path] = None, mode: str = "IMMEDIATE"):
+	"""Explicit transaction scope (``BEGIN DEFERRED|IMMEDIATE|EXCLUSIVE``).
+
+	If the calling thread already has a transaction open on its connection the
+	block joins it instead of starting a new one.
+	"""
+	with get_conn(db_path) as conn:
+		if conn.in_transaction:
+			yield conn
+			return
+		started = time.perf_counter()
+		try:
+			conn.execute(f"BEGIN {mode}")
+		finally:
+			# Includes time SQLite spent in its busy handler, even when BEGIN gave up
+			waited = time.perf_counter() - started
+			with _LOCK_STATS_LOCK:
+				_LOCK_STATS["begins"] += 1
+				_LOCK_STATS["begin_wait_seconds"] += waited
+				if waited > _LOCK_STATS["max_begin_wait_seconds"]:
+					_LOCK_STATS["max_begin_wait_seconds"] = waited
+		try:
+			yield conn
+			conn.commit()
+		except BaseException:
+			conn.rollback()
+			raise
+
+
+def init_db(db_path: Optional[Path] = None) -> int:
+	"""Bring the schema up to date. On a current database this is a single PRAGMA read."""
+	from .migrations import SCHEMA_VERSION, migrate
+
+	with get_conn(db_path) as conn:
+		version = conn.execute("PRAGMA user_version").fetchone()[0]
+	if version >= SCHEMA_VERSION:
+		return version
+	return migrate(db_path)
+
+
+def _rebuild_sales_rollups(conn: sqlite3.Connection) -> None:
+	conn.execute("DELETE FROM DailySales")
+	conn.execute("DELETE FROM HourlySales")
+	conn.execute(
+		"""
+		INSERT INTO DailySales(sales_day, order_count, subtotal, cgst, sgst, igst, service_charge, total)
+		SELECT invoice_day, COUNT(*), SUM(subtotal), SUM(cgst), SUM(sgst), SUM(igst), SUM(service_charge), SUM(total)
+		FROM Orders WHERE status = 'PAID' GROUP BY invoice_day
+		"""
+	)
+	conn.execute(
+		"""
+		INSERT INTO HourlySales(sales_hour, order_count, subtotal, total)
+		SELECT substr(invoice_date, 1, 13), COUNT(*), SUM(subtotal), SUM(total)
+		FROM Orders WHERE status = 'PAID' GROUP BY 1
+		"""
+	)
+
+
+@with_lock_retry
+def rebuild_sales_rollups() -> int:
+	"""Recompute DailySales/HourlySales from Orders (backfill or repair). Returns the number of days."""
+	from .archive import add_archived_sales_to_rollups
+
+	with transaction() as conn:
+		_rebuild_sales_rollups(conn)
+		add_archived_sales_to_rollups(conn)
+		return conn.execute("SELECT COUNT(*) FROM DailySales").fetchone()[0]
 
 
 def get_today_sales_totals() -> Tuple[float, float]:
 	"""Return (subtotal_without_tax_and_service, grand_total) for today's PAID orders."""
+	with get_conn() as conn:
+		cur = conn.execute("SELECT subtotal, total FROM DailySales WHERE sales_day = date('now')")
+		row = cur.fetchone()
+		if not row:
+			return 0.0, 0.0
+		return round(float(row[0]), 2), round(float(row[1]), 2)
+
+
+def get_daily_sales(start_day: str, end_day: str) -> List[Dict[str, Any]]:
+	"""Per-day PAID totals for start_day..end_day inclusive (YYYY-MM-DD), from the rollup table."""
 	with get_conn() as conn:
 		cur = conn.execute(
 			"""
-			SELECT COALESCE(SUM(subtotal),0), COALESCE(SUM(total),0)
-			FROM Orders
-			WHERE date(invoice_date) = date('now') AND status = 'PAID'
+			SELECT sales_day, order_count, subtotal, cgst, sgst, igst, service_charge, total
+			FROM DailySales WHERE sales_day BETWEEN ? AND ? AND order_count > 0 ORDER BY sales_day
+			""",
+			(start_day, end_day),
+		)
+		return [
+			{
+				"day": r[0], "orders": r[1], "subtotal": round(r[2], 2), "cgst": round(r[3], 2), "sgst": round(r[4], 2),
+				"igst": round(r[5], 2), "service_charge": round(r[6], 2), "total": round(r[7], 2),
+			}
+			for r in cur.fetchall()
+		]
+
+
+def get_hourly_sales(day: str) -> List[Dict[str, Any]]:
+	"""Per-hour PAID totals for one day (YYYY-MM-DD)."""
+	with get_conn() as conn:
+		cur = conn.execute(
 			"""
+			SELECT sales_hour, order_count, subtotal, total FROM HourlySales
+			WHERE sales_hour >= ? AND sales_hour < ? AND order_count > 0 ORDER BY sales_hour
+			""",
+			(day, day + "~"),
 		)
-		row = cur.fetchone()
-		return float(row[0]), float(row[1])
+		return [
+			{"hour": int(r[0][11:13]), "orders": r[1], "subtotal": round(r[2], 2), "total": round(r[3], 2)}
+			for r in cur.fetchall()
+		]
+
+
+def cancel_order(invoice_number: str) -> bool:
+	"""Mark an order as CANCELLED (a PAID order drops out of the sales rollups)."""
+	return _set_order_status(invoice_number, 'CANCELLED')
+
+
+_ORDER_ITEM_FIELDS = ("item_name", "hsn_code", "quantity", "rate", "gst_slab", "line_amount")
+
+# Keeps IN (...) lists under SQLite's host-parameter limit on older builds (999)
+_IN_CHUNK = 500
+
+
+def _attach_items(conn: sqlite3.Connection, orders: List[Dict[str, Any]], schema: str = "main") -> None:
+	"""Load the items of all ``orders`` with one query per chunk and attach them as ``order["items"]``."""
+	by_id = {o["order_id"]: o for o in orders}
+	for o in orders:
+		o["items"] = []
+	ids = list(by_id)
+	for i in range(0, len(ids), _IN_CHUNK):
+		chunk = ids[i:i + _IN_CHUNK]
+		cur = conn.execute(
+			f"""
+			SELECT order_id, {', '.join(_ORDER_ITEM_FIELDS)} FROM {schema}.OrderItems
+			WHERE order_id IN ({','.join('?' * len(chunk))}) ORDER BY order_id, id
+			""",
+			chunk,
+		)
+		for row in cur:
+			by_id[row[0]]["items"].append(dict(zip(_ORDER_ITEM_FIELDS, row[1:])))
+
+
+_TAX_SUMMARY_FIELDS = ("hsn_code", "rate", "taxable", "cgst", "sgst", "igst")
+
+
+def _attach_tax_summary(conn: sqlite3.Connection, orders: List[Dict[str, Any]], schema: str = "main") -> None:
+	"""Attach OrderTaxSummary rows as ``order["tax_summary"]`` (empty for archives written before the table existed)."""
+	by_id = {o["order_id"]: o for o in orders}
+	for o in orders:
+		o["tax_summary"] = []
+	has_table = conn.execute(
+		f"SELECT 1 FROM {schema}.sqlite_master WHERE type = 'table' AND name = 'OrderTaxSummary'"
+	).fetchone()
+	if not has_table:
+		return
+	ids = list(by_id)
+	for i in range(0, len(ids), _IN_CHUNK):
+		chunk = ids[i:i + _IN_CHUNK]
+		cur = conn.execute(
+			f"""
+			SELECT order_id, {', '.join(_TAX_SUMMARY_FIELDS)} FROM {schema}.OrderTaxSummary
+			WHERE order_id IN ({','.join('?' * len(chunk))}) ORDER BY order_id, hsn_code, rate
+			""",
+			chunk,
+		)
+		for row in cur:
+			by_id[row[0]]["tax_summary"].append(dict(zip(_TAX_SUMMARY_FIELDS, row[1:])))
+
+
+def _fetch_orders(conn: sqlite3.Connection, invoice_numbers: List[str], schema: str = "main") -> Dict[str, Dict[str, Any]]:
+	"""Orders (with items) keyed by invoice number, in two set-based queries per chunk."""
+	found: Dict[str, Dict[str, Any]] = {}
+	for i in range(0, len(invoice_numbers), _IN_CHUNK):
+		chunk = invoice_numbers[i:i + _IN_CHUNK]
+		cur = conn.execute(
+			f"SELECT * FROM {schema}.Orders WHERE invoice_number IN ({','.join('?' * len(chunk))})", chunk
+		)
+		columns = [d[0] for d in cur.description]
+		orders = [dict(zip(columns, row)) for row in cur.fetchall()]
+		_attach_items(conn, orders, schema)
+		_attach_tax_summary(conn, orders, schema)
+		for order in orders:
+			found.setdefault(order["invoice_number"], order)
+	return found
+
+
+def _fetch_order(conn: sqlite3.Connection, invoice_number: str, schema: str = "main") -> Optional[Dict[str, Any]]:
+	return _fetch_orders(conn, [invoice_number], schema).get(invoice_number)
 
 
 def get_order_by_invoice(invoice_number: str) -> Optional[Dict[str, Any]]:
+	"""Look up an order in the hot database, then in the yearly archives."""
 	with get_conn() as conn:
-		cur = conn.execute("SELECT * FROM Orders WHERE invoice_number = ?", (invoice_number,))
-		order = cur.fetchone()
-		if not order:
-			return None
-		columns = [d[0] for d in cur.description]
-		order_dict = dict(zip(columns, order))
-		cur_items = conn.execute(
-			"SELECT item_name, hsn_code, quantity, rate, gst_slab, line_amount FROM OrderItems WHERE order_id = ?",
-			(order_dict["order_id"],),
-		)
-		items = []
-		for row in cur_items.fetchall():
-			items.append({
-				"item_name": row[0],
-				"hsn_code": row[1],
-				"quantity": row[2],
-				"rate": row[3],
-				"gst_slab": row[4],
-				"line_amount": row[5],
-			})
-		order_dict["items"] = items
-		return order_dict
+		order = _fetch_order(conn, invoice_number)
+	if order is None:
+		from .archive import get_archived_order
+		order = get_archived_order(invoice_number)
+	return order
+
+
+def get_orders_by_invoices(invoice_numbers: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+	"""Batch version of ``get_order_by_invoice``: {invoice_number: order}. Unknown numbers are left out."""
+	wanted = list(dict.fromkeys(invoice_numbers))
+	with get_conn() as conn:
+		found = _fetch_orders(conn, wanted)
+	missing = [n for n in wanted if n not in found]
+	if missing:
+		from .archive import get_archived_orders
+		found.update(get_archived_orders(missing))
+	return found
+
+
+def _iter_orders_in(
+	db_path: Optional[Path], start_day: str, end_day: str, status: str, batch_size: int
+) -> Iterable[Dict[str, Any]]:
+	# Keyset pagination over idx_orders_status_day, whose entries are ordered by (status, invoice_day, order_id)
+	last_day, last_id = "", 0
+	while True:
+		with get_conn(db_path) as conn:
+			cur = conn.execute(
+				"""
+				SELECT * FROM Orders
+				WHERE status = ? AND invoice_day <= ? AND (invoice_day, order_id) > (?, ?) AND invoice_day >= ?
+				ORDER BY invoice_day, order_id LIMIT ?
+				""",
+				(status, end_day, last_day, last_id, start_day, batch_size),
+			)
+			columns = [d[0] for d in cur.description]
+			page = [dict(zip(columns, row)) for row in cur.fetchall()]
+			if not page:
+				return
+			_attach_items(conn, page)
+			_attach_tax_summary(conn, page)
+		last_day, last_id = page[-1]["invoice_day"], page[-1]["order_id"]
+		yield from page
+		if len(page) < batch_size:
+			return
+
+
+def iter_orders(start_day: str, end_day: str, status: str = 'PAID', batch_size: int = 200) -> Iterable[Dict[str, Any]]:
+	"""Stream orders (with items) for a day range in date order, ``batch_size`` orders in memory at a time.
+
+	Archived financial years overlapping the range are read first, then the hot database.
+	No connection is held between batches, so the consumer may use the database freely.
+	"""
+	from .archive import archives_for_range
+
+	archives = archives_for_range(start_day, end_day)
+	if not archives:
+		yield from _iter_orders_in(None, start_day, end_day, status, batch_size)
+		return
+	# An order can briefly exist in both places while an archive run is in progress
+	seen: Set[str] = set()
+	for path in [p for _, p in reversed(archives)] + [None]:
+		for order in _iter_orders_in(path, start_day, end_day, status, batch_size):
+			if order["invoice_number"] not in seen:
+				seen.add(order["invoice_number"])
+				yield order
 
 
 def list_menu_items() -> List[Dict[str, Any]]:
@@ -186,15 +506,137 @@ def list_menu_items() -> List[Dict[str, Any]]:
 		]
 
 
-def _generate_invoice_number(conn: sqlite3.Connection) -> str:
-	cur = conn.execute("SELECT printf('%04d', COALESCE(MAX(order_id)+1,1)) FROM Orders")
-	return cur.fetchone()[0]
+@with_lock_retry
+def add_menu_item(name: str, price: float, category: str, gst_slab: float, hsn_code: str, food_type: str) -> int:
+	with transaction() as conn:
+		cur = conn.execute(
+			"INSERT INTO MenuItems(name, price, category, gst_slab, hsn_code, food_type) VALUES(?,?,?,?,?,?)",
+			(name, float(price), category, float(gst_slab), hsn_code, food_type),
+		)
+		return cur.lastrowid
+
+
+@with_lock_retry
+def update_menu_item(item_id: int, name: str, price: float, category: str, gst_slab: float, hsn_code: str, food_type: str) -> bool:
+	with transaction() as conn:
+		cur = conn.execute(
+			"UPDATE MenuItems SET name=?, price=?, category=?, gst_slab=?, hsn_code=?, food_type=? WHERE id=?",
+			(name, float(price), category, float(gst_slab), hsn_code, food_type, item_id),
+		)
+		return cur.rowcount > 0
+
+
+@with_lock_retry
+def delete_menu_item(item_id: int) -> bool:
+	with transaction() as conn:
+		cur = conn.execute("DELETE FROM MenuItems WHERE id=?", (item_id,))
+		return cur.rowcount > 0
+
+
+def financial_year_code(when: datetime) -> str:
+	"""Indian financial year (April-March) as a 4-digit code: 2025-04-01 -> "2526"."""
+	start = when.year if when.month >= 4 else when.year - 1
+	return f"{start % 100:02d}{(start + 1) % 100:02d}"
+
+
+def invoice_series(when: datetime, prefix: Optional[str] = None) -> str:
+	prefix = CONFIG.invoice_terminal_prefix if prefix is None else prefix
+	parts = [p for p in (prefix, financial_year_code(when) if CONFIG.invoice_series_per_financial_year else "") if p]
+	return "-".join(parts) or "default"
+
+
+def _format_invoice_number(series: str, value: int) -> str:
+	serial = f"{value:0{CONFIG.invoice_serial_width}d}"
+	return serial if series == "default" else f"{series}-{serial}"
+
+
+def _allocate_invoice_values(conn: sqlite3.Connection, series: str, count: int = 1) -> range:
+	"""Atomically take ``count`` consecutive values from a series in the caller's transaction."""
+	cur = conn.execute(
+		"""
+		INSERT INTO InvoiceSequences(series, next_value) VALUES(?, 1 + ?)
+		ON CONFLICT(series) DO UPDATE SET next_value = next_value + excluded.next_value - 1
+		RETURNING next_value
+		""",
+		(series, count),
+	)
+	end = cur.fetchone()[0]
+	return range(end - count, end)
+
+
+class _InvoiceBlocks:
+	"""Per-process cache of pre-allocated invoice number blocks, keyed by series."""
+
+	def __init__(self):
+		self._lock = threading.Lock()
+		self._blocks: Dict[str, List[int]] = {}
+
+	def take(self, series: str) -> Optional[int]:
+		with self._lock:
+			block = self._blocks.get(series)
+			if block and block[0] < block[1]:
+				value = block[0]
+				block[0] += 1
+				return value
+			return None
+
+	def put(self, series: str, values: range) -> None:
+		with self._lock:
+			self._blocks[series] = [values.start, values.stop]
+
+	def give_back(self, series: str, value: int) -> None:
+		"""Return an unused value taken by a rolled back order, if it is still the block head."""
+		with self._lock:
+			block = self._blocks.get(series)
+			if block and block[0] == value + 1:
+				block[0] = value
+
+	def clear(self) -> None:
+		with self._lock:
+			self._blocks.clear()
+
+
+_INVOICE_BLOCKS = _InvoiceBlocks()
+
+
+@with_lock_retry
+def reserve_invoice_block(series: str, size: Optional[int] = None) -> range:
+	"""Pre-allocate a block of invoice numbers for this terminal in its own short transaction."""
+	size = size or CONFIG.invoice_block_size
+	with transaction() as conn:
+		values = _allocate_invoice_values(conn, series, size)
+	_INVOICE_BLOCKS.put(series, values)
+	return values
+
+
+def _take_block_value(series: str) -> Optional[int]:
+	"""Next value from this terminal's pre-allocated block, or None when blocks are disabled."""
+	if CONFIG.invoice_block_size <= 1:
+		return None
+	value = _INVOICE_BLOCKS.take(series)
+	if value is None:
+		reserve_invoice_block(series)
+		value = _INVOICE_BLOCKS.take(series)
+	return value
+
+
+# Query shapes below are pinned to idx_orders_open / idx_orders_status_day (see test_query_plans)
+# Without INDEXED BY the planner prefers idx_orders_status_day and then sorts in a temp b-tree
+OPEN_ORDERS_SQL = """
+	SELECT order_id, table_number, invoice_number, invoice_date, total FROM Orders INDEXED BY idx_orders_open
+	WHERE status = 'OPEN' ORDER BY invoice_date DESC
+"""
+
+ORDERS_BY_DAY_SQL = """
+	SELECT order_id, table_number, invoice_number, invoice_date, status, subtotal, total FROM Orders
+	WHERE status = ? AND invoice_day BETWEEN ? AND ? ORDER BY invoice_day
+"""
 
 
 def list_open_orders() -> List[Dict[str, Any]]:
 	"""List all open orders."""
 	with get_conn() as conn:
-		cur = conn.execute("SELECT order_id, table_number, invoice_number, invoice_date, total FROM Orders WHERE status = 'OPEN' ORDER BY invoice_date DESC")
+		cur = conn.execute(OPEN_ORDERS_SQL)
 		rows = cur.fetchall()
 		return [
 			{"order_id": r[0], "table_number": r[1], "invoice_number": r[2], "invoice_date": r[3], "total": float(r[4])}
@@ -202,13 +644,113 @@ def list_open_orders() -> List[Dict[str, Any]]:
 		]
 
 
-def mark_order_paid(invoice_number: str) -> bool:
-	"""Mark an order as PAID."""
+def _order_summary(r: tuple) -> Dict[str, Any]:
+	return {
+		"order_id": r[0], "table_number": r[1], "invoice_number": r[2], "invoice_date": r[3], "status": r[4],
+		"subtotal": float(r[5]), "total": float(r[6]),
+	}
+
+
+def list_orders_by_day(start_day: str, end_day: str, status: str = 'PAID') -> List[Dict[str, Any]]:
+	"""Orders with the given status invoiced between start_day and end_day inclusive (YYYY-MM-DD).
+
+	Archived financial years overlapping the range are included.
+	"""
+	from .archive import list_archived_orders_by_day
+
+	archived = list_archived_orders_by_day(start_day, end_day, status) if status != 'OPEN' else []
 	with get_conn() as conn:
-		cur = conn.execute("UPDATE Orders SET status = 'PAID' WHERE invoice_number = ?", (invoice_number,))
+		cur = conn.execute(ORDERS_BY_DAY_SQL, (status, start_day, end_day))
+		hot = [_order_summary(r) for r in cur.fetchall()]
+	if not archived:
+		return hot
+	# An order can briefly exist in both places while an archive run is in progress
+	seen = {o["invoice_number"] for o in archived}
+	return archived + [o for o in hot if o["invoice_number"] not in seen]
+
+
+@with_lock_retry
+def _set_order_status(invoice_number: str, status: str) -> bool:
+	with transaction() as conn:
+		cur = conn.execute("UPDATE Orders SET status = ? WHERE invoice_number = ?", (status, invoice_number))
 		return cur.rowcount > 0
 
 
+def mark_order_paid(invoice_number: str) -> bool:
+	"""Mark an order as PAID."""
+	return _set_order_status(invoice_number, 'PAID')
+
+
+_INSERT_ORDER_SQL = """
+	INSERT INTO Orders(table_number, customer_name, customer_gstin, place_of_supply, invoice_number, invoice_date,
+		subtotal, cgst, sgst, igst, service_charge, total, status)
+	VALUES(?,?,?,?,?,?,?,?,?,?,?,?,?)
+"""
+
+_INSERT_ORDER_ITEM_SQL = """
+	INSERT INTO OrderItems(order_id, item_id, item_name, hsn_code, quantity, rate, gst_slab, line_amount)
+	VALUES(?,?,?,?,?,?,?,?)
+"""
+
+_INSERT_TAX_SUMMARY_SQL = """
+	INSERT INTO OrderTaxSummary(order_id, hsn_code, rate, taxable, cgst, sgst, igst)
+	VALUES(?,?,?,?,?,?,?)
+"""
+
+
+def _now_invoice_date() -> Tuple[datetime, str]:
+	now = datetime.utcnow()
+	return now, now.strftime("%Y-%m-%d %H:%M:%S")  # same format as SQLite datetime('now')
+
+
+def _item_rows(order_id: int, items: Iterable[Dict[str, Any]]) -> List[tuple]:
+	return [
+		(
+			order_id, it["id"], it["name"], it["hsn_code"], int(it["quantity"]), float(it["rate"]), float(it["gst_slab"]),
+			float(it["quantity"]) * float(it["rate"]),
+		)
+		for it in items
+	]
+
+
+def _tax_summary_rows(order_id: int, totals: Dict[str, Any], items: List[Dict[str, Any]], invoice_date: str) -> List[tuple]:
+	summary = totals.get("tax_summary")
+	if summary is None:
+		# Totals built without the tax engine: derive the split from the items, taxed the way the totals were
+		from .gst import compute_order_tax
+
+		taxed = any(float(totals.get(k, 0.0) or 0.0) for k in ("cgst", "sgst", "igst"))
+		summary = compute_order_tax(
+			items, intra_state=not float(totals.get("igst", 0.0) or 0.0), gst_enabled=taxed, on_day=invoice_date[:10],
+		).summary_rows()
+	return [
+		(order_id, str(r["hsn_code"]), float(r["rate"]), float(r["taxable"]), float(r["cgst"]), float(r["sgst"]), float(r["igst"]))
+		for r in summary
+	]
+
+
+def _insert_order_header(
+	conn: sqlite3.Connection,
+	invoice_number: str,
+	invoice_date: str,
+	table_number: int,
+	customer_name: Optional[str],
+	customer_gstin: Optional[str],
+	place_of_supply: Optional[str],
+	totals: Dict[str, float],
+	status: str,
+) -> int:
+	cur = conn.execute(
+		_INSERT_ORDER_SQL,
+		(
+			table_number, customer_name, customer_gstin, place_of_supply, invoice_number, invoice_date,
+			totals.get('subtotal',0.0), totals.get('cgst',0.0), totals.get('sgst',0.0), totals.get('igst',0.0), totals.get('service_charge',0.0), totals.get('total',0.0), status
+		),
+	)
+	return cur.lastrowid
+
+
+@with_lock_retry
 def create_order(
 	table_number: int,
 	customer_name: Optional[str],
@@ -218,30 +760,125 @@ def create_order(
 	items: List[Dict[str, Any]],
 	status: str = 'OPEN',
 ) -> str:
-	"""Create an order and its items. Returns invoice_number."""
-	with get_conn() as conn:
-		invoice_number = _generate_invoice_number(conn)
-		invoice_date = conn.execute("SELECT datetime('now')").fetchone()[0]
-		cur = conn.execute(
-			"""
-			INSERT INTO Orders(table_number, customer_name, customer_gstin, place_of_supply, invoice_number, invoice_date,
-				subtotal, cgst, sgst, igst, service_charge, total, status)
-			VALUES(?,?,?,?,?,?,?,?,?,?,?,?,?)
-			""",
-			(
-				table_number, customer_name, customer_gstin, place_of_supply, invoice_number, invoice_date,
-				totals.get('subtotal',0.0), totals.get('cgst',0.0), totals.get('sgst',0.0), totals.get('igst',0.0), totals.get('service_charge',0.0), totals.get('total',0.0), status
-			),
+	"""Create an order and its items in one BEGIN IMMEDIATE transaction. Returns invoice_number."""
+	now, invoice_date = _now_invoice_date()
+	series = invoice_series(now)
+	block_value = _take_block_value(series)
+	try:
+		with transaction() as conn:
+			value = block_value if block_value is not None else _allocate_invoice_values(conn, series)[0]
+			invoice_number = _format_invoice_number(series, value)
+			order_id = _insert_order_header(
+				conn, invoice_number, invoice_date, table_number, customer_name, customer_gstin, place_of_supply, totals, status
+			)
+			conn.executemany(_INSERT_ORDER_ITEM_SQL, _item_rows(order_id, items))
+			conn.executemany(_INSERT_TAX_SUMMARY_SQL, _tax_summary_rows(order_id, totals, items, invoice_date))
+			return invoice_number
+	except BaseException:
+		if block_value is not None:
+			_INVOICE_BLOCKS.give_back(series, block_value)
+		raise
+
+
+@with_lock_retry
+def add_order_items(invoice_number: str, items: List[Dict[str, Any]]) -> bool:
+	"""Add items to an OPEN order (items already on it get a higher quantity) and re-total it.
+
+	Taxes are recomputed over all lines the way the order was first taxed (same service
+	charge share, intra/inter-state, GST on or off). Returns False if the order is not OPEN.
+	"""
+	from .cart import Cart
+
+	with transaction() as conn:
+		row = conn.execute(
+			"SELECT order_id, invoice_date, subtotal, service_charge, cgst, sgst, igst FROM Orders WHERE invoice_number = ? AND status = 'OPEN'",
+			(invoice_number,),
+		).fetchone()
+		if row is None:
+			return False
+		order_id, invoice_date, subtotal, service_charge, cgst, sgst, igst = row
+		cart = Cart(
+			intra_state=not igst,
+			service_charge_percent=round(service_charge * 100 / subtotal, 2) if subtotal else CONFIG.default_service_charge_percent,
+			gst_enabled=bool(cgst or sgst or igst),
+			on_day=(invoice_date or "")[:10] or None,
 		)
-		order_id = cur.lastrowid
+		for item_id, name, hsn_code, quantity, rate, gst_slab in conn.execute(
+			"SELECT item_id, item_name, hsn_code, quantity, rate, gst_slab FROM OrderItems WHERE order_id = ? ORDER BY id", (order_id,)
+		).fetchall():
+			cart.add(item_id, name, rate, gst_slab, hsn_code, quantity)
 		for it in items:
+			cart.add(it["id"], it["name"], it["rate"], it["gst_slab"], it["hsn_code"], int(it.get("quantity", 1)))
+		for line in cart.items():
 			conn.execute(
 				"""
 				INSERT INTO OrderItems(order_id, item_id, item_name, hsn_code, quantity, rate, gst_slab, line_amount)
 				VALUES(?,?,?,?,?,?,?,?)
+				ON CONFLICT(order_id, item_id) DO UPDATE SET quantity = excluded.quantity, line_amount = excluded.line_amount
 				""",
-				(
-					order_id, it["id"], it["name"], it["hsn_code"], int(it["quantity"]), float(it["rate"]), float(it["gst_slab"]), float(it["quantity"]) * float(it["rate"])
-				),
+				_item_rows(order_id, [line])[0],
+			)
+		totals = cart.totals()
+		conn.execute(
+			"UPDATE Orders SET subtotal = ?, cgst = ?, sgst = ?, igst = ?, service_charge = ?, total = ? WHERE order_id = ?",
+			(totals["subtotal"], totals["cgst"], totals["sgst"], totals["igst"], totals["service_charge"], totals["total"], order_id),
+		)
+		conn.execute("DELETE FROM OrderTaxSummary WHERE order_id = ?", (order_id,))
+		conn.executemany(_INSERT_TAX_SUMMARY_SQL, _tax_summary_rows(order_id, totals, cart.items(), invoice_date or ""))
+		return True
+
+
+def _parse_invoice_date(value: Any) -> Tuple[datetime, str]:
+	if value is None:
+		return _now_invoice_date()
+	when = value if isinstance(value, datetime) else datetime.fromisoformat(str(value))
+	return when, when.strftime("%Y-%m-%d %H:%M:%S")
+
+
+@with_lock_retry
+def _create_orders_chunk(orders: List[Dict[str, Any]]) -> List[str]:
+	dated = [_parse_invoice_date(o.get("invoice_date")) for o in orders]
+	series_keys = [invoice_series(when) for when, _ in dated]
+	with transaction() as conn:
+		# One counter bump per series for every order in the chunk that needs a number
+		needed: Dict[str, int] = {}
+		for order, series in zip(orders, series_keys):
+			if not order.get("invoice_number"):
+				needed[series] = needed.get(series, 0) + 1
+		pending = {series: iter(_allocate_invoice_values(conn, series, count)) for series, count in needed.items()}
+
+		invoice_numbers: List[str] = []
+		item_rows: List[tuple] = []
+		summary_rows: List[tuple] = []
+		for order, series, (_, invoice_date) in zip(orders, series_keys, dated):
+			invoice_number = order.get("invoice_number") or _format_invoice_number(series, next(pending[series]))
+			order_id = _insert_order_header(
+				conn, invoice_number, invoice_date, order.get("table_number"), order.get("customer_name"),
+				order.get("customer_gstin"), order.get("place_of_supply"), order.get("totals") or {}, order.get("status", "OPEN"),
 			)
-		return invoice_number
+			item_rows.extend(_item_rows(order_id, order.get("items") or []))
+			summary_rows.extend(_tax_summary_rows(order_id, order.get("totals") or {}, order.get("items") or [], invoice_date))
+			invoice_numbers.append(invoice_number)
+		conn.executemany(_INSERT_ORDER_ITEM_SQL, item_rows)
+		conn.executemany(_INSERT_TAX_SUMMARY_SQL, summary_rows)
+		return invoice_numbers
+
+
+def create_orders_bulk(orders: Iterable[Dict[str, Any]], chunk_size: int = 500) -> List[str]:
+	"""Insert many orders (imports, replays from another terminal). Returns their invoice numbers.
+
+	Each order is a dict with the ``create_order`` arguments as keys plus optional
+	``invoice_date`` (kept as-is when replaying) and ``invoice_number`` (kept as-is
+	when importing already-issued invoices). Every ``chunk_size`` orders are written
+	in one transaction so a large import does not hold the write lock for long.
+	"""
+	invoice_numbers: List[str] = []
+	chunk: List[Dict[str, Any]] = []
+	for order in orders:
+		chunk.append(order)
+		if len(chunk) >= chunk_size:
+			invoice_numbers.extend(_create_orders_chunk(chunk))
+			chunk = []
+	if chunk:
+		invoice_numbers.extend(_create_orders_chunk(chunk))
+	return invoice_numbers
@@ -1,7 +1,12 @@
-from typing import Dict, Any, Optional
+import json
+from typing import Dict, Any, Iterable, List, Optional
 from datetime import datetime
 
-from .db import get_conn, get_order_by_invoice
+from .db import get_order_by_invoice, get_orders_by_invoices, iter_orders
+from .gst import to_paise, to_rupees
+from .gst_returns import States, state_code
+from .invoice_store import load_document, save_document
+from .restaurant_profile import get_restaurant_profile
 
 
 def is_einvoice_required(order: Dict[str, Any], threshold: float = 50000.0) -> bool:
@@ -14,9 +19,25 @@ def generate_einvoice_json(invoice_number: str) -> Optional[Dict[str, Any]]:
 	order = get_order_by_invoice(invoice_number)
 	if not order:
 		return None
-	
+	return build_einvoice_json(order)
+
+
+def build_einvoice_json(
+	order: Dict[str, Any],
+	seller: Optional[Dict[str, Any]] = None,
+	buyer: Optional[Dict[str, Any]] = None,
+	states: Optional[States] = None,
+) -> Optional[Dict[str, Any]]:
+	"""E-invoice JSON for an already fetched order. Returns None if not required.
+
+	``buyer`` adds to or overrides BuyerDtls (e.g. the address, which Orders does not store).
+	Batch callers pass ``seller`` and ``states`` built once for all their orders.
+	"""
 	if not is_einvoice_required(order):
 		return None
+	seller = seller if seller is not None else get_restaurant_profile().seller_details()
+	buyer_details = _get_buyer_details(order, buyer, states)
+	igst = float(order.get("igst", 0))
 	
 	# Basic e-invoice structure (IRN format)
 	einvoice = {
@@ -24,16 +45,17 @@ def generate_einvoice_json(invoice_number: str) -> Optional[Dict[str, Any]]:
 		"TranDtls": {
 			"TaxSch": "GST",
 			"SupTyp": "B2B" if order.get("customer_gstin") else "B2C",
-			"IgstOnIntra": "N" if order.get("place_of_supply") == "27" else "Y"
+			# "Y" only when IGST is charged on a supply within the seller's own state
+			"IgstOnIntra": "Y" if igst > 0 and buyer_details.get("Pos") == seller.get("Stcd") else "N"
 		},
 		"DocDtls": {
 			"Typ": "INV",
 			"No": order["invoice_number"],
-			"Dt": order["invoice_date"][:10]  # YYYY-MM-DD
+			"Dt": datetime.strptime(order["invoice_date"][:10], "%Y-%m-%d").strftime("%d/%m/%Y")  # DD/MM/YYYY
 		},
-		"SellerDtls": _get_seller_details(),
-		"BuyerDtls": _get_buyer_details(order),
-		"ItemList": _build_item_list(order["items"]),
+		"SellerDtls": seller,
+		"BuyerDtls": buyer_details,
+		"ItemList": _build_item_list(order),
 		"ValDtls": {
 			"AssVal": float(order["subtotal"]),
 			"TotInvVal": float(order["total"]),
@@ -45,50 +67,58 @@ def generate_einvoice_json(invoice_number: str) -> Optional[Dict[str, Any]]:
 	if float(order.get("cgst", 0)) > 0 or float(order.get("sgst", 0)) > 0:
 		einvoice["ValDtls"]["CgstVal"] = float(order["cgst"])
 		einvoice["ValDtls"]["SgstVal"] = float(order["sgst"])
-	if float(order.get("igst", 0)) > 0:
-		einvoice["ValDtls"]["IgstVal"] = float(order["igst"])
+	if igst > 0:
+		einvoice["ValDtls"]["IgstVal"] = igst
+	# The service charge is in the invoice value but not in any item
+	if float(order.get("service_charge", 0)) > 0:
+		einvoice["ValDtls"]["OthChrg"] = float(order["service_charge"])
 	
 	return einvoice
 
 
-def _get_seller_details() -> Dict[str, Any]:
-	"""Get seller (restaurant) details for e-invoice."""
-	with get_conn() as conn:
-		cur = conn.execute("SELECT name, address, gstin, state_code FROM Restaurant LIMIT 1")
-		row = cur.fetchone()
-		if not row:
-			return {}
-		return {
-			"Gstin": row[2],
-			"LglNm": row[0],
-			"Addr1": row[1],
-			"Loc": "Mumbai",
-			"Pin": 400001,
-			"Stcd": row[3]
-		}
-
-
-def _get_buyer_details(order: Dict[str, Any]) -> Dict[str, Any]:
+def _get_buyer_details(
+	order: Dict[str, Any], extra: Optional[Dict[str, Any]] = None, states: Optional[States] = None
+) -> Dict[str, Any]:
 	"""Get buyer details for e-invoice."""
+	# Orders may hold the state name; the IRN schema wants the state code
+	place = order.get("place_of_supply")
+	pos = states.code(place) if states is not None else state_code(place)
+	details: Dict[str, Any] = {"LglNm": order.get("customer_name") or "Walk-in Customer", "Pos": pos}
 	if order.get("customer_gstin"):
-		return {
-			"Gstin": order["customer_gstin"],
-			"LglNm": order.get("customer_name", "Walk-in Customer"),
-			"Pos": order.get("place_of_supply", "27")
-		}
-	else:
-		return {
-			"LglNm": order.get("customer_name", "Walk-in Customer"),
-			"Pos": order.get("place_of_supply", "27")
-		}
+		details = {"Gstin": order["customer_gstin"], **details, "Stcd": order["customer_gstin"][:2]}
+	details.update(extra or {})
+	return details
+
 
+def _split_group_tax(lines: list, group: Dict[str, Any]) -> None:
+	"""Spread an OrderTaxSummary row's taxes over its lines pro rata, in paise, so line sums equal the row."""
+	taxable = [to_paise(item["line_amount"]) for item in lines]
+	base = sum(taxable)
+	for name in ("cgst", "sgst", "igst"):
+		remaining = to_paise(group[name])
+		for i, item in enumerate(lines):
+			if i == len(lines) - 1 or not base:
+				share = remaining
+			else:
+				share = (to_paise(group[name]) * taxable[i] + base // 2) // base
+			item[name] = to_rupees(share)
+			remaining -= share
 
-def _build_item_list(items: list) -> list:
-	"""Build item list for e-invoice."""
+
+def _build_item_list(order: Dict[str, Any]) -> list:
+	"""Build item list for e-invoice, with taxes taken from the stored per HSN/rate summary."""
+	items = [dict(item, cgst=0.0, sgst=0.0, igst=0.0) for item in order["items"]]
+	groups: Dict[tuple, list] = {}
+	for item in items:
+		groups.setdefault((str(item["hsn_code"]), float(item["gst_slab"])), []).append(item)
+	for row in order.get("tax_summary") or []:
+		lines = groups.get((str(row["hsn_code"]), float(row["rate"])))
+		if lines:
+			_split_group_tax(lines, row)
 	item_list = []
 	for item in items:
 		item_list.append({
-			"SlNo": len(item_list) + 1,
+			"SlNo": str(len(item_list) + 1),
 			"PrdDesc": item["item_name"],
 			"IsServc": "Y",  # Restaurant services
 			"HsnCd": item["hsn_code"],
@@ -98,23 +128,55 @@ def _build_item_list(items: list) -> list:
 			"TotAmt": float(item["line_amount"]),
 			"AssAmt": float(item["line_amount"]),
 			"GstRt": float(item["gst_slab"]),
-			"IgstAmt": 0.0,  # Will be calculated based on place of supply
-			"CgstAmt": 0.0,
-			"SgstAmt": 0.0
+			"IgstAmt": item["igst"],
+			"CgstAmt": item["cgst"],
+			"SgstAmt": item["sgst"],
+			"TotItemVal": to_rupees(to_paise(item["line_amount"]) + to_paise(item["cgst"]) + to_paise(item["sgst"]) + to_paise(item["igst"])),
 		})
 	return item_list
 
 
 def save_einvoice_json(invoice_number: str) -> Optional[str]:
-	"""Save e-invoice JSON to file. Returns file path if saved, None if not required."""
+	"""Store the e-invoice JSON. Returns its day container path if stored, None if not required."""
 	einvoice = generate_einvoice_json(invoice_number)
 	if not einvoice:
 		return None
-	
-	import json
-	from .config import CONFIG
-	
-	CONFIG.invoices_path.mkdir(parents=True, exist_ok=True)
-	file_path = CONFIG.invoices_path / f"{invoice_number}_einvoice.json"
-	file_path.write_text(json.dumps(einvoice, indent=2), encoding="utf-8")
-	return str(file_path)
+	return _write_einvoice_json(einvoice, einvoice_day(einvoice))
+
+
+def einvoice_day(einvoice: Dict[str, Any]) -> str:
+	"""The invoice day (YYYY-MM-DD) of an e-invoice, whose DocDtls.Dt is DD/MM/YYYY."""
+	return datetime.strptime(einvoice["DocDtls"]["Dt"], "%d/%m/%Y").date().isoformat()
+
+
+def load_einvoice_json(invoice_number: str) -> Optional[Dict[str, Any]]:
+	data = load_document(invoice_number, f"{invoice_number}_einvoice.json")
+	return json.loads(data) if data is not None else None
+
+
+def _write_einvoice_json(einvoice: Dict[str, Any], day: str) -> str:
+	number = einvoice["DocDtls"]["No"]
+	data = json.dumps(einvoice, indent=2).encode("utf-8")
+	return str(save_document(day, f"{number}_einvoice.json", data))
+
+
+def _save_einvoices(orders: Iterable[Dict[str, Any]]) -> List[str]:
+	profile = get_restaurant_profile()
+	seller = profile.seller_details()
+	states = States(profile.state_code)
+	paths = []
+	for order in orders:
+		einvoice = build_einvoice_json(order, seller, states=states)
+		if einvoice:
+			paths.append(_write_einvoice_json(einvoice, str(order["invoice_date"])[:10]))
+	return paths
+
+
+def save_einvoice_jsons(invoice_numbers: Iterable[str]) -> List[str]:
+	"""Bulk ``save_einvoice_json``: one batch fetch; returns paths of the e-invoices that were required."""
+	return _save_einvoices(get_orders_by_invoices(invoice_numbers).values())
+
+
+def save_einvoice_jsons_for_days(start_day: str, end_day: str) -> List[str]:
+	"""E-invoice JSON for every PAID order in a day range, streaming the orders."""
+	return _save_einvoices(iter_orders(start_day, end_day, 'PAID'))
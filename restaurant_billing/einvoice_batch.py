@@ -0,0 +1,325 @@
+"""
+Batch e-invoice generation for IRP bulk upload.
+
+Orders are fetched set-wise (``iter_orders`` for a day range or
+``get_orders_by_invoices`` in chunks), each B2B order becomes an IRN v1.1
+document with its real per-item taxes, and every document is checked by a
+validator compiled once from ``IRN_SCHEMA`` plus the IRP's value checks.
+Valid documents are streamed into bulk-upload files (a JSON array of
+invoices, at most ``per_file`` per file); invalid ones are listed with their
+errors in a CSV next to them.
+
+Orders only store the buyer's name and GSTIN. The buyer's address, which the
+IRN schema requires, comes from a CSV keyed by GSTIN (``load_buyers``).
+"""
+
+import csv
+import json
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, TextIO
+
+from .config import CONFIG
+from .db import get_orders_by_invoices, iter_orders
+from .einvoice import build_einvoice_json
+from .gst import to_paise
+from .gst_returns import States
+from .restaurant_profile import get_restaurant_profile
+
+
+_AMOUNT = {"type": "number", "minimum": 0, "maximum": 999999999999.99}
+_STATE = {"type": "string", "pattern": r"^[0-9]{1,2}$"}
+
+# The parts of the NIC IRN v1.1 schema that this application fills in
+IRN_SCHEMA: Dict[str, Any] = {
+	"type": "object",
+	"required": ["Version", "TranDtls", "DocDtls", "SellerDtls", "BuyerDtls", "ItemList", "ValDtls"],
+	"properties": {
+		"Version": {"type": "string", "enum": ["1.1"]},
+		"TranDtls": {
+			"type": "object",
+			"required": ["TaxSch", "SupTyp"],
+			"properties": {
+				"TaxSch": {"type": "string", "enum": ["GST"]},
+				"SupTyp": {"type": "string", "enum": ["B2B", "SEZWP", "SEZWOP", "EXPWP", "EXPWOP", "DEXP"]},
+				"IgstOnIntra": {"type": "string", "enum": ["Y", "N"]},
+			},
+		},
+		"DocDtls": {
+			"type": "object",
+			"required": ["Typ", "No", "Dt"],
+			"properties": {
+				"Typ": {"type": "string", "enum": ["INV", "CRN", "DBN"]},
+				"No": {"type": "string", "pattern": r"^[A-Z1-9][A-Z0-9/-]{0,15}$"},
+				"Dt": {"type": "string", "pattern": r"^[0-3][0-9]/[0-1][0-9]/20[0-9]{2}$"},
+			},
+		},
+		"SellerDtls": {
+			"type": "object",
+			"required": ["Gstin", "LglNm", "Addr1", "Loc", "Pin", "Stcd"],
+			"properties": {
+				"Gstin": {"type": "string", "pattern": r"^[0-9]{2}[0-9A-Z]{13}$"},
+				"LglNm": {"type": "string", "minLength": 3, "maxLength": 100},
+				"Addr1": {"type": "string", "minLength": 1, "maxLength": 100},
+				"Loc": {"type": "string", "minLength": 3, "maxLength": 50},
+				"Pin": {"type": "integer", "minimum": 100000, "maximum": 999999},
+				"Stcd": _STATE,
+			},
+		},
+		"BuyerDtls": {
+			"type": "object",
+			"required": ["Gstin", "LglNm", "Pos", "Addr1", "Loc", "Stcd"],
+			"properties": {
+				"Gstin": {"type": "string", "pattern": r"^([0-9]{2}[0-9A-Z]{13}|URP)$"},
+				"LglNm": {"type": "string", "minLength": 3, "maxLength": 100},
+				"Pos": _STATE,
+				"Addr1": {"type": "string", "minLength": 1, "maxLength": 100},
+				"Addr2": {"type": "string", "minLength": 3, "maxLength": 100},
+				"Loc": {"type": "string", "minLength": 3, "maxLength": 100},
+				"Pin": {"type": "integer", "minimum": 100000, "maximum": 999999},
+				"Stcd": _STATE,
+			},
+		},
+		"ItemList": {
+			"type": "array",
+			"minItems": 1,
+			"maxItems": 1000,
+			"items": {
+				"type": "object",
+				"required": ["SlNo", "IsServc", "HsnCd", "UnitPrice", "TotAmt", "AssAmt", "GstRt", "TotItemVal"],
+				"properties": {
+					"SlNo": {"type": "string", "minLength": 1, "maxLength": 6},
+					"PrdDesc": {"type": "string", "minLength": 3, "maxLength": 300},
+					"IsServc": {"type": "string", "enum": ["Y", "N"]},
+					"HsnCd": {"type": "string", "pattern": r"^[0-9]{4,8}$"},
+					"Qty": _AMOUNT,
+					"Unit": {"type": "string", "minLength": 3, "maxLength": 8},
+					"UnitPrice": _AMOUNT,
+					"TotAmt": _AMOUNT,
+					"AssAmt": _AMOUNT,
+					"GstRt": {"type": "number", "minimum": 0, "maximum": 999.999},
+					"IgstAmt": _AMOUNT,
+					"CgstAmt": _AMOUNT,
+					"SgstAmt": _AMOUNT,
+					"TotItemVal": _AMOUNT,
+				},
+			},
+		},
+		"ValDtls": {
+			"type": "object",
+			"required": ["AssVal", "TotInvVal"],
+			"properties": {
+				"AssVal": _AMOUNT,
+				"CgstVal": _AMOUNT,
+				"SgstVal": _AMOUNT,
+				"IgstVal": _AMOUNT,
+				"OthChrg": _AMOUNT,
+				"TotInvVal": _AMOUNT,
+				"TotInvValFc": _AMOUNT,
+			},
+		},
+	},
+}
+
+
+_Check = Callable[[Any, str, List[str]], None]
+
+_TYPES = {
+	"object": lambda v: isinstance(v, dict),
+	"array": lambda v: isinstance(v, list),
+	"string": lambda v: isinstance(v, str),
+	"number": lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+	"integer": lambda v: isinstance(v, int) and not isinstance(v, bool),
+}
+
+
+def compile_schema(schema: Dict[str, Any]) -> _Check:
+	"""Turn a JSON-schema subset (type, required, properties, items, enum, pattern, length and range
+	bounds) into nested closures, so each document is checked without re-reading the schema."""
+	checks: List[_Check] = []
+	if "enum" in schema:
+		allowed = set(schema["enum"])
+		checks.append(lambda v, p, e: v in allowed or e.append(f"{p}: {v!r} is not one of {sorted(allowed)}"))
+	if "pattern" in schema:
+		regex = re.compile(schema["pattern"])
+		checks.append(lambda v, p, e: regex.match(v) or e.append(f"{p}: {v!r} does not match {regex.pattern}"))
+	for key, test, message in (
+		("minLength", lambda v, n: len(v) >= n, "is shorter than"),
+		("maxLength", lambda v, n: len(v) <= n, "is longer than"),
+		("minItems", lambda v, n: len(v) >= n, "has fewer items than"),
+		("maxItems", lambda v, n: len(v) <= n, "has more items than"),
+		("minimum", lambda v, n: v >= n, "is less than"),
+		("maximum", lambda v, n: v <= n, "is greater than"),
+	):
+		if key in schema:
+			bound = schema[key]
+			checks.append(lambda v, p, e, t=test, b=bound, m=message: t(v, b) or e.append(f"{p}: {v!r} {m} {b}"))
+	if "required" in schema:
+		required = tuple(schema["required"])
+
+		def check_required(v: Any, p: str, e: List[str]) -> None:
+			e.extend(f"{p}.{k}: required" for k in required if k not in v)
+		checks.append(check_required)
+	if "properties" in schema:
+		props = {k: compile_schema(s) for k, s in schema["properties"].items()}
+
+		def check_properties(v: Any, p: str, e: List[str]) -> None:
+			for k, sub in props.items():
+				if k in v:
+					sub(v[k], f"{p}.{k}", e)
+		checks.append(check_properties)
+	if "items" in schema:
+		item = compile_schema(schema["items"])
+
+		def check_items(v: Any, p: str, e: List[str]) -> None:
+			for i, x in enumerate(v):
+				item(x, f"{p}[{i}]", e)
+		checks.append(check_items)
+
+	is_type = _TYPES.get(schema.get("type", ""), lambda v: True)
+	type_name = schema.get("type")
+
+	def check(value: Any, path: str, errors: List[str]) -> None:
+		if not is_type(value):
+			errors.append(f"{path}: expected {type_name}, got {type(value).__name__}")
+			return
+		for c in checks:
+			c(value, path, errors)
+
+	return check
+
+
+_CHECK_IRN = compile_schema(IRN_SCHEMA)
+
+
+def validate_einvoice(doc: Dict[str, Any]) -> List[str]:
+	"""Schema errors plus the IRP's value checks (item and invoice totals must add up to the paisa)."""
+	errors: List[str] = []
+	_CHECK_IRN(doc, "$", errors)
+	if errors:
+		return errors
+	items, val = doc["ItemList"], doc["ValDtls"]
+	if sum(to_paise(i["AssAmt"]) for i in items) != to_paise(val["AssVal"]):
+		errors.append("$.ValDtls.AssVal: does not equal the sum of item AssAmt")
+	for name, item_name in (("CgstVal", "CgstAmt"), ("SgstVal", "SgstAmt"), ("IgstVal", "IgstAmt")):
+		if sum(to_paise(i.get(item_name, 0)) for i in items) != to_paise(val.get(name, 0)):
+			errors.append(f"$.ValDtls.{name}: does not equal the sum of item {item_name}")
+	parts = ("AssVal", "CgstVal", "SgstVal", "IgstVal", "OthChrg")
+	if sum(to_paise(val.get(k, 0)) for k in parts) != to_paise(val["TotInvVal"]):
+		errors.append("$.ValDtls.TotInvVal: does not equal AssVal + taxes + OthChrg")
+	return errors
+
+
+def load_buyers(csv_path: Path) -> Dict[str, Dict[str, Any]]:
+	"""Buyer addresses by GSTIN from a CSV with columns gstin, addr1, loc and optionally legal_name, addr2, pin."""
+	buyers: Dict[str, Dict[str, Any]] = {}
+	with open(csv_path, newline="", encoding="utf-8") as f:
+		for row in csv.DictReader(f):
+			gstin = (row.get("gstin") or "").strip().upper()
+			if not gstin:
+				continue
+			details: Dict[str, Any] = {"Addr1": (row.get("addr1") or "").strip(), "Loc": (row.get("loc") or "").strip()}
+			if (row.get("legal_name") or "").strip():
+				details["LglNm"] = row["legal_name"].strip()
+			if (row.get("addr2") or "").strip():
+				details["Addr2"] = row["addr2"].strip()
+			if (row.get("pin") or "").strip().isdigit():
+				details["Pin"] = int(row["pin"])
+			buyers[gstin] = details
+	return buyers
+
+
+@dataclass(slots=True)
+class BatchResult:
+	files: List[Path] = field(default_factory=list)
+	written: int = 0
+	invalid: int = 0
+	skipped: int = 0  # B2C orders and orders below the e-invoice threshold
+	errors_path: Optional[Path] = None
+
+
+class _BulkWriter:
+	"""Streams documents into JSON-array files of at most ``per_file`` invoices each."""
+
+	def __init__(self, out_dir: Path, stem: str, per_file: int, result: BatchResult):
+		self.out_dir, self.stem, self.per_file, self.result = out_dir, stem, per_file, result
+		self._f: Optional[TextIO] = None
+		self._count = 0
+
+	def write(self, doc: Dict[str, Any]) -> None:
+		if self._f is None or self._count >= self.per_file:
+			self.close()
+			path = self.out_dir / f"{self.stem}_{len(self.result.files) + 1:03d}.json"
+			self.result.files.append(path)
+			self._f = open(path, "w", encoding="utf-8")
+			self._f.write("[\n")
+			self._count = 0
+		if self._count:
+			self._f.write(",\n")
+		self._f.write(json.dumps(doc, ensure_ascii=False, separators=(",", ":")))
+		self._count += 1
+
+	def close(self) -> None:
+		if self._f is not None:
+			self._f.write("\n]\n")
+			self._f.close()
+			self._f = None
+
+
+def _orders_for_numbers(invoice_numbers: Sequence[str], batch_size: int) -> Iterator[Dict[str, Any]]:
+	for i in range(0, len(invoice_numbers), batch_size):
+		yield from get_orders_by_invoices(invoice_numbers[i:i + batch_size]).values()
+
+
+def export_einvoice_batch(
+	start_day: Optional[str] = None,
+	end_day: Optional[str] = None,
+	invoice_numbers: Optional[Sequence[str]] = None,
+	buyers: Optional[Dict[str, Dict[str, Any]]] = None,
+	out_dir: Optional[Path] = None,
+	per_file: int = 500,
+	batch_size: int = 200,
+	status: str = "PAID",
+) -> BatchResult:
+	"""Write IRP bulk-upload JSON for the B2B orders of a day range (or the given invoice numbers)."""
+	if invoice_numbers is not None:
+		orders: Iterable[Dict[str, Any]] = _orders_for_numbers(list(dict.fromkeys(invoice_numbers)), batch_size)
+		stem = "einvoice_bulk_selected"
+	elif start_day and end_day:
+		orders = iter_orders(start_day, end_day, status, batch_size)
+		stem = f"einvoice_bulk_{start_day}_{end_day}"
+	else:
+		raise ValueError("Give a day range or invoice numbers")
+	out_dir = Path(out_dir or CONFIG.returns_path / "einvoice")
+	out_dir.mkdir(parents=True, exist_ok=True)
+	profile = get_restaurant_profile()
+	seller = profile.seller_details()
+	states = States(profile.state_code)
+	buyers = buyers or {}
+
+	result = BatchResult(errors_path=out_dir / f"{stem}_errors.csv")
+	writer = _BulkWriter(out_dir, stem, per_file, result)
+	with open(result.errors_path, "w", newline="", encoding="utf-8") as ef:
+		errors_csv = csv.writer(ef)
+		errors_csv.writerow(["invoice_number", "error"])
+		try:
+			for order in orders:
+				gstin = (order.get("customer_gstin") or "").strip().upper()
+				doc = build_einvoice_json(order, seller, buyers.get(gstin), states) if gstin else None
+				if doc is None:
+					result.skipped += 1
+					continue
+				errors = validate_einvoice(doc)
+				if errors:
+					result.invalid += 1
+					errors_csv.writerows((order["invoice_number"], err) for err in errors)
+					continue
+				writer.write(doc)
+				result.written += 1
+		finally:
+			writer.close()
+	if not result.invalid:
+		result.errors_path.unlink()
+		result.errors_path = None
+	return result
@@ -0,0 +1,142 @@
+"""
+Receipt printer stand-ins for tests and benchmarks without hardware.
+
+``FilePrinter`` takes raw ESC/POS writes like a python-escpos printer
+(``_raw``) and appends them to a file or keeps them in memory.
+``FakeNetworkPrinter`` is a TCP server that accepts raw ESC/POS the way a LAN
+printer does on port 9100, optionally slowed down to mimic print speed. Both
+count writes and bytes so a test can check that a receipt went out in one write.
+"""
+
+import socket
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+
+class FilePrinter:
+	def __init__(self, path: Optional[Path] = None):
+		self.path = Path(path) if path else None
+		self.writes = 0
+		self.bytes_written = 0
+		self._data = bytearray()
+
+	def _raw(self, data: bytes) -> None:
+		if self.path is not None:
+			with open(self.path, "ab") as f:
+				f.write(data)
+		else:
+			self._data += data
+		self.writes += 1
+		self.bytes_written += len(data)
+
+	@property
+	def data(self) -> bytes:
+		return self.path.read_bytes() if self.path is not None else bytes(self._data)
+
+
+class FakeNetworkPrinter:
+	"""A raw-TCP printer on ``host:port`` (port 0 picks a free one); use as a context manager."""
+
+	def __init__(self, host: str = "127.0.0.1", port: int = 0, delay_per_kb: float = 0.0):
+		self.delay_per_kb = delay_per_kb  # seconds of "printing" per KiB received
+		self.connections = 0
+		self.reads = 0
+		self._received = bytearray()
+		self._cond = threading.Condition()
+		self._clients: List[socket.socket] = []
+		self._stopping = False
+		self._server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+		self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+		self._server.bind((host, port))
+		self._server.listen(8)
+		self.address: Tuple[str, int] = self._server.getsockname()
+		self._thread = threading.Thread(target=self._accept, name="fake-printer", daemon=True)
+
+	def __enter__(self) -> "FakeNetworkPrinter":
+		self.start()
+		return self
+
+	def __exit__(self, *exc) -> None:
+		self.stop()
+
+	def start(self) -> None:
+		self._thread.start()
+
+	def stop(self) -> None:
+		if self._stopping:
+			return
+		self._stopping = True
+		try:
+			# Unblocks accept(); close() alone leaves the port listening on Linux
+			self._server.shutdown(socket.SHUT_RDWR)
+		except OSError:
+			pass
+		self._server.close()
+		with self._cond:
+			clients = list(self._clients)
+		for client in clients:
+			self.drop(client)
+		self._thread.join(2)
+
+	def drop(self, client: Optional[socket.socket] = None) -> None:
+		"""Reset a client connection (the oldest when not given), as a flaky printer does."""
+		with self._cond:
+			if client is None:
+				if not self._clients:
+					return
+				client = self._clients[0]
+			if client in self._clients:
+				self._clients.remove(client)
+		try:
+			client.shutdown(socket.SHUT_RDWR)
+		except OSError:
+			pass
+		client.close()
+
+	@property
+	def received(self) -> bytes:
+		with self._cond:
+			return bytes(self._received)
+
+	def wait_for(self, size: int, timeout: float = 5.0) -> bool:
+		"""Wait until at least ``size`` bytes have arrived."""
+		deadline = time.monotonic() + timeout
+		with self._cond:
+			while len(self._received) < size:
+				remaining = deadline - time.monotonic()
+				if remaining <= 0:
+					return False
+				self._cond.wait(remaining)
+			return True
+
+	def _accept(self) -> None:
+		while not self._stopping:
+			try:
+				client, _ = self._server.accept()
+			except OSError:
+				return
+			with self._cond:
+				self._clients.append(client)
+				self.connections += 1
+			threading.Thread(target=self._read, args=(client,), daemon=True).start()
+
+	def _read(self, client: socket.socket) -> None:
+		while True:
+			try:
+				chunk = client.recv(65536)
+			except OSError:
+				chunk = b""
+			if not chunk:
+				break
+			if self.delay_per_kb:
+				time.sleep(self.delay_per_kb * len(chunk) / 1024)
+			with self._cond:
+				self._received += chunk
+				self.reads += 1
+				self._cond.notify_all()
+		with self._cond:
+			if client in self._clients:
+				self._clients.remove(client)
+		client.close()
@@ -1,17 +1,212 @@
-from typing import Dict, Tuple
+from bisect import bisect_right
+from dataclasses import dataclass, field
+from datetime import date
+from threading import Lock
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
 
-from .db import get_conn
+from .db import get_conn, transaction, with_lock_retry
 
 
-def get_rates_for_slab(slab_percent: float) -> Tuple[float, float]:
-	"""Get CGST and SGST rates for a slab - using 50/50 split as default."""
-	# For now, use a simple 50/50 split for CGST and SGST
-	half = round(float(slab_percent) / 2.0, 4)
-	return half, half
+# Amounts are integer paise and rates integer basis points (1% = 100 bp) so
+# line taxes round exactly once and order totals are plain integer sums.
+
+def to_paise(amount: float) -> int:
+	"""Rupees -> paise, rounding half away from zero (1.005 -> 101)."""
+	value = float(amount) * 100
+	if value < 0:
+		return -int(-value + 0.5 + 1e-7)
+	return int(value + 0.5 + 1e-7)
+
+
+def to_rupees(paise: int) -> float:
+	return paise / 100
+
+
+def to_bp(percent: float) -> int:
+	return to_paise(percent)
+
+
+def _apply_rate(paise: int, bp: int) -> int:
+	# Half-up rounding of paise * bp / 10000 in integers
+	if paise < 0:
+		return -((-paise * bp + 5000) // 10000)
+	return (paise * bp + 5000) // 10000
+
+
+class _RateIndex:
+	"""GSTSettings grouped by slab, each slab's rows sorted by applicable_from."""
+
+	def __init__(self, rows: Iterable[Tuple[float, float, float, str]]):
+		by_slab: Dict[int, List[Tuple[str, int, int]]] = {}
+		for slab, cgst, sgst, applicable_from in rows:
+			by_slab.setdefault(to_bp(slab), []).append((str(applicable_from)[:10], to_bp(cgst), to_bp(sgst)))
+		self._dates: Dict[int, List[str]] = {}
+		self._rates: Dict[int, List[Tuple[int, int]]] = {}
+		for slab_bp, entries in by_slab.items():
+			entries.sort()
+			self._dates[slab_bp] = [e[0] for e in entries]
+			self._rates[slab_bp] = [(e[1], e[2]) for e in entries]
+
+	def schedule(self, slab_bp: int) -> Tuple[List[str], List[Tuple[int, int]]]:
+		"""A slab's applicable_from days and their (cgst_bp, sgst_bp), oldest first."""
+		return self._dates.get(slab_bp, []), self._rates.get(slab_bp, [])
+
+	def rates(self, slab_bp: int, on_day: str) -> Tuple[int, int]:
+		dates = self._dates.get(slab_bp)
+		if dates:
+			i = bisect_right(dates, on_day)
+			if i:
+				return self._rates[slab_bp][i - 1]
+		# No setting in force for this slab on that day: split it evenly
+		half = slab_bp // 2
+		return half, slab_bp - half
+
+
+_RATE_INDEX: Optional[_RateIndex] = None
+_RATE_INDEX_LOCK = Lock()
+
+
+def get_rate_index() -> _RateIndex:
+	global _RATE_INDEX
+	with _RATE_INDEX_LOCK:
+		if _RATE_INDEX is None:
+			with get_conn() as conn:
+				rows = conn.execute("SELECT slab_rate, cgst_rate, sgst_rate, applicable_from FROM GSTSettings").fetchall()
+			_RATE_INDEX = _RateIndex(rows)
+		return _RATE_INDEX
+
+
+def invalidate_rate_cache() -> None:
+	"""Drop the cached GSTSettings; the next calculation reloads them."""
+	global _RATE_INDEX
+	with _RATE_INDEX_LOCK:
+		_RATE_INDEX = None
+
+
+@with_lock_retry
+def set_gst_rate(slab_rate: float, cgst_rate: float, sgst_rate: float, applicable_from: str) -> None:
+	"""Add or change the CGST/SGST split of a slab from ``applicable_from`` (YYYY-MM-DD) onwards."""
+	with transaction() as conn:
+		conn.execute(
+			"""
+			INSERT INTO GSTSettings(slab_rate, cgst_rate, sgst_rate, applicable_from) VALUES (?, ?, ?, ?)
+			ON CONFLICT(slab_rate, applicable_from) DO UPDATE SET cgst_rate = excluded.cgst_rate, sgst_rate = excluded.sgst_rate
+			""",
+			(slab_rate, cgst_rate, sgst_rate, applicable_from),
+		)
+	invalidate_rate_cache()
+
+
+def get_rates_for_slab(slab_percent: float, on_day: Optional[str] = None) -> Tuple[float, float]:
+	"""CGST and SGST percentages for a slab as in force on ``on_day`` (default today)."""
+	cgst_bp, sgst_bp = get_rate_index().rates(to_bp(slab_percent), on_day or date.today().isoformat())
+	return cgst_bp / 100, sgst_bp / 100
 
 
 def round_indian(value: float) -> float:
-	return round(value + 1e-9, 2)
+	return to_paise(value) / 100
+
+
+@dataclass(slots=True)
+class LineTax:
+	hsn_code: str
+	slab_bp: int
+	taxable: int
+	cgst: int = 0
+	sgst: int = 0
+	igst: int = 0
+
+
+@dataclass(slots=True)
+class HsnTax:
+	taxable: int = 0
+	cgst: int = 0
+	sgst: int = 0
+	igst: int = 0
+
+
+@dataclass(slots=True)
+class OrderTax:
+	"""Tax of one order in paise. Totals are exact sums of the per-line values."""
+	subtotal: int = 0
+	service_charge: int = 0
+	cgst: int = 0
+	sgst: int = 0
+	igst: int = 0
+	lines: List[LineTax] = field(default_factory=list)
+	by_hsn: Dict[str, HsnTax] = field(default_factory=dict)
+	# Same sums split by (hsn_code, slab_bp): the rows of OrderTaxSummary
+	by_hsn_rate: Dict[Tuple[str, int], HsnTax] = field(default_factory=dict)
+	gst_enabled: bool = True
+
+	@property
+	def total(self) -> int:
+		return self.subtotal + self.service_charge + self.cgst + self.sgst + self.igst
+
+	def as_totals(self) -> Dict[str, object]:
+		"""Rupee totals in the shape ``create_order`` and the UI expect."""
+		return {
+			"subtotal": to_rupees(self.subtotal),
+			"service_charge": to_rupees(self.service_charge),
+			"cgst": to_rupees(self.cgst),
+			"sgst": to_rupees(self.sgst),
+			"igst": to_rupees(self.igst),
+			"total": to_rupees(self.total),
+			"hsn_breakdown": {
+				hsn: {"taxable": to_rupees(h.taxable), "cgst": to_rupees(h.cgst), "sgst": to_rupees(h.sgst), "igst": to_rupees(h.igst)}
+				for hsn, h in self.by_hsn.items()
+			},
+			"tax_summary": self.summary_rows(),
+			"gst_enabled": self.gst_enabled,
+		}
+
+	def summary_rows(self) -> List[Dict[str, object]]:
+		"""Per HSN and rate rows in rupees, as stored in OrderTaxSummary."""
+		return [
+			{
+				"hsn_code": hsn, "rate": slab_bp / 100, "taxable": to_rupees(h.taxable),
+				"cgst": to_rupees(h.cgst), "sgst": to_rupees(h.sgst), "igst": to_rupees(h.igst),
+			}
+			for (hsn, slab_bp), h in self.by_hsn_rate.items()
+		]
+
+
+def compute_order_tax(
+	lines: Iterable[Mapping[str, object]],
+	intra_state: bool = True,
+	service_charge_percent: float = 0.0,
+	gst_enabled: bool = True,
+	on_day: Optional[str] = None,
+) -> OrderTax:
+	"""Per-line and per-HSN tax for order lines (mappings with quantity, rate, gst_slab, hsn_code)."""
+	index = get_rate_index() if gst_enabled else None
+	day = on_day or date.today().isoformat()
+	result = OrderTax(gst_enabled=gst_enabled)
+	for data in lines:
+		taxable = int(data.get("quantity", 1)) * to_paise(data.get("rate", 0.0))
+		line = LineTax(str(data.get("hsn_code", "996331")), to_bp(data.get("gst_slab", 0.0)), taxable)
+		if index is not None:
+			if intra_state:
+				cgst_bp, sgst_bp = index.rates(line.slab_bp, day)
+				line.cgst = _apply_rate(taxable, cgst_bp)
+				line.sgst = _apply_rate(taxable, sgst_bp)
+			else:
+				line.igst = _apply_rate(taxable, line.slab_bp)
+		result.lines.append(line)
+		result.subtotal += taxable
+		result.cgst += line.cgst
+		result.sgst += line.sgst
+		result.igst += line.igst
+		for groups, key in ((result.by_hsn, line.hsn_code), (result.by_hsn_rate, (line.hsn_code, line.slab_bp))):
+			group = groups.get(key)
+			if group is None:
+				group = groups[key] = HsnTax()
+			group.taxable += taxable
+			group.cgst += line.cgst
+			group.sgst += line.sgst
+			group.igst += line.igst
+	result.service_charge = _apply_rate(result.subtotal, to_bp(service_charge_percent))
+	return result
 
 
 def compute_gst_for_order_items(
@@ -30,48 +225,4 @@ def compute_gst_for_order_items(
 		}
 	}
 	"""
-	subtotal = 0.0
-	hsn_tax_map: Dict[str, Dict[str, float]] = {}
-
-	for item, data in items.items():
-		qty = int(data.get("quantity", 1))
-		rate = float(data.get("rate", 0.0))
-		slab = float(data.get("gst_slab", 0.0))
-		line = qty * rate
-		subtotal += line
-		hsn = str(data.get("hsn_code", "996331"))
-		hsn_entry = hsn_tax_map.setdefault(hsn, {"taxable": 0.0, "cgst": 0.0, "sgst": 0.0, "igst": 0.0})
-		hsn_entry["taxable"] += line
-		
-		# Only calculate GST if enabled
-		if gst_enabled:
-			cgst_rate, sgst_rate = get_rates_for_slab(slab)
-			if intra_state:
-				hsn_entry["cgst"] += line * cgst_rate / 100.0
-				hsn_entry["sgst"] += line * sgst_rate / 100.0
-			else:
-				hsn_entry["igst"] += line * slab / 100.0
-
-	service_charge = subtotal * (service_charge_percent / 100.0)
-	taxable_total = subtotal + service_charge
-
-	total_cgst = sum(v["cgst"] for v in hsn_tax_map.values())
-	total_sgst = sum(v["sgst"] for v in hsn_tax_map.values())
-	total_igst = sum(v["igst"] for v in hsn_tax_map.values())
-
-	# If GST is disabled, total is just subtotal + service charge
-	if not gst_enabled:
-		total_amount = taxable_total
-	else:
-		total_amount = taxable_total + total_cgst + total_sgst + total_igst
-
-	return {
-		"subtotal": round_indian(subtotal),
-		"service_charge": round_indian(service_charge),
-		"cgst": round_indian(total_cgst),
-		"sgst": round_indian(total_sgst),
-		"igst": round_indian(total_igst),
-		"total": round_indian(total_amount),
-		"hsn_breakdown": hsn_tax_map,
-		"gst_enabled": gst_enabled,
-	}
+	return compute_order_tax(items.values(), intra_state, service_charge_percent, gst_enabled).as_totals()
@@ -0,0 +1,211 @@
+"""
+Bulk GST audit of stored orders.
+
+Re-derives each order's subtotal and taxes from its OrderItems with the
+integer-paise rules of ``gst.compute_order_tax`` (rates as in force on the
+invoice day) and reports orders whose stored Orders columns differ. Archived
+financial years overlapping the day range are audited as well, and every
+mismatch names the database it came from. Orders are streamed in order_id
+chunks so memory stays bounded. With NumPy installed each chunk is taxed as
+columnar arrays and reduced per order with ``bincount``; without it the same
+rules run order by order.
+
+An order is audited as inter-state when its stored IGST is non-zero. The stored
+service charge is taken as given (its percentage is not recorded).
+"""
+
+import csv
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .db import get_conn
+from .gst import compute_order_tax, get_rate_index, to_paise
+
+try:
+	import numpy as np
+	_HAS_NUMPY = True
+except Exception:
+	_HAS_NUMPY = False
+
+
+AUDIT_FIELDS = ("subtotal", "cgst", "sgst", "igst", "total")
+HOT_SOURCE = "hot"
+
+_ORDERS_CHUNK_SQL = """
+	SELECT order_id, invoice_number, invoice_date, invoice_day, subtotal, cgst, sgst, igst, service_charge, total
+	FROM Orders
+	WHERE order_id > ? AND status IN ({statuses}) AND invoice_day BETWEEN ? AND ?
+	ORDER BY order_id LIMIT ?
+"""
+
+_ITEMS_CHUNK_SQL = """
+	SELECT order_id, quantity, rate, gst_slab FROM OrderItems
+	WHERE order_id BETWEEN ? AND ? ORDER BY order_id
+"""
+
+
+@dataclass(slots=True)
+class AuditMismatch:
+	order_id: int
+	invoice_number: str
+	invoice_date: str
+	field: str
+	stored: int  # paise
+	expected: int  # paise
+	source: str = HOT_SOURCE  # "hot" or the archive file name
+
+
+def _sources(start_day: str, end_day: str) -> List[Tuple[str, Optional[Path]]]:
+	"""(label, path) of the archives overlapping the range, oldest first, then the hot database."""
+	from .archive import archives_for_range
+
+	sources: List[Tuple[str, Optional[Path]]] = [(path.name, path) for _, path in reversed(archives_for_range(start_day, end_day))]
+	sources.append((HOT_SOURCE, None))
+	return sources
+
+
+def _chunks(
+	db_path: Optional[Path], start_day: str, end_day: str, statuses: Sequence[str], chunk_size: int
+) -> Iterator[Tuple[List[tuple], List[tuple]]]:
+	sql = _ORDERS_CHUNK_SQL.format(statuses=",".join("?" * len(statuses)))
+	last_id = 0
+	while True:
+		with get_conn(db_path) as conn:
+			orders = conn.execute(sql, (last_id, *statuses, start_day, end_day, chunk_size)).fetchall()
+			if not orders:
+				return
+			items = conn.execute(_ITEMS_CHUNK_SQL, (orders[0][0], orders[-1][0])).fetchall()
+		last_id = orders[-1][0]
+		yield orders, items
+		if len(orders) < chunk_size:
+			return
+
+
+def _stored(order: tuple) -> Dict[str, int]:
+	return {
+		"subtotal": to_paise(order[4] or 0), "cgst": to_paise(order[5] or 0), "sgst": to_paise(order[6] or 0),
+		"igst": to_paise(order[7] or 0), "total": to_paise(order[9] or 0),
+	}
+
+
+def _audit_chunk_python(orders: List[tuple], items: List[tuple], source: str) -> List[AuditMismatch]:
+	lines: Dict[int, List[Dict[str, float]]] = {}
+	for order_id, quantity, rate, gst_slab in items:
+		lines.setdefault(order_id, []).append({"quantity": quantity, "rate": rate, "gst_slab": gst_slab})
+	out: List[AuditMismatch] = []
+	for order in orders:
+		stored = _stored(order)
+		tax = compute_order_tax(lines.get(order[0], ()), intra_state=not stored["igst"], on_day=order[3] or "0000-00-00")
+		expected = {
+			"subtotal": tax.subtotal, "cgst": tax.cgst, "sgst": tax.sgst, "igst": tax.igst,
+			"total": tax.subtotal + to_paise(order[8] or 0) + tax.cgst + tax.sgst + tax.igst,
+		}
+		for name in AUDIT_FIELDS:
+			if stored[name] != expected[name]:
+				out.append(AuditMismatch(order[0], order[1], order[2], name, stored[name], expected[name], source))
+	return out
+
+
+def _paise_array(values) -> "np.ndarray":
+	return np.floor(np.asarray(values, dtype=np.float64) * 100 + 0.5 + 1e-7).astype(np.int64)
+
+
+def _day_number(day: Optional[str]) -> int:
+	return int(day.replace("-", "")) if day else 0
+
+
+def _audit_chunk_numpy(orders: List[tuple], items: List[tuple], source: str) -> List[AuditMismatch]:
+	n = len(orders)
+	order_ids = np.fromiter((o[0] for o in orders), dtype=np.int64, count=n)
+	order_day = np.fromiter((_day_number(o[3]) for o in orders), dtype=np.int64, count=n)
+	cols = list(zip(*[(o[4] or 0, o[5] or 0, o[6] or 0, o[7] or 0, o[8] or 0, o[9] or 0) for o in orders]))
+	stored = {name: _paise_array(col) for name, col in zip(("subtotal", "cgst", "sgst", "igst", "service_charge", "total"), cols)}
+	inter = stored["igst"] != 0
+
+	expected = {name: np.zeros(n, dtype=np.int64) for name in ("subtotal", "cgst", "sgst", "igst")}
+	if items:
+		item_order = np.fromiter((it[0] for it in items), dtype=np.int64, count=len(items))
+		# Items are fetched by order_id range; drop those of orders filtered out by status/day
+		pos = np.searchsorted(order_ids, item_order)
+		pos_ok = pos < n
+		keep = pos_ok & (order_ids[np.minimum(pos, n - 1)] == item_order)
+		pos = pos[keep]
+		qty = np.fromiter((it[1] for it in items), dtype=np.int64, count=len(items))[keep]
+		rate = _paise_array([it[2] for it in items])[keep]
+		slab = _paise_array([it[3] for it in items])[keep]
+		taxable = qty * rate
+		line_day = order_day[pos]
+		line_inter = inter[pos]
+
+		cgst_bp = slab // 2
+		sgst_bp = slab - cgst_bp
+		index = get_rate_index()
+		for slab_bp in np.unique(slab):
+			dates, rates = index.schedule(int(slab_bp))
+			if not dates:
+				continue
+			mask = slab == slab_bp
+			i = np.searchsorted(np.array([_day_number(d) for d in dates], dtype=np.int64), line_day[mask], side="right") - 1
+			rate_table = np.array(rates, dtype=np.int64)
+			in_force = i >= 0
+			c = cgst_bp[mask]
+			s = sgst_bp[mask]
+			c[in_force] = rate_table[i[in_force], 0]
+			s[in_force] = rate_table[i[in_force], 1]
+			cgst_bp[mask] = c
+			sgst_bp[mask] = s
+
+		def per_order(values: "np.ndarray") -> "np.ndarray":
+			return np.rint(np.bincount(pos, weights=values, minlength=n)).astype(np.int64)
+
+		# Half-up rounding per line, as in gst._apply_rate
+		expected["subtotal"] = per_order(taxable)
+		expected["cgst"] = per_order(np.where(line_inter, 0, (taxable * cgst_bp + 5000) // 10000))
+		expected["sgst"] = per_order(np.where(line_inter, 0, (taxable * sgst_bp + 5000) // 10000))
+		expected["igst"] = per_order(np.where(line_inter, (taxable * slab + 5000) // 10000, 0))
+	expected["total"] = expected["subtotal"] + stored["service_charge"] + expected["cgst"] + expected["sgst"] + expected["igst"]
+
+	out: List[AuditMismatch] = []
+	for name in AUDIT_FIELDS:
+		for k in np.nonzero(stored[name] != expected[name])[0]:
+			o = orders[k]
+			out.append(AuditMismatch(o[0], o[1], o[2], name, int(stored[name][k]), int(expected[name][k]), source))
+	out.sort(key=lambda m: m.order_id)
+	return out
+
+
+def audit_orders(
+	start_day: str = "0000-00-00",
+	end_day: str = "9999-12-31",
+	statuses: Sequence[str] = ("PAID",),
+	chunk_size: int = 5000,
+	use_numpy: Optional[bool] = None,
+) -> Iterator[Tuple[int, List[AuditMismatch]]]:
+	"""Yield (orders_checked, mismatches) per chunk of orders in the day range, archives first."""
+	if use_numpy is None:
+		use_numpy = _HAS_NUMPY
+	elif use_numpy and not _HAS_NUMPY:
+		raise RuntimeError("NumPy is not installed")
+	audit_chunk = _audit_chunk_numpy if use_numpy else _audit_chunk_python
+	for source, db_path in _sources(start_day, end_day):
+		for orders, items in _chunks(db_path, start_day, end_day, statuses, chunk_size):
+			yield len(orders), audit_chunk(orders, items, source)
+
+
+def write_audit_report(report_path: Path, **kwargs) -> Tuple[int, int]:
+	"""Run ``audit_orders`` and stream mismatches to a CSV file. Returns (orders checked, orders mismatched)."""
+	checked = mismatched = 0
+	report_path.parent.mkdir(parents=True, exist_ok=True)
+	with open(report_path, "w", newline="", encoding="utf-8") as f:
+		writer = csv.writer(f)
+		writer.writerow(["source", "order_id", "invoice_number", "invoice_date", "field", "stored", "expected", "difference"])
+		for count, mismatches in audit_orders(**kwargs):
+			checked += count
+			mismatched += len({(m.source, m.order_id) for m in mismatches})
+			writer.writerows(
+				(m.source, m.order_id, m.invoice_number, m.invoice_date, m.field, f"{m.stored / 100:.2f}", f"{m.expected / 100:.2f}",
+				 f"{(m.stored - m.expected) / 100:.2f}")
+				for m in mismatches
+			)
+	return checked, mismatched
@@ -0,0 +1,317 @@
+"""
+Monthly GST return exports (GSTR-1 and GSTR-3B) from stored orders.
+
+Everything is read from PAID orders and their OrderTaxSummary rows with
+aggregate queries, so a month (or a year) exports without materialising the
+orders: B2CS, HSN and 3B figures are GROUP BY results, and B2B invoices stream
+from a cursor ordered by recipient GSTIN straight into the JSON and CSV files.
+Archived financial years overlapping the period are read as well; an order
+found in both an archive and the hot database (an archive run interrupted
+between copy and delete) is counted once, from the hot database.
+
+Outputs follow the GST portal JSON layout and the offline tool CSV columns.
+"""
+
+import csv
+import heapq
+import json
+import sqlite3
+from contextlib import contextmanager
+from datetime import date, datetime
+from itertools import groupby
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .config import CONFIG
+from .db import get_conn
+from .restaurant_profile import get_restaurant_profile
+
+
+_PAID_IN_PERIOD = "o.status = 'PAID' AND o.invoice_day BETWEEN ? AND ? {not_in_hot}"
+_HAS_GSTIN = "o.customer_gstin IS NOT NULL AND o.customer_gstin != ''"
+
+_B2B_SQL = f"""
+	SELECT o.customer_gstin, o.customer_name, o.order_id, o.invoice_number, o.invoice_day, o.total, o.place_of_supply,
+		s.rate, SUM(s.taxable), SUM(s.igst), SUM(s.cgst), SUM(s.sgst)
+	FROM Orders o JOIN OrderTaxSummary s ON s.order_id = o.order_id
+	WHERE {_PAID_IN_PERIOD} AND {_HAS_GSTIN}
+	GROUP BY o.order_id, s.rate
+	ORDER BY o.customer_gstin, o.invoice_day, o.order_id, s.rate
+"""
+
+_B2CS_SQL = f"""
+	SELECT o.place_of_supply, s.rate, SUM(s.taxable), SUM(s.igst), SUM(s.cgst), SUM(s.sgst)
+	FROM Orders o JOIN OrderTaxSummary s ON s.order_id = o.order_id
+	WHERE {_PAID_IN_PERIOD} AND NOT ({_HAS_GSTIN})
+	GROUP BY o.place_of_supply, s.rate
+"""
+
+_HSN_TAX_SQL = f"""
+	SELECT s.hsn_code, s.rate, SUM(s.taxable), SUM(s.igst), SUM(s.cgst), SUM(s.sgst)
+	FROM Orders o JOIN OrderTaxSummary s ON s.order_id = o.order_id
+	WHERE {_PAID_IN_PERIOD}
+	GROUP BY s.hsn_code, s.rate
+"""
+
+_HSN_QTY_SQL = f"""
+	SELECT i.hsn_code, i.gst_slab, SUM(i.quantity)
+	FROM Orders o JOIN OrderItems i ON i.order_id = o.order_id
+	WHERE {_PAID_IN_PERIOD}
+	GROUP BY i.hsn_code, i.gst_slab
+"""
+
+B2B_CSV_HEADER = [
+	"GSTIN/UIN of Recipient", "Receiver Name", "Invoice Number", "Invoice date", "Invoice Value", "Place Of Supply",
+	"Reverse Charge", "Applicable % of Tax Rate", "Invoice Type", "E-Commerce GSTIN", "Rate", "Taxable Value", "Cess Amount",
+]
+B2CS_CSV_HEADER = ["Type", "Place Of Supply", "Applicable % of Tax Rate", "Rate", "Taxable Value", "Cess Amount", "E-Commerce GSTIN"]
+HSN_CSV_HEADER = [
+	"HSN", "Description", "UQC", "Total Quantity", "Total Value", "Rate", "Taxable Value", "Integrated Tax Amount",
+	"Central Tax Amount", "State/UT Tax Amount", "Cess Amount",
+]
+
+
+def period_bounds(period: str) -> Tuple[str, str]:
+	"""First and last day of a "YYYY-MM" return period."""
+	first = datetime.strptime(period, "%Y-%m").date()
+	nxt = date(first.year + first.month // 12, first.month % 12 + 1, 1)
+	return first.isoformat(), date.fromordinal(nxt.toordinal() - 1).isoformat()
+
+
+def _fp(period: str) -> str:
+	"""Portal filing period, MMYYYY."""
+	return period[5:7] + period[:4]
+
+
+def _money(value: float) -> float:
+	return round(float(value or 0.0), 2)
+
+
+class States:
+	"""Normalises Orders.place_of_supply (a state code or a state name) to a two-digit code."""
+
+	def __init__(self, home_code: str):
+		self.home = home_code
+		with get_conn() as conn:
+			rows = conn.execute("SELECT code, name FROM StateCodes").fetchall()
+		self.names = {code: name for code, name in rows}
+		self._by_name = {name.strip().lower(): code for code, name in rows}
+
+	def code(self, place_of_supply: Optional[str]) -> str:
+		value = (place_of_supply or "").strip()
+		if not value:
+			return self.home
+		if value.isdigit():
+			return value.zfill(2)
+		return self._by_name.get(value.lower(), self.home)
+
+	def label(self, code: str) -> str:
+		return f"{code}-{self.names.get(code, '')}".rstrip("-")
+
+	def supply_type(self, code: str) -> str:
+		return "INTRA" if code == self.home else "INTER"
+
+
+def state_code(place_of_supply: Optional[str], home_code: Optional[str] = None) -> str:
+	"""Two-digit state code of a place of supply given as a code or a state name.
+
+	Blank or unknown values fall back to ``home_code`` (default: the restaurant's own state).
+	"""
+	return States(home_code or get_restaurant_profile().state_code).code(place_of_supply)
+
+
+def _restaurant_gstin_and_state() -> Tuple[str, str]:
+	profile = get_restaurant_profile()
+	return profile.gstin, profile.state_code
+
+
+def _sources(start_day: str, end_day: str) -> List[Optional[Path]]:
+	"""The hot database plus archives overlapping the period that carry OrderTaxSummary."""
+	from .archive import archives_for_range
+
+	sources: List[Optional[Path]] = [None]
+	for fy_code, path in archives_for_range(start_day, end_day):
+		with get_conn(path) as conn:
+			if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'OrderTaxSummary'").fetchone():
+				sources.append(path)
+			else:
+				print(f"[WARNING] Archive FY {fy_code} has no tax summary; run the archive command again to upgrade it")
+	return sources
+
+
+@contextmanager
+def _source_conn(source: Optional[Path]) -> Iterator[Tuple[sqlite3.Connection, str]]:
+	"""A connection to a source and the filter that skips archived orders still in the hot database."""
+	if source is None:
+		with get_conn() as conn:
+			yield conn, ""
+		return
+	with get_conn(source) as conn:
+		conn.execute("ATTACH DATABASE ? AS hot", (str(CONFIG.db_path),))
+		try:
+			yield conn, "AND o.order_id NOT IN (SELECT order_id FROM hot.Orders)"
+		finally:
+			conn.execute("DETACH DATABASE hot")
+
+
+def _grouped(sql: str, start_day: str, end_day: str, sources: List[Optional[Path]]) -> Dict[tuple, List[float]]:
+	"""Run an aggregate query on every source and add up rows with the same key (all but the last columns)."""
+	merged: Dict[tuple, List[float]] = {}
+	for source in sources:
+		with _source_conn(source) as (conn, not_in_hot):
+			for row in conn.execute(sql.format(not_in_hot=not_in_hot), (start_day, end_day)):
+				key, values = row[:2], row[2:]
+				acc = merged.get(key)
+				if acc is None:
+					merged[key] = [float(v or 0.0) for v in values]
+				else:
+					for i, v in enumerate(values):
+						acc[i] += float(v or 0.0)
+	return merged
+
+
+def _b2b_rows(start_day: str, end_day: str, sources: List[Optional[Path]]) -> Iterator[tuple]:
+	def stream(source: Optional[Path]) -> Iterator[tuple]:
+		with _source_conn(source) as (conn, not_in_hot):
+			yield from conn.execute(_B2B_SQL.format(not_in_hot=not_in_hot), (start_day, end_day))
+
+	# Each source is already ordered by (gstin, day, order_id); merge them without buffering
+	return heapq.merge(*(stream(s) for s in sources), key=lambda r: (r[0], r[4], r[2], r[7]))
+
+
+def _b2cs(start_day: str, end_day: str, sources: List[Optional[Path]], states: States) -> List[Dict[str, Any]]:
+	by_key: Dict[Tuple[str, float], List[float]] = {}
+	for (pos, rate), values in _grouped(_B2CS_SQL, start_day, end_day, sources).items():
+		key = (states.code(pos), float(rate))
+		acc = by_key.setdefault(key, [0.0, 0.0, 0.0, 0.0])
+		for i, v in enumerate(values):
+			acc[i] += v
+	return [
+		{
+			"sply_ty": states.supply_type(pos), "pos": pos, "typ": "OE", "rt": rate, "txval": _money(txval),
+			"iamt": _money(iamt), "camt": _money(camt), "samt": _money(samt), "csamt": 0.0,
+		}
+		for (pos, rate), (txval, iamt, camt, samt) in sorted(by_key.items())
+	]
+
+
+def _hsn(start_day: str, end_day: str, sources: List[Optional[Path]]) -> List[Dict[str, Any]]:
+	quantities = _grouped(_HSN_QTY_SQL, start_day, end_day, sources)
+	out = []
+	for n, ((hsn, rate), (txval, iamt, camt, samt)) in enumerate(sorted(_grouped(_HSN_TAX_SQL, start_day, end_day, sources).items()), 1):
+		qty = quantities.get((hsn, rate), [0.0])[0]
+		out.append({
+			"num": n, "hsn_sc": hsn, "desc": "Restaurant service", "uqc": "NOS", "qty": qty, "rt": float(rate),
+			"val": _money(txval + iamt + camt + samt), "txval": _money(txval), "iamt": _money(iamt), "camt": _money(camt),
+			"samt": _money(samt), "csamt": 0.0,
+		})
+	return out
+
+
+def _csv_date(day: str) -> str:
+	return datetime.strptime(day, "%Y-%m-%d").strftime("%d-%b-%Y")
+
+
+def export_gstr1(period: str, out_dir: Optional[Path] = None) -> Dict[str, Path]:
+	"""Write GSTR-1 JSON plus B2B/B2CS/HSN CSVs for a "YYYY-MM" period. Returns the file paths by section."""
+	start_day, end_day = period_bounds(period)
+	out_dir = out_dir or CONFIG.returns_path
+	out_dir.mkdir(parents=True, exist_ok=True)
+	gstin, home_state = _restaurant_gstin_and_state()
+	states = States(home_state)
+	sources = _sources(start_day, end_day)
+	fp = _fp(period)
+	paths = {
+		"json": out_dir / f"GSTR1_{fp}.json",
+		"b2b": out_dir / f"GSTR1_{fp}_b2b.csv",
+		"b2cs": out_dir / f"GSTR1_{fp}_b2cs.csv",
+		"hsn": out_dir / f"GSTR1_{fp}_hsn.csv",
+	}
+
+	with open(paths["json"], "w", encoding="utf-8") as out, open(paths["b2b"], "w", newline="", encoding="utf-8") as b2b_csv:
+		b2b_writer = csv.writer(b2b_csv)
+		b2b_writer.writerow(B2B_CSV_HEADER)
+		out.write(f'{{"gstin": {json.dumps(gstin)}, "fp": "{fp}", "b2b": [')
+		for ci, (ctin, rows) in enumerate(groupby(_b2b_rows(start_day, end_day, sources), key=lambda r: r[0])):
+			out.write(("," if ci else "") + f'{{"ctin": {json.dumps(ctin)}, "inv": [')
+			for ii, (_, inv_rows) in enumerate(groupby(rows, key=lambda r: r[2])):
+				inv_rows = list(inv_rows)
+				first = inv_rows[0]
+				pos = states.code(first[6])
+				invoice = {
+					"inum": first[3], "idt": datetime.strptime(first[4], "%Y-%m-%d").strftime("%d-%m-%Y"),
+					"val": _money(first[5]), "pos": pos, "rchrg": "N", "inv_typ": "R",
+					"itms": [
+						{
+							"num": n, "itm_det": {
+								"rt": float(r[7]), "txval": _money(r[8]), "iamt": _money(r[9]), "camt": _money(r[10]),
+								"samt": _money(r[11]), "csamt": 0.0,
+							},
+						}
+						for n, r in enumerate(inv_rows, 1)
+					],
+				}
+				out.write(("," if ii else "") + json.dumps(invoice))
+				for r in inv_rows:
+					b2b_writer.writerow([
+						ctin, first[1] or "", first[3], _csv_date(first[4]), f"{_money(first[5]):.2f}", states.label(pos),
+						"N", "", "Regular B2B", "", f"{float(r[7]):g}", f"{_money(r[8]):.2f}", "0.00",
+					])
+			out.write("]}")
+		b2cs = _b2cs(start_day, end_day, sources, states)
+		hsn = _hsn(start_day, end_day, sources)
+		out.write(f'], "b2cs": {json.dumps(b2cs)}, "hsn": {json.dumps({"data": hsn})}}}')
+
+	with open(paths["b2cs"], "w", newline="", encoding="utf-8") as f:
+		writer = csv.writer(f)
+		writer.writerow(B2CS_CSV_HEADER)
+		writer.writerows(["OE", states.label(r["pos"]), "", f"{r['rt']:g}", f"{r['txval']:.2f}", "0.00", ""] for r in b2cs)
+	with open(paths["hsn"], "w", newline="", encoding="utf-8") as f:
+		writer = csv.writer(f)
+		writer.writerow(HSN_CSV_HEADER)
+		writer.writerows(
+			[
+				r["hsn_sc"], r["desc"], "NOS-NUMBERS", f"{r['qty']:g}", f"{r['val']:.2f}", f"{r['rt']:g}", f"{r['txval']:.2f}",
+				f"{r['iamt']:.2f}", f"{r['camt']:.2f}", f"{r['samt']:.2f}", "0.00",
+			]
+			for r in hsn
+		)
+	return paths
+
+
+def build_gstr3b(period: str) -> Dict[str, Any]:
+	"""GSTR-3B table 3.1(a) outward supplies and table 3.2 inter-state supplies to unregistered persons."""
+	start_day, end_day = period_bounds(period)
+	gstin, home_state = _restaurant_gstin_and_state()
+	states = States(home_state)
+	sources = _sources(start_day, end_day)
+	totals = [0.0, 0.0, 0.0, 0.0]
+	for values in _grouped(_HSN_TAX_SQL, start_day, end_day, sources).values():
+		for i, v in enumerate(values):
+			totals[i] += v
+	by_pos: Dict[str, List[float]] = {}
+	for r in _b2cs(start_day, end_day, sources, states):
+		if r["sply_ty"] == "INTER":
+			acc = by_pos.setdefault(r["pos"], [0.0, 0.0])
+			acc[0] += r["txval"]
+			acc[1] += r["iamt"]
+	unreg = [{"pos": pos, "txval": _money(txval), "iamt": _money(iamt)} for pos, (txval, iamt) in sorted(by_pos.items())]
+	return {
+		"gstin": gstin,
+		"ret_period": _fp(period),
+		"sup_details": {
+			"osup_det": {
+				"txval": _money(totals[0]), "iamt": _money(totals[1]), "camt": _money(totals[2]), "samt": _money(totals[3]),
+				"csamt": 0.0,
+			},
+		},
+		"inter_sup": {"unreg_details": unreg},
+	}
+
+
+def export_gstr3b(period: str, out_dir: Optional[Path] = None) -> Path:
+	out_dir = out_dir or CONFIG.returns_path
+	out_dir.mkdir(parents=True, exist_ok=True)
+	path = out_dir / f"GSTR3B_{_fp(period)}.json"
+	path.write_text(json.dumps(build_gstr3b(period), indent=2), encoding="utf-8")
+	return path
@@ -1,75 +1,130 @@
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, Iterable, List, Optional, Tuple
 
 from .config import CONFIG
-from .db import get_conn, get_order_by_invoice
+from .db import get_order_by_invoice, get_orders_by_invoices, iter_orders
+from .receipt import (
+	PAPER_WIDTHS, Blank, ItemRow, KeyValue, Receipt, ReceiptLine, Rule, Text, get_layout, pdf_bytes, render_text,
+)
+from .invoice_store import load_document, save_document
+from .restaurant_profile import get_restaurant_profile
 from .utils import amount_in_words_inr, format_date_indian, format_currency_inr
 
 
-def _get_restaurant() -> Dict[str, Any]:
-	with get_conn() as conn:
-		cur = conn.execute("SELECT name, address, gstin, state_code, fssai_license FROM Restaurant LIMIT 1")
-		row = cur.fetchone()
-		if not row:
-			return {"name": CONFIG.restaurant_legal_name, "address": "", "gstin": "", "state_code": CONFIG.default_state_code, "fssai_license": ""}
-		return {"name": row[0], "address": row[1], "gstin": row[2], "state_code": row[3], "fssai_license": row[4]}
-
-
-def _hsn_breakdown(items: list[dict]) -> Dict[str, Dict[str, float]]:
-	by_hsn: Dict[str, Dict[str, float]] = {}
-	for it in items:
+def _hsn_breakdown(order: Dict[str, Any]) -> List[Dict[str, Any]]:
+	"""Per HSN/rate tax rows: the stored OrderTaxSummary, or taxable values from the items if there is none."""
+	if order.get("tax_summary"):
+		return order["tax_summary"]
+	by_hsn: Dict[str, Dict[str, Any]] = {}
+	for it in order["items"]:
 		hsn = str(it["hsn_code"]) if it.get("hsn_code") else ""
-		entry = by_hsn.setdefault(hsn, {"taxable": 0.0, "cgst": 0.0, "sgst": 0.0, "igst": 0.0})
+		entry = by_hsn.setdefault(hsn, {"hsn_code": hsn, "rate": None, "taxable": 0.0, "cgst": 0.0, "sgst": 0.0, "igst": 0.0})
 		entry["taxable"] += float(it["line_amount"])
-		# Item-level taxes are not stored per line; rely on order totals for summary
-	return by_hsn
-
-
-def build_invoice_text(order: Dict[str, Any]) -> str:
-	rest = _get_restaurant()
-	lines: list[str] = []
-	lines.append(f"{rest['name']}")
-	lines.append(rest["address"]) if rest.get("address") else None
-	lines.append(f"GSTIN: {rest['gstin']}   FSSAI: {rest['fssai_license']}")
-	lines.append("")
-	lines.append(f"TAX INVOICE")
-	lines.append(f"Invoice No: {order['invoice_number']}    Date: {order['invoice_date']}")
+	return list(by_hsn.values())
+
+
+def build_receipt(order: Dict[str, Any], rest: Optional[Dict[str, Any]] = None) -> Receipt:
+	"""The invoice as a structured receipt; lay it out with ``receipt.get_layout`` for a paper width."""
+	rest = rest or get_restaurant_profile().as_dict()
+	r = Receipt()
+	r.add(Text(rest["name"], align="center", bold=True, size=2))
+	if rest.get("address"):
+		r.add(Text(rest["address"], align="center"))
+	r.add(Text(f"GSTIN: {rest['gstin']}", align="center"))
+	r.add(Text(f"FSSAI: {rest['fssai_license']}", align="center"))
+	r.add(Blank())
+	r.add(Text("TAX INVOICE", align="center", bold=True))
+	r.add(KeyValue("Invoice No:", str(order["invoice_number"])))
+	r.add(KeyValue("Date:", str(order["invoice_date"])))
 	if order.get("customer_name"):
-		lines.append(f"Customer: {order['customer_name']}")
+		r.add(Text(f"Customer: {order['customer_name']}"))
 	if order.get("customer_gstin"):
-		lines.append(f"Customer GSTIN: {order['customer_gstin']}")
-	lines.append("")
-	lines.append("Items:")
+		r.add(Text(f"Customer GSTIN: {order['customer_gstin']}"))
+	r.add(Rule())
 	for it in order["items"]:
-		lines.append(f" - {it['item_name']} x{it['quantity']} @ {format_currency_inr(it['rate'])} = {format_currency_inr(it['line_amount'])}")
-	lines.append("")
-	lines.append(f"Subtotal: {format_currency_inr(order['subtotal'])}")
-	if float(order.get('service_charge',0)):
-		lines.append(f"Service Charge: {format_currency_inr(order['service_charge'])}")
-	if float(order.get('cgst',0)):
-		lines.append(f"CGST: {format_currency_inr(order['cgst'])}")
-	if float(order.get('sgst',0)):
-		lines.append(f"SGST: {format_currency_inr(order['sgst'])}")
-	if float(order.get('igst',0)):
-		lines.append(f"IGST: {format_currency_inr(order['igst'])}")
-	lines.append(f"Grand Total: {format_currency_inr(order['total'])}")
-	lines.append(f"Amount in words: {amount_in_words_inr(order['total'])}")
-	lines.append("")
-	lines.append("HSN-wise Summary:")
-	for hsn, entry in _hsn_breakdown(order["items"]).items():
-		lines.append(f" HSN {hsn}: Taxable {format_currency_inr(entry['taxable'])}")
-	lines.append("")
-	lines.append("Declaration: We declare that this invoice shows the actual price and that all particulars are true and correct.")
-	lines.append("This is a computer generated invoice.")
-	return "\n".join(lines)
+		r.add(ItemRow(it["item_name"], str(it["quantity"]), format_currency_inr(it["rate"]), format_currency_inr(it["line_amount"])))
+	r.add(Rule())
+	r.add(KeyValue("Subtotal", format_currency_inr(order["subtotal"])))
+	for key, label in (("service_charge", "Service Charge"), ("cgst", "CGST"), ("sgst", "SGST"), ("igst", "IGST")):
+		if float(order.get(key, 0)):
+			r.add(KeyValue(label, format_currency_inr(order[key])))
+	r.add(Rule("="))
+	r.add(KeyValue("Grand Total", format_currency_inr(order["total"]), bold=True))
+	r.add(Rule("="))
+	r.add(Text(f"Amount in words: {amount_in_words_inr(order['total'])}"))
+	r.add(Blank())
+	r.add(Text("HSN-wise Summary:", bold=True))
+	for entry in _hsn_breakdown(order):
+		rate = f" @{entry['rate']:g}%" if entry["rate"] is not None else ""
+		r.add(KeyValue(f"HSN {entry['hsn_code']}{rate}", format_currency_inr(entry["taxable"])))
+		for name in ("cgst", "sgst", "igst"):
+			if float(entry[name]):
+				r.add(KeyValue(f"  {name.upper()}", format_currency_inr(entry[name])))
+	r.add(Blank())
+	r.add(Text("Declaration: We declare that this invoice shows the actual price and that all particulars are true and correct."))
+	r.add(Text("This is a computer generated invoice."))
+	return r
 
 
-def save_invoice_text(invoice_number: str) -> Path:
+def layout_invoice(order: Dict[str, Any], width: int, rest: Optional[Dict[str, Any]] = None) -> List[ReceiptLine]:
+	return get_layout(width).render(build_receipt(order, rest))
+
+
+def build_invoice_text(order: Dict[str, Any], rest: Optional[Dict[str, Any]] = None, width: Optional[int] = None) -> str:
+	width = width or CONFIG.paper_width_chars
+	return render_text(layout_invoice(order, width, rest), width)
+
+
+def _load_order(invoice_number: str) -> Dict[str, Any]:
 	order = get_order_by_invoice(invoice_number)
 	if not order:
 		raise ValueError("Invoice not found")
-	text = build_invoice_text(order)
-	CONFIG.invoices_path.mkdir(parents=True, exist_ok=True)
-	out = CONFIG.invoices_path / f"{invoice_number}.txt"
-	out.write_text(text, encoding="utf-8")
-	return out
+	return order
+
+
+def invoice_lines(invoice_number: str, width: int) -> List[ReceiptLine]:
+	"""Laid-out lines of a stored invoice for a printer of ``width`` characters."""
+	return layout_invoice(_load_order(invoice_number), width)
+
+
+def save_invoice_pdf(invoice_number: str) -> Path:
+	"""Store an A4 PDF of the invoice; returns its day container."""
+	order = _load_order(invoice_number)
+	width = PAPER_WIDTHS["A4"]
+	return save_document(str(order["invoice_date"])[:10], f"{invoice_number}.pdf", pdf_bytes(layout_invoice(order, width), width))
+
+
+def save_invoice_text(invoice_number: str) -> Path:
+	"""Store the invoice text; returns its day container in the invoice store."""
+	return _write_invoice_text(_load_order(invoice_number), get_restaurant_profile().as_dict())
+
+
+def save_invoice_for_printing(invoice_number: str, width: int) -> Tuple[Path, List[ReceiptLine]]:
+	"""``save_invoice_text`` and ``invoice_lines`` together, from one order fetch and one receipt build."""
+	order = _load_order(invoice_number)
+	receipt = build_receipt(order)
+	return _write_invoice_text(order, receipt=receipt), get_layout(width).render(receipt)
+
+
+def load_invoice_text(invoice_number: str) -> Optional[str]:
+	data = load_document(invoice_number, f"{invoice_number}.txt")
+	return data.decode("utf-8") if data is not None else None
+
+
+def _write_invoice_text(order: Dict[str, Any], rest: Optional[Dict[str, Any]] = None, receipt: Optional[Receipt] = None) -> Path:
+	width = CONFIG.paper_width_chars
+	text = render_text(get_layout(width).render(receipt or build_receipt(order, rest)), width)
+	return save_document(str(order["invoice_date"])[:10], f"{order['invoice_number']}.txt", text.encode("utf-8"))
+
+
+def save_invoice_texts(invoice_numbers: Iterable[str]) -> List[Path]:
+	"""Bulk ``save_invoice_text``: all orders are fetched in one batch. Unknown numbers are skipped."""
+	orders = get_orders_by_invoices(invoice_numbers)
+	rest = get_restaurant_profile().as_dict()
+	return [_write_invoice_text(order, rest) for order in orders.values()]
+
+
+def save_invoice_texts_for_days(start_day: str, end_day: str, status: str = 'PAID') -> List[Path]:
+	"""Store invoice texts for every order in a day range, streaming the orders."""
+	rest = get_restaurant_profile().as_dict()
+	return [_write_invoice_text(order, rest) for order in iter_orders(start_day, end_day, status)]
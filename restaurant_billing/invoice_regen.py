@@ -0,0 +1,199 @@
+"""
+Bulk invoice regeneration.
+
+Re-renders the invoice text of a day range or a list of invoice numbers, e.g.
+after the restaurant address or GSTIN changed or for an auditor's request.
+Orders are fetched in batches in this process and rendered across a process
+pool; the texts of each invoice day go into one ``YYYY-MM/YYYY-MM-DD.zip``
+under the output directory, written atomically once the day is complete.
+
+Re-running the same command resumes: invoices already present in a day's
+archive are not rendered again (``force=True`` re-renders everything).
+"""
+
+import os
+import zipfile
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+from .config import CONFIG
+from .db import get_conn, get_orders_by_invoices, iter_orders
+from .invoice import build_invoice_text
+from .restaurant_profile import get_restaurant_profile
+
+
+@dataclass(slots=True)
+class RegenProgress:
+	total: int  # invoices selected (before skipping those already archived)
+	rendered: int = 0
+	skipped: int = 0
+	days: Dict[str, int] = field(default_factory=dict)  # day -> invoices in its archive
+
+
+def day_archive_path(out_dir: Path, day: str) -> Path:
+	return out_dir / day[:7] / f"{day}.zip"
+
+
+def _archived_names(path: Path) -> Set[str]:
+	if not path.exists():
+		return set()
+	try:
+		with zipfile.ZipFile(path) as zf:
+			return set(zf.namelist())
+	except zipfile.BadZipFile:
+		print(f"[WARNING] Ignoring unreadable archive {path}")
+		return set()
+
+
+def _write_day(path: Path, texts: Dict[str, str]) -> int:
+	"""Merge texts into a day's archive through a temp file and rename; returns the entry count."""
+	path.parent.mkdir(parents=True, exist_ok=True)
+	tmp = path.with_suffix(".zip.partial")
+	with zipfile.ZipFile(tmp, "w", compression=zipfile.ZIP_DEFLATED) as out:
+		if path.exists():
+			try:
+				with zipfile.ZipFile(path) as old:
+					for info in old.infolist():
+						if info.filename not in texts:
+							out.writestr(info, old.read(info))
+			except zipfile.BadZipFile:
+				pass
+		for name, text in texts.items():
+			out.writestr(name, text)
+		count = len(out.namelist())
+	os.replace(tmp, path)
+	return count
+
+
+def _render_batch(orders: List[Dict[str, Any]], rest: Dict[str, Any], width: int) -> List[Tuple[str, str, str]]:
+	"""Worker: (day, archive name, text) per order. Needs no database access."""
+	return [
+		(str(o["invoice_date"])[:10], f"{o['invoice_number']}.txt", build_invoice_text(o, rest, width))
+		for o in orders
+	]
+
+
+class _InlineExecutor(Executor):
+	"""Runs submissions immediately; used for workers <= 1."""
+
+	def submit(self, fn, *args, **kwargs) -> Future:
+		future: Future = Future()
+		try:
+			future.set_result(fn(*args, **kwargs))
+		except BaseException as exc:
+			future.set_exception(exc)
+		return future
+
+
+def _count_in_range(start_day: str, end_day: str, status: str) -> int:
+	from .archive import archives_for_range
+
+	sql = "SELECT COUNT(*) FROM Orders WHERE status = ? AND invoice_day BETWEEN ? AND ?"
+	total = 0
+	for db_path in [path for _, path in archives_for_range(start_day, end_day)] + [None]:
+		with get_conn(db_path) as conn:
+			total += conn.execute(sql, (status, start_day, end_day)).fetchone()[0]
+	return total
+
+
+def _batches(orders: Iterable[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+	batch: List[Dict[str, Any]] = []
+	for order in orders:
+		batch.append(order)
+		if len(batch) >= size:
+			yield batch
+			batch = []
+	if batch:
+		yield batch
+
+
+def _orders_for_numbers(invoice_numbers: Sequence[str], batch_size: int) -> Iterator[Dict[str, Any]]:
+	for i in range(0, len(invoice_numbers), batch_size):
+		yield from get_orders_by_invoices(invoice_numbers[i:i + batch_size]).values()
+
+
+def regenerate_invoices(
+	out_dir: Path,
+	start_day: Optional[str] = None,
+	end_day: Optional[str] = None,
+	invoice_numbers: Optional[Sequence[str]] = None,
+	status: str = "PAID",
+	workers: Optional[int] = None,
+	batch_size: int = 200,
+	width: Optional[int] = None,
+	force: bool = False,
+	progress: Optional[Callable[[RegenProgress], None]] = None,
+) -> RegenProgress:
+	"""Render invoices of a day range (or the given invoice numbers) into per-day zip archives.
+
+	``progress`` is called after every rendered batch and every finished day.
+	"""
+	if invoice_numbers is None and not (start_day and end_day):
+		raise ValueError("Give a day range or invoice numbers")
+	width = width or CONFIG.paper_width_chars
+	rest = get_restaurant_profile().as_dict()
+	if invoice_numbers is not None:
+		invoice_numbers = list(dict.fromkeys(invoice_numbers))
+		state = RegenProgress(total=len(invoice_numbers))
+		orders = _orders_for_numbers(invoice_numbers, batch_size)
+	else:
+		state = RegenProgress(total=_count_in_range(start_day, end_day, status))
+		orders = iter_orders(start_day, end_day, status, batch_size)
+
+	archived: Dict[str, Set[str]] = {}
+	pending: Dict[str, Dict[str, str]] = {}
+
+	def todo(batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+		keep = []
+		for o in batch:
+			day = str(o["invoice_date"])[:10]
+			if day not in archived:
+				archived[day] = set() if force else _archived_names(day_archive_path(out_dir, day))
+			if f"{o['invoice_number']}.txt" in archived[day]:
+				state.skipped += 1
+			else:
+				keep.append(o)
+		return keep
+
+	def flush(day: str) -> None:
+		texts = pending.pop(day, None)
+		if texts:
+			state.days[day] = _write_day(day_archive_path(out_dir, day), texts)
+			if progress:
+				progress(state)
+
+	def collect(results: List[Tuple[str, str, str]]) -> None:
+		for day, name, text in results:
+			pending.setdefault(day, {})[name] = text
+		state.rendered += len(results)
+		if progress:
+			progress(state)
+		if invoice_numbers is None and results:
+			# A range streams in day order: days before the last rendered one are complete
+			last_day = results[-1][0]
+			for day in [d for d in pending if d < last_day]:
+				flush(day)
+
+	workers = (os.cpu_count() or 1) if workers is None else workers
+	executor: Executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else _InlineExecutor()
+	in_flight: Deque[Future] = deque()
+	try:
+		for batch in _batches(orders, batch_size):
+			batch = todo(batch)
+			if not batch:
+				continue
+			in_flight.append(executor.submit(_render_batch, batch, rest, width))
+			# Bounded look-ahead keeps memory flat; results are consumed in submission (day) order
+			while len(in_flight) > max(2, workers * 2):
+				collect(in_flight.popleft().result())
+		while in_flight:
+			collect(in_flight.popleft().result())
+	finally:
+		executor.shutdown(cancel_futures=True)
+		# Whatever was rendered is kept, so an interrupted run resumes from here
+		for day in sorted(pending):
+			flush(day)
+	return state
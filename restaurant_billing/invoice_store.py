@@ -0,0 +1,200 @@
+"""
+Date-sharded, compressed invoice store.
+
+Instead of one file per document in a flat ``invoices/`` directory, every
+invoice day has one append-only container ``YYYY/MM/YYYY-MM-DD.pack`` holding
+the zlib-compressed documents back to back, and a line-per-document index
+``YYYY-MM-DD.idx`` (``name<TAB>offset<TAB>length<TAB>crc32``). A day's index is loaded
+once into a dict, so reading a document is a dict lookup, one seek and one
+read. Saving a changed document again appends a new copy and the index keeps
+the latest; saving identical content (a reprint or print retry) writes nothing.
+
+Data is appended before its index line, so a crash can leave unused bytes in
+a container but never an index entry pointing at missing data. Appends are
+serialised within the process; one process (the billing app) should write a
+given day at a time.
+"""
+
+import os
+import zlib
+from datetime import date
+from pathlib import Path
+from threading import Lock
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .config import CONFIG
+from .db import get_conn
+
+
+_INVOICE_DAY_CHUNK = 500
+
+
+class _DayIndex:
+	__slots__ = ("entries", "size")
+
+	def __init__(self):
+		self.entries: Dict[str, Tuple[int, int, int]] = {}  # name -> (offset, length, crc32)
+		self.size = 0  # bytes of the .idx file already parsed
+
+
+class InvoiceStore:
+	def __init__(self, root: Path):
+		self.root = Path(root)
+		self._lock = Lock()
+		self._indexes: Dict[str, _DayIndex] = {}
+
+	def container_path(self, day: str) -> Path:
+		return self.root / day[:4] / day[5:7] / f"{day}.pack"
+
+	def _index_path(self, day: str) -> Path:
+		return self.container_path(day).with_suffix(".idx")
+
+	def _index(self, day: str) -> _DayIndex:
+		"""The day's index, reading only lines appended since the last look (possibly by another process)."""
+		index = self._indexes.get(day)
+		if index is None:
+			index = self._indexes[day] = _DayIndex()
+		path = self._index_path(day)
+		try:
+			size = path.stat().st_size
+		except FileNotFoundError:
+			return index
+		if size > index.size:
+			with open(path, "rb") as f:
+				f.seek(index.size)
+				tail = f.read(size - index.size)
+			# A torn last line (crash mid-append) has no newline yet; leave it for the next read
+			complete = tail[:tail.rfind(b"\n") + 1]
+			for line in complete.decode("utf-8", "replace").splitlines():
+				parts = line.split("\t")
+				# A torn line later terminated by the next append is not a valid entry; skip it
+				if len(parts) == 4 and all(p.isdigit() for p in parts[1:]):
+					index.entries[parts[0]] = (int(parts[1]), int(parts[2]), int(parts[3]))
+			index.size += len(complete)
+		return index
+
+	def put(self, day: str, name: str, data: bytes) -> Path:
+		"""Append a document to the day's container, unless it already holds this content; returns the container path."""
+		blob = zlib.compress(data, 6)
+		crc = zlib.crc32(blob)
+		pack = self.container_path(day)
+		with self._lock:
+			entry = self._index(day).entries.get(name)
+			if entry is not None and entry[1:] == (len(blob), crc):
+				return pack
+			pack.parent.mkdir(parents=True, exist_ok=True)
+			with open(pack, "ab") as f:
+				offset = f.seek(0, os.SEEK_END)
+				f.write(blob)
+			idx = self._index_path(day)
+			with open(idx, "ab+") as f:
+				end = f.seek(0, os.SEEK_END)
+				if end:
+					f.seek(end - 1)
+					torn = f.read(1) != b"\n"
+				else:
+					torn = False
+				f.write((b"\n" if torn else b"") + f"{name}\t{offset}\t{len(blob)}\t{crc}\n".encode("utf-8"))
+			self._index(day)
+		return pack
+
+	def get(self, day: str, name: str) -> Optional[bytes]:
+		with self._lock:
+			entry = self._index(day).entries.get(name)
+		if entry is None:
+			return None
+		with open(self.container_path(day), "rb") as f:
+			f.seek(entry[0])
+			blob = f.read(entry[1])
+		if zlib.crc32(blob) != entry[2]:
+			raise ValueError(f"Corrupt entry {name} in {self.container_path(day)}")
+		return zlib.decompress(blob)
+
+	def has(self, day: str, name: str) -> bool:
+		with self._lock:
+			return name in self._index(day).entries
+
+	def names(self, day: str) -> List[str]:
+		with self._lock:
+			return list(self._index(day).entries)
+
+	def days(self) -> Iterator[str]:
+		for idx in sorted(self.root.glob("[0-9][0-9][0-9][0-9]/[0-9][0-9]/*.idx")):
+			yield idx.stem
+
+
+_STORE: Optional[InvoiceStore] = None
+_STORE_LOCK = Lock()
+
+
+def get_invoice_store() -> InvoiceStore:
+	global _STORE
+	with _STORE_LOCK:
+		if _STORE is None or _STORE.root != CONFIG.invoices_path:
+			_STORE = InvoiceStore(CONFIG.invoices_path)
+		return _STORE
+
+
+def invoice_days(invoice_numbers: Iterable[str]) -> Dict[str, str]:
+	"""{invoice_number: invoice day} from the hot database and archives; unknown numbers are left out."""
+	from .archive import list_archives
+
+	wanted = list(dict.fromkeys(invoice_numbers))
+	found: Dict[str, str] = {}
+	for db_path in [None] + [path for _, path in list_archives()]:
+		missing = [n for n in wanted if n not in found]
+		if not missing:
+			break
+		with get_conn(db_path) as conn:
+			for i in range(0, len(missing), _INVOICE_DAY_CHUNK):
+				chunk = missing[i:i + _INVOICE_DAY_CHUNK]
+				rows = conn.execute(
+					f"SELECT invoice_number, invoice_day FROM Orders WHERE invoice_number IN ({','.join('?' * len(chunk))})", chunk
+				).fetchall()
+				found.update((n, d) for n, d in rows if d)
+	return found
+
+
+def save_document(day: str, name: str, data: bytes) -> Path:
+	return get_invoice_store().put(day, name, data)
+
+
+def load_document(invoice_number: str, name: str, day: Optional[str] = None) -> Optional[bytes]:
+	"""A stored document of an invoice; the day is looked up from the order when not given."""
+	day = day or invoice_days([invoice_number]).get(invoice_number)
+	if not day:
+		return None
+	return get_invoice_store().get(day, name)
+
+
+def _document_invoice(file_name: str) -> Optional[str]:
+	for suffix in ("_einvoice.json", ".txt", ".pdf"):
+		if file_name.endswith(suffix):
+			return file_name[: -len(suffix)]
+	return None
+
+
+def migrate_flat_files(source: Optional[Path] = None, keep: bool = False) -> Tuple[int, int]:
+	"""Move documents from a flat invoices directory into the store. Returns (migrated, removed leftovers).
+
+	The day comes from the order; files of unknown invoices use their modification date. Documents already
+	in the store are not added twice. Leftover ``formatted_*.txt`` print files are deleted.
+	"""
+	source = Path(source or CONFIG.invoices_path)
+	store = get_invoice_store()
+	files = [p for p in source.iterdir() if p.is_file()]
+	leftovers = [p for p in files if p.name.startswith("formatted_") and p.suffix == ".txt"]
+	documents = [(p, _document_invoice(p.name)) for p in files if not p.name.startswith("formatted_")]
+	documents = [(p, n) for p, n in documents if n]
+	days = invoice_days(n for _, n in documents)
+	migrated = 0
+	for path, number in documents:
+		day = days.get(number) or date.fromtimestamp(path.stat().st_mtime).isoformat()
+		if not store.has(day, path.name):
+			store.put(day, path.name, path.read_bytes())
+			migrated += 1
+		if not keep:
+			path.unlink()
+	for path in leftovers:
+		path.unlink()
+	return migrated, len(leftovers)
@@ -0,0 +1,157 @@
+"""
+Kitchen order tickets (KOT).
+
+When an order is saved or items are added to an open table, the quantities not
+yet sent to the kitchen (``OrderItems.quantity - kot_quantity``) are grouped by
+station through ``KitchenRoutes`` (menu category -> station; unrouted
+categories go to ``CONFIG.kot_default_station``) and queued on the print
+spooler as one ticket per station. Every station is a spooler printer of its
+own, with its own worker thread, so stations print concurrently and a slow or
+offline printer only holds back its own tickets.
+
+Queuing the tickets and marking the items as sent happen in one transaction,
+so an add-on ticket carries only the new lines and no ticket is lost or
+printed twice if the app stops halfway.
+"""
+
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from .config import CONFIG
+from .db import get_conn, transaction, with_lock_retry
+from .receipt import KeyValue, Receipt, Rule, Text, escpos_bytes, get_layout, render_text
+from .spooler import enqueue_print, register_handler, wake_spooler
+
+
+@dataclass(frozen=True, slots=True)
+class KitchenStation:
+	name: str
+	printer_type: str = "os"  # as CONFIG.printer_type
+	host: Optional[str] = None
+	port: int = 9100
+	device: Optional[str] = None  # escpos_file device, or the OS print queue
+	width_chars: int = 30
+
+
+def list_stations() -> Dict[str, KitchenStation]:
+	with get_conn() as conn:
+		rows = conn.execute("SELECT name, printer_type, host, port, device, width_chars FROM KitchenStations ORDER BY name").fetchall()
+	return {row[0]: KitchenStation(*row) for row in rows}
+
+
+@with_lock_retry
+def save_station(station: KitchenStation) -> None:
+	with transaction() as conn:
+		conn.execute(
+			"""
+			INSERT INTO KitchenStations(name, printer_type, host, port, device, width_chars) VALUES (?, ?, ?, ?, ?, ?)
+			ON CONFLICT(name) DO UPDATE SET printer_type = excluded.printer_type, host = excluded.host,
+				port = excluded.port, device = excluded.device, width_chars = excluded.width_chars
+			""",
+			(station.name, station.printer_type, station.host, station.port, station.device, station.width_chars),
+		)
+
+
+@with_lock_retry
+def delete_station(name: str) -> bool:
+	"""Remove a station and its routes; its categories fall back to the default station."""
+	with transaction() as conn:
+		conn.execute("DELETE FROM KitchenRoutes WHERE station = ?", (name,))
+		return conn.execute("DELETE FROM KitchenStations WHERE name = ?", (name,)).rowcount > 0
+
+
+def list_routes() -> Dict[str, str]:
+	"""{menu category: station}"""
+	with get_conn() as conn:
+		return dict(conn.execute("SELECT category, station FROM KitchenRoutes").fetchall())
+
+
+@with_lock_retry
+def set_route(category: str, station: Optional[str]) -> None:
+	"""Send a menu category to a station (None: back to the default station)."""
+	with transaction() as conn:
+		if station is None:
+			conn.execute("DELETE FROM KitchenRoutes WHERE category = ?", (category,))
+		else:
+			conn.execute(
+				"INSERT INTO KitchenRoutes(category, station) VALUES (?, ?) ON CONFLICT(category) DO UPDATE SET station = excluded.station",
+				(category, station),
+			)
+
+
+@with_lock_retry
+def send_kot(invoice_number: str) -> Dict[str, int]:
+	"""Queue tickets for the items of an order not yet sent to the kitchen; returns {station: job id}."""
+	with transaction() as conn:
+		pending = conn.execute(
+			"""
+			SELECT oi.id, oi.item_name, oi.quantity - oi.kot_quantity, m.category, o.order_id, o.table_number
+			FROM Orders o
+			JOIN OrderItems oi ON oi.order_id = o.order_id
+			LEFT JOIN MenuItems m ON m.id = oi.item_id
+			WHERE o.invoice_number = ? AND o.status = 'OPEN' AND oi.quantity > oi.kot_quantity
+			ORDER BY oi.id
+			""",
+			(invoice_number,),
+		).fetchall()
+		if not pending:
+			return {}
+		order_id, table_number = pending[0][4], pending[0][5]
+		add_on = conn.execute("SELECT 1 FROM OrderItems WHERE order_id = ? AND kot_quantity > 0 LIMIT 1", (order_id,)).fetchone() is not None
+		routes = dict(conn.execute("SELECT category, station FROM KitchenRoutes").fetchall())
+		tickets: Dict[str, List[Dict[str, Any]]] = {}
+		for _, name, quantity, category, _, _ in pending:
+			station = routes.get(category) or CONFIG.kot_default_station
+			tickets.setdefault(station, []).append({"name": name, "quantity": quantity})
+		created = datetime.now().strftime("%Y-%m-%d %H:%M")
+		jobs = {
+			station: enqueue_print(
+				"kot",
+				{
+					"station": station, "invoice_number": invoice_number, "table_number": table_number,
+					"add_on": add_on, "created": created, "lines": lines,
+				},
+				printer=station,
+			)
+			for station, lines in tickets.items()
+		}
+		conn.executemany("UPDATE OrderItems SET kot_quantity = quantity WHERE id = ?", [(row[0],) for row in pending])
+	# The jobs were committed with the items above; let the spooler see them now
+	wake_spooler()
+	return jobs
+
+
+def build_kot_receipt(ticket: Dict[str, Any]) -> Receipt:
+	r = Receipt()
+	r.add(Text(f"KOT {ticket['station'].upper()}", align="center", bold=True, size=2))
+	if ticket.get("add_on"):
+		r.add(Text("ADD-ON", align="center", bold=True))
+	r.add(KeyValue("Table", str(ticket.get("table_number") or "-"), bold=True))
+	r.add(KeyValue("Order", ticket["invoice_number"]))
+	r.add(KeyValue("Time", ticket["created"][11:16]))
+	r.add(Rule())
+	for line in ticket["lines"]:
+		r.add(Text(f"{line['quantity']:>3} x {line['name']}", bold=True))
+	r.add(Rule())
+	return r
+
+
+def _print_kot(printer: str, ticket: Dict[str, Any]) -> bool:
+	from .printing_fixed import print_text_os, send_escpos
+
+	# A station without printer settings prints on the receipt printer
+	station = list_stations().get(ticket["station"]) or KitchenStation(
+		ticket["station"], CONFIG.printer_type, CONFIG.escpos_host, CONFIG.escpos_port, CONFIG.escpos_device, CONFIG.paper_width_chars,
+	)
+	lines = get_layout(station.width_chars).render(build_kot_receipt(ticket))
+	if station.printer_type == "os":
+		print_text_os(render_text(lines, station.width_chars), queue=station.device, prefix=f"kot_{station.name}_")
+		return True
+	return send_escpos(
+		escpos_bytes(lines, CONFIG.printer_encoding), host=station.host, port=station.port,
+		printer_type=station.printer_type, device=station.device,
+	)
+
+
+register_handler("kot", _print_kot)
@@ -0,0 +1,180 @@
+"""
+Headless maintenance commands.
+
+Usage:
+	python -m restaurant_billing.maintenance rebuild-rollups
+	python -m restaurant_billing.maintenance archive [--older-than-days N] [--vacuum]
+	python -m restaurant_billing.maintenance gst-audit [--from YYYY-MM-DD] [--to YYYY-MM-DD] [--report FILE]
+	python -m restaurant_billing.maintenance gst-returns --period YYYY-MM [--out DIR]
+	python -m restaurant_billing.maintenance einvoice-batch (--from YYYY-MM-DD --to YYYY-MM-DD | --invoice NO ...) [--buyers CSV] [--out DIR]
+	python -m restaurant_billing.maintenance migrate-invoice-files [--source DIR] [--keep]
+	python -m restaurant_billing.maintenance regen-invoices (--from YYYY-MM-DD --to YYYY-MM-DD | --invoice NO ... | --invoices-file FILE) [--out DIR] [--workers N] [--force]
+"""
+
+import argparse
+import sys
+from pathlib import Path
+from typing import List, Optional
+
+from .archive import archive_closed_orders, compact_hot_db
+from .config import CONFIG
+from .db import init_db, rebuild_sales_rollups
+
+
+def _cmd_rebuild_rollups(args: argparse.Namespace) -> int:
+	days = rebuild_sales_rollups()
+	print(f"[INFO] Sales rollups rebuilt for {days} day(s)")
+	return 0
+
+
+def _cmd_archive(args: argparse.Namespace) -> int:
+	moved = archive_closed_orders(args.older_than_days)
+	if not moved:
+		print("[INFO] Nothing to archive")
+	for fy, count in sorted(moved.items()):
+		print(f"[INFO] Archived {count} order(s) into FY {fy}")
+	if args.vacuum:
+		compact_hot_db()
+		print("[INFO] Hot database compacted")
+	return 0
+
+
+def _cmd_gst_audit(args: argparse.Namespace) -> int:
+	from .gst_audit import write_audit_report
+
+	report = args.report or CONFIG.db_path.parent / "gst_audit.csv"
+	checked, mismatched = write_audit_report(
+		report, start_day=args.start_day, end_day=args.end_day, statuses=tuple(args.status or ["PAID"]), chunk_size=args.chunk_size,
+	)
+	print(f"[INFO] Audited {checked} order(s); {mismatched} mismatched")
+	if mismatched:
+		print(f"[WARNING] Mismatch report written to {report}")
+	return 1 if mismatched else 0
+
+
+def _cmd_gst_returns(args: argparse.Namespace) -> int:
+	from .gst_returns import export_gstr1, export_gstr3b
+
+	for section, path in export_gstr1(args.period, args.out).items():
+		print(f"[INFO] GSTR-1 {section}: {path}")
+	print(f"[INFO] GSTR-3B: {export_gstr3b(args.period, args.out)}")
+	return 0
+
+
+def _cmd_regen_invoices(args: argparse.Namespace) -> int:
+	from .invoice_regen import regenerate_invoices
+
+	numbers = list(args.invoice or [])
+	if args.invoices_file:
+		numbers += [line.strip() for line in args.invoices_file.read_text(encoding="utf-8").splitlines() if line.strip()]
+	if not numbers and not (args.start_day and args.end_day):
+		print("[ERROR] Give --from and --to, or invoice numbers")
+		return 2
+	out_dir = args.out or CONFIG.invoices_path / "regenerated"
+	reported = set()
+
+	def progress(state) -> None:
+		for day in sorted(set(state.days) - reported):
+			reported.add(day)
+			print(f"[INFO] {day}: {state.days[day]} invoice(s) in archive ({state.rendered + state.skipped}/{state.total})")
+
+	state = regenerate_invoices(
+		out_dir, start_day=args.start_day, end_day=args.end_day, invoice_numbers=numbers or None, status=args.status,
+		workers=args.workers, batch_size=args.batch_size, force=args.force, progress=progress,
+	)
+	print(f"[INFO] Rendered {state.rendered} invoice(s), {state.skipped} already archived, into {out_dir}")
+	if numbers and state.rendered + state.skipped < state.total:
+		print(f"[WARNING] {state.total - state.rendered - state.skipped} invoice number(s) not found")
+	return 0
+
+
+def _cmd_einvoice_batch(args: argparse.Namespace) -> int:
+	from .einvoice_batch import export_einvoice_batch, load_buyers
+
+	if not args.invoice and not (args.start_day and args.end_day):
+		print("[ERROR] Give --from and --to, or invoice numbers")
+		return 2
+	result = export_einvoice_batch(
+		args.start_day, args.end_day, invoice_numbers=args.invoice, buyers=load_buyers(args.buyers) if args.buyers else None,
+		out_dir=args.out, per_file=args.per_file,
+	)
+	for path in result.files:
+		print(f"[INFO] Bulk upload file: {path}")
+	print(f"[INFO] {result.written} e-invoice(s) written, {result.skipped} order(s) not requiring one")
+	if result.invalid:
+		print(f"[WARNING] {result.invalid} invoice(s) failed validation; see {result.errors_path}")
+	return 1 if result.invalid else 0
+
+
+def _cmd_migrate_invoice_files(args: argparse.Namespace) -> int:
+	from .invoice_store import migrate_flat_files
+
+	migrated, leftovers = migrate_flat_files(args.source, keep=args.keep)
+	print(f"[INFO] Moved {migrated} invoice document(s) into the invoice store")
+	if leftovers:
+		print(f"[INFO] Removed {leftovers} leftover formatted_*.txt print file(s)")
+	return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+	parser = argparse.ArgumentParser(prog="python -m restaurant_billing.maintenance", description="Billing database maintenance")
+	sub = parser.add_subparsers(dest="command", required=True)
+
+	p = sub.add_parser("rebuild-rollups", help="Recompute DailySales/HourlySales from Orders")
+	p.set_defaults(func=_cmd_rebuild_rollups)
+
+	p = sub.add_parser("archive", help="Move old PAID/CANCELLED orders into per-financial-year archive files")
+	p.add_argument("--older-than-days", type=int, default=None, help="Cutoff age (default: CONFIG.archive_after_days)")
+	p.add_argument("--vacuum", action="store_true", help="Checkpoint and VACUUM the hot database afterwards")
+	p.set_defaults(func=_cmd_archive)
+
+	p = sub.add_parser("gst-audit", help="Re-derive stored order totals and taxes from OrderItems and report mismatches")
+	p.add_argument("--from", dest="start_day", default="0000-00-00", help="First invoice day (YYYY-MM-DD)")
+	p.add_argument("--to", dest="end_day", default="9999-12-31", help="Last invoice day (YYYY-MM-DD)")
+	p.add_argument("--status", action="append", default=None, help="Order status to audit (repeatable, default PAID)")
+	p.add_argument("--chunk-size", type=int, default=5000, help="Orders audited per batch")
+	p.add_argument("--report", type=Path, default=None, help="Mismatch CSV (default: data/gst_audit.csv)")
+	p.set_defaults(func=_cmd_gst_audit)
+
+	p = sub.add_parser("gst-returns", help="Export GSTR-1 (JSON + CSV) and GSTR-3B for a month")
+	p.add_argument("--period", required=True, help="Return period, YYYY-MM")
+	p.add_argument("--out", type=Path, default=None, help="Output directory (default: CONFIG.returns_path)")
+	p.set_defaults(func=_cmd_gst_returns)
+
+	p = sub.add_parser("einvoice-batch", help="Validate B2B e-invoices and write IRP bulk-upload JSON files")
+	p.add_argument("--from", dest="start_day", default=None, help="First invoice day (YYYY-MM-DD)")
+	p.add_argument("--to", dest="end_day", default=None, help="Last invoice day (YYYY-MM-DD)")
+	p.add_argument("--invoice", action="append", default=None, help="Invoice number (repeatable)")
+	p.add_argument("--buyers", type=Path, default=None, help="CSV of buyer addresses: gstin, addr1, loc[, legal_name, addr2, pin]")
+	p.add_argument("--out", type=Path, default=None, help="Output directory (default: CONFIG.returns_path/einvoice)")
+	p.add_argument("--per-file", type=int, default=500, help="Invoices per bulk upload file")
+	p.set_defaults(func=_cmd_einvoice_batch)
+
+	p = sub.add_parser("migrate-invoice-files", help="Move flat invoice .txt/.json/.pdf files into the day-sharded invoice store")
+	p.add_argument("--source", type=Path, default=None, help="Directory with the flat files (default: CONFIG.invoices_path)")
+	p.add_argument("--keep", action="store_true", help="Leave the original files in place")
+	p.set_defaults(func=_cmd_migrate_invoice_files)
+
+	p = sub.add_parser("regen-invoices", help="Re-render invoices into per-day zip archives (resumable)")
+	p.add_argument("--from", dest="start_day", default=None, help="First invoice day (YYYY-MM-DD)")
+	p.add_argument("--to", dest="end_day", default=None, help="Last invoice day (YYYY-MM-DD)")
+	p.add_argument("--invoice", action="append", default=None, help="Invoice number (repeatable)")
+	p.add_argument("--invoices-file", type=Path, default=None, help="File with one invoice number per line")
+	p.add_argument("--status", default="PAID", help="Order status for a day range (default PAID)")
+	p.add_argument("--out", type=Path, default=None, help="Output directory (default: invoices/regenerated)")
+	p.add_argument("--workers", type=int, default=None, help="Render processes (default: CPU count; 1 renders in-process)")
+	p.add_argument("--batch-size", type=int, default=200, help="Orders fetched and rendered per batch")
+	p.add_argument("--force", action="store_true", help="Re-render invoices already in the archives")
+	p.set_defaults(func=_cmd_regen_invoices)
+
+	return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+	args = build_parser().parse_args(argv)
+	init_db()
+	return args.func(args)
+
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,476 @@
+"""
+Versioned schema migrations keyed on ``PRAGMA user_version``.
+
+Each entry in ``MIGRATIONS`` runs once, in order, inside its own write
+transaction together with the ``user_version`` bump. Every step is written so it
+is also safe on databases created before versioning existed (user_version 0
+with tables already present).
+"""
+
+import sqlite3
+from pathlib import Path
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+from .config import CONFIG
+from .db import get_conn, transaction, with_lock_retry, _rebuild_sales_rollups, _tax_summary_rows, _INSERT_TAX_SUMMARY_SQL
+
+
+BASELINE_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS Restaurant (
+	name TEXT NOT NULL,
+	address TEXT NOT NULL,
+	gstin TEXT NOT NULL,
+	state_code TEXT NOT NULL,
+	fssai_license TEXT
+);
+
+CREATE TABLE IF NOT EXISTS GSTSettings (
+	slab_rate REAL NOT NULL,
+	cgst_rate REAL NOT NULL,
+	sgst_rate REAL NOT NULL,
+	applicable_from TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS MenuItems (
+	id INTEGER PRIMARY KEY AUTOINCREMENT,
+	name TEXT NOT NULL,
+	price REAL NOT NULL,
+	category TEXT NOT NULL,
+	gst_slab REAL NOT NULL,
+	hsn_code TEXT NOT NULL,
+	food_type TEXT NOT NULL CHECK(food_type IN ('veg','non-veg'))
+);
+
+CREATE TABLE IF NOT EXISTS Orders (
+	order_id INTEGER PRIMARY KEY AUTOINCREMENT,
+	table_number INTEGER,
+	customer_name TEXT,
+	customer_gstin TEXT,
+	place_of_supply TEXT,
+	invoice_number TEXT,
+	invoice_date TEXT,
+	subtotal REAL NOT NULL DEFAULT 0,
+	cgst REAL NOT NULL DEFAULT 0,
+	sgst REAL NOT NULL DEFAULT 0,
+	igst REAL NOT NULL DEFAULT 0,
+	service_charge REAL NOT NULL DEFAULT 0,
+	total REAL NOT NULL DEFAULT 0,
+	status TEXT NOT NULL DEFAULT 'OPEN' -- OPEN, PAID, CANCELLED
+);
+CREATE INDEX IF NOT EXISTS idx_orders_invoice ON Orders(invoice_number);
+
+CREATE TABLE IF NOT EXISTS OrderItems (
+	id INTEGER PRIMARY KEY AUTOINCREMENT,
+	order_id INTEGER NOT NULL REFERENCES Orders(order_id) ON DELETE CASCADE,
+	item_id INTEGER NOT NULL REFERENCES MenuItems(id),
+	item_name TEXT NOT NULL,
+	hsn_code TEXT NOT NULL,
+	quantity INTEGER NOT NULL,
+	rate REAL NOT NULL,
+	gst_slab REAL NOT NULL,
+	line_amount REAL NOT NULL,
+	UNIQUE(order_id, item_id)
+);
+
+-- Users for role-based access
+CREATE TABLE IF NOT EXISTS Users (
+	id INTEGER PRIMARY KEY AUTOINCREMENT,
+	username TEXT NOT NULL UNIQUE,
+	full_name TEXT,
+	role TEXT NOT NULL CHECK(role IN ('SUPER_ADMIN','ADMIN','CAPTAIN')),
+	password_hash TEXT NOT NULL,
+	password_salt TEXT NOT NULL,
+	is_active INTEGER NOT NULL DEFAULT 1,
+	created_at TEXT NOT NULL DEFAULT (datetime('now'))
+);
+CREATE INDEX IF NOT EXISTS idx_users_username ON Users(username);
+
+-- State codes for GST compliance
+CREATE TABLE IF NOT EXISTS StateCodes (
+	code TEXT PRIMARY KEY,
+	name TEXT NOT NULL,
+	is_union_territory INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+
+SEED_SQL: Dict[str, Tuple[str, ...]] = {
+	# Minimal restaurant details (edit via UI later)
+	"Restaurant": (
+		f"INSERT INTO Restaurant(name, address, gstin, state_code, fssai_license) VALUES (\n '{CONFIG.restaurant_legal_name}',\n '123, MG Road, Mumbai, Maharashtra 400001',\n '27ABCDE1234F1Z5',\n '27',\n '11518002000000'\n);",
+	),
+	# GST slabs commonly used
+	"GSTSettings": (
+		"INSERT INTO GSTSettings(slab_rate, cgst_rate, sgst_rate, applicable_from) VALUES (5, 2.5, 2.5, date('now'));",
+		"INSERT INTO GSTSettings(slab_rate, cgst_rate, sgst_rate, applicable_from) VALUES (12, 6, 6, date('now'));",
+		"INSERT INTO GSTSettings(slab_rate, cgst_rate, sgst_rate, applicable_from) VALUES (18, 9, 9, date('now'));",
+		"INSERT INTO GSTSettings(slab_rate, cgst_rate, sgst_rate, applicable_from) VALUES (28, 14, 14, date('now'));",
+	),
+	# Sample menu
+	"MenuItems": (
+		"INSERT INTO MenuItems(name, price, category, gst_slab, hsn_code, food_type) VALUES ('Paneer Tikka', 240, 'Starters & Appetizers', 5, '996331', 'veg');",
+		"INSERT INTO MenuItems(name, price, category, gst_slab, hsn_code, food_type) VALUES ('Chicken Tikka', 280, 'Starters & Appetizers', 5, '996331', 'non-veg');",
+		"INSERT INTO MenuItems(name, price, category, gst_slab, hsn_code, food_type) VALUES ('Dal Tadka', 220, 'Main Course (Veg)', 5, '996331', 'veg');",
+		"INSERT INTO MenuItems(name, price, category, gst_slab, hsn_code, food_type) VALUES ('Butter Chicken', 360, 'Main Course (Non-Veg)', 5, '996331', 'non-veg');",
+		"INSERT INTO MenuItems(name, price, category, gst_slab, hsn_code, food_type) VALUES ('Naan', 40, 'Breads & Rice', 5, '996331', 'veg');",
+		"INSERT INTO MenuItems(name, price, category, gst_slab, hsn_code, food_type) VALUES ('Jeera Rice', 160, 'Breads & Rice', 5, '996331', 'veg');",
+		"INSERT INTO MenuItems(name, price, category, gst_slab, hsn_code, food_type) VALUES ('Veg Fried Rice', 200, 'Chinese & Continental', 5, '996331', 'veg');",
+		"INSERT INTO MenuItems(name, price, category, gst_slab, hsn_code, food_type) VALUES ('Masala Dosa', 120, 'South Indian', 5, '996331', 'veg');",
+		"INSERT INTO MenuItems(name, price, category, gst_slab, hsn_code, food_type) VALUES ('Lassi', 90, 'Beverages & Desserts', 12, '996331', 'veg');",
+	),
+	# State codes (sample)
+	"StateCodes": (
+		"INSERT INTO StateCodes(code, name, is_union_territory) VALUES ('27', 'Maharashtra', 0);",
+		"INSERT INTO StateCodes(code, name, is_union_territory) VALUES ('07', 'Delhi', 1);",
+		"INSERT INTO StateCodes(code, name, is_union_territory) VALUES ('33', 'Tamil Nadu', 0);",
+		"INSERT INTO StateCodes(code, name, is_union_territory) VALUES ('09', 'Gujarat', 0);",
+		"INSERT INTO StateCodes(code, name, is_union_territory) VALUES ('29', 'Karnataka', 0);",
+	),
+}
+
+
+INVOICE_SEQUENCE_SQL = """
+-- Invoice number counters, one row per series (terminal prefix + financial year)
+CREATE TABLE IF NOT EXISTS InvoiceSequences (
+	series TEXT PRIMARY KEY,
+	next_value INTEGER NOT NULL
+);
+"""
+
+
+ORDER_TAX_SUMMARY_SQL = """
+-- Tax per order, HSN code and GST rate, written with the order; read by invoices, e-invoices and returns
+CREATE TABLE IF NOT EXISTS OrderTaxSummary (
+	order_id INTEGER NOT NULL REFERENCES Orders(order_id) ON DELETE CASCADE,
+	hsn_code TEXT NOT NULL,
+	rate REAL NOT NULL, -- GST slab percent
+	taxable REAL NOT NULL,
+	cgst REAL NOT NULL DEFAULT 0,
+	sgst REAL NOT NULL DEFAULT 0,
+	igst REAL NOT NULL DEFAULT 0,
+	PRIMARY KEY (order_id, hsn_code, rate)
+) WITHOUT ROWID;
+"""
+
+
+PRINT_JOBS_SQL = """
+-- Durable print queue drained by the spooler; a job is one receipt or ticket for one printer
+CREATE TABLE IF NOT EXISTS PrintJobs (
+	job_id INTEGER PRIMARY KEY,
+	printer TEXT NOT NULL, -- 'receipt' or a station name
+	kind TEXT NOT NULL, -- selects the print handler, e.g. 'invoice'
+	payload TEXT NOT NULL, -- JSON arguments of the handler
+	status TEXT NOT NULL DEFAULT 'QUEUED', -- QUEUED | PRINTING | DONE | FAILED
+	attempts INTEGER NOT NULL DEFAULT 0,
+	next_attempt_at REAL NOT NULL DEFAULT 0, -- unix time; retries back off
+	last_error TEXT,
+	created_at TEXT NOT NULL DEFAULT (datetime('now','localtime')),
+	updated_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_print_jobs_queued ON PrintJobs(printer, job_id) WHERE status = 'QUEUED';
+CREATE INDEX IF NOT EXISTS idx_print_jobs_status ON PrintJobs(status);
+"""
+
+
+KITCHEN_STATIONS_SQL = """
+-- Kitchen order ticket (KOT) printers and which menu categories each one prepares
+CREATE TABLE IF NOT EXISTS KitchenStations (
+	name TEXT PRIMARY KEY, -- e.g. 'tandoor', 'chinese', 'bar'; also the spooler's printer name
+	printer_type TEXT NOT NULL DEFAULT 'os', -- os | escpos_usb | escpos_network | escpos_file, as CONFIG.printer_type
+	host TEXT, -- escpos_network
+	port INTEGER NOT NULL DEFAULT 9100,
+	device TEXT, -- escpos_file device/capture file, or the OS print queue for 'os'
+	width_chars INTEGER NOT NULL DEFAULT 30
+);
+CREATE TABLE IF NOT EXISTS KitchenRoutes (
+	category TEXT PRIMARY KEY, -- MenuItems.category
+	station TEXT NOT NULL REFERENCES KitchenStations(name) ON DELETE CASCADE
+);
+"""
+
+
+RESTAURANT_VERSION_SQL = """
+-- Bumped by every change to Restaurant, so profile caches reload only when the profile itself changed
+CREATE TABLE IF NOT EXISTS RestaurantVersion (
+	id INTEGER PRIMARY KEY CHECK (id = 1),
+	version INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO RestaurantVersion(id, version) VALUES (1, 0);
+CREATE TRIGGER IF NOT EXISTS trg_restaurant_version_insert AFTER INSERT ON Restaurant
+BEGIN
+	UPDATE RestaurantVersion SET version = version + 1 WHERE id = 1;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_restaurant_version_update AFTER UPDATE ON Restaurant
+BEGIN
+	UPDATE RestaurantVersion SET version = version + 1 WHERE id = 1;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_restaurant_version_delete AFTER DELETE ON Restaurant
+BEGIN
+	UPDATE RestaurantVersion SET version = version + 1 WHERE id = 1;
+END;
+"""
+
+
+SALES_ROLLUP_SQL = """
+-- Sales rollups for reports; kept in step with PAID orders by the triggers below
+CREATE TABLE IF NOT EXISTS DailySales (
+	sales_day TEXT PRIMARY KEY, -- YYYY-MM-DD of invoice_date
+	order_count INTEGER NOT NULL DEFAULT 0,
+	subtotal REAL NOT NULL DEFAULT 0,
+	cgst REAL NOT NULL DEFAULT 0,
+	sgst REAL NOT NULL DEFAULT 0,
+	igst REAL NOT NULL DEFAULT 0,
+	service_charge REAL NOT NULL DEFAULT 0,
+	total REAL NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS HourlySales (
+	sales_hour TEXT PRIMARY KEY, -- YYYY-MM-DD HH of invoice_date
+	order_count INTEGER NOT NULL DEFAULT 0,
+	subtotal REAL NOT NULL DEFAULT 0,
+	total REAL NOT NULL DEFAULT 0
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_orders_sales_insert AFTER INSERT ON Orders
+WHEN NEW.status = 'PAID'
+BEGIN
+	INSERT INTO DailySales(sales_day, order_count, subtotal, cgst, sgst, igst, service_charge, total)
+	VALUES (substr(NEW.invoice_date, 1, 10), 1, NEW.subtotal, NEW.cgst, NEW.sgst, NEW.igst, NEW.service_charge, NEW.total)
+	ON CONFLICT(sales_day) DO UPDATE SET
+		order_count = order_count + 1, subtotal = subtotal + excluded.subtotal, cgst = cgst + excluded.cgst,
+		sgst = sgst + excluded.sgst, igst = igst + excluded.igst, service_charge = service_charge + excluded.service_charge,
+		total = total + excluded.total;
+	INSERT INTO HourlySales(sales_hour, order_count, subtotal, total)
+	VALUES (substr(NEW.invoice_date, 1, 13), 1, NEW.subtotal, NEW.total)
+	ON CONFLICT(sales_hour) DO UPDATE SET
+		order_count = order_count + 1, subtotal = subtotal + excluded.subtotal, total = total + excluded.total;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_orders_sales_unpaid AFTER UPDATE ON Orders
+WHEN OLD.status = 'PAID'
+BEGIN
+	UPDATE DailySales SET
+		order_count = order_count - 1, subtotal = subtotal - OLD.subtotal, cgst = cgst - OLD.cgst, sgst = sgst - OLD.sgst,
+		igst = igst - OLD.igst, service_charge = service_charge - OLD.service_charge, total = total - OLD.total
+	WHERE sales_day = substr(OLD.invoice_date, 1, 10);
+	UPDATE HourlySales SET order_count = order_count - 1, subtotal = subtotal - OLD.subtotal, total = total - OLD.total
+	WHERE sales_hour = substr(OLD.invoice_date, 1, 13);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_orders_sales_paid AFTER UPDATE ON Orders
+WHEN NEW.status = 'PAID'
+BEGIN
+	INSERT INTO DailySales(sales_day, order_count, subtotal, cgst, sgst, igst, service_charge, total)
+	VALUES (substr(NEW.invoice_date, 1, 10), 1, NEW.subtotal, NEW.cgst, NEW.sgst, NEW.igst, NEW.service_charge, NEW.total)
+	ON CONFLICT(sales_day) DO UPDATE SET
+		order_count = order_count + 1, subtotal = subtotal + excluded.subtotal, cgst = cgst + excluded.cgst,
+		sgst = sgst + excluded.sgst, igst = igst + excluded.igst, service_charge = service_charge + excluded.service_charge,
+		total = total + excluded.total;
+	INSERT INTO HourlySales(sales_hour, order_count, subtotal, total)
+	VALUES (substr(NEW.invoice_date, 1, 13), 1, NEW.subtotal, NEW.total)
+	ON CONFLICT(sales_hour) DO UPDATE SET
+		order_count = order_count + 1, subtotal = subtotal + excluded.subtotal, total = total + excluded.total;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_orders_sales_delete AFTER DELETE ON Orders
+WHEN OLD.status = 'PAID'
+BEGIN
+	UPDATE DailySales SET
+		order_count = order_count - 1, subtotal = subtotal - OLD.subtotal, cgst = cgst - OLD.cgst, sgst = sgst - OLD.sgst,
+		igst = igst - OLD.igst, service_charge = service_charge - OLD.service_charge, total = total - OLD.total
+	WHERE sales_day = substr(OLD.invoice_date, 1, 10);
+	UPDATE HourlySales SET order_count = order_count - 1, subtotal = subtotal - OLD.subtotal, total = total - OLD.total
+	WHERE sales_hour = substr(OLD.invoice_date, 1, 13);
+END;
+"""
+
+
+def _split_statements(script: str) -> Iterator[str]:
+	"""Split a script into statements (trigger bodies included) without executescript's implicit COMMIT."""
+	buf = ""
+	for line in script.splitlines(keepends=True):
+		buf += line
+		if sqlite3.complete_statement(buf):
+			if buf.strip():
+				yield buf
+			buf = ""
+	if buf.strip():
+		yield buf
+
+
+def _execute_script(conn: sqlite3.Connection, script: str) -> None:
+	for stmt in _split_statements(script):
+		conn.execute(stmt)
+
+
+def _m001_baseline(conn: sqlite3.Connection) -> None:
+	_execute_script(conn, BASELINE_SCHEMA_SQL)
+
+
+def _m002_seed_once(conn: sqlite3.Connection) -> None:
+	"""Seed empty tables, and undo the duplicates left by the old seed-on-every-launch init_db."""
+	for table, statements in SEED_SQL.items():
+		if conn.execute(f"SELECT 1 FROM {table} LIMIT 1").fetchone():
+			continue
+		for stmt in statements:
+			conn.execute(stmt)
+
+	conn.execute("DELETE FROM Restaurant WHERE rowid NOT IN (SELECT MIN(rowid) FROM Restaurant)")
+	# Same slab and rates re-inserted with a later applicable_from: keep the earliest
+	conn.execute(
+		"""
+		DELETE FROM GSTSettings WHERE rowid NOT IN (
+			SELECT rowid FROM (
+				SELECT rowid, ROW_NUMBER() OVER (
+					PARTITION BY slab_rate, cgst_rate, sgst_rate ORDER BY applicable_from, rowid
+				) AS rn FROM GSTSettings
+			) WHERE rn = 1
+		)
+		"""
+	)
+	# One rate per slab and day (the index key below); the latest row entered wins
+	conn.execute(
+		"DELETE FROM GSTSettings WHERE rowid NOT IN (SELECT MAX(rowid) FROM GSTSettings GROUP BY slab_rate, applicable_from)"
+	)
+	conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_gst_settings_slab_from ON GSTSettings(slab_rate, applicable_from)")
+	# Identical sample menu rows; rows already used by an order are kept
+	conn.execute(
+		"""
+		DELETE FROM MenuItems WHERE id NOT IN (
+			SELECT MIN(id) FROM MenuItems GROUP BY name, price, category, gst_slab, hsn_code, food_type
+		) AND id NOT IN (SELECT DISTINCT item_id FROM OrderItems)
+		"""
+	)
+
+
+def _m003_invoice_sequences(conn: sqlite3.Connection) -> None:
+	"""Invoice number counters, and a UNIQUE index on Orders(invoice_number).
+
+	Databases written before invoice sequences existed may already hold duplicate
+	numbers; those are left untouched (they are issued documents) and the old
+	index is kept until they are resolved by hand.
+
+	The "default" series continues after the existing plain numeric invoice
+	numbers (the old ``printf('%04d', MAX(order_id)+1)`` scheme), so new
+	numbers never collide with issued ones.
+	"""
+	_execute_script(conn, INVOICE_SEQUENCE_SQL)
+	conn.execute(
+		"""
+		INSERT INTO InvoiceSequences(series, next_value)
+		SELECT 'default', next_value FROM (
+			SELECT MAX(CAST(invoice_number AS INTEGER)) + 1 AS next_value FROM Orders
+			WHERE invoice_number GLOB '[0-9]*' AND invoice_number NOT GLOB '*[^0-9]*'
+		)
+		WHERE next_value IS NOT NULL
+		ON CONFLICT(series) DO UPDATE SET next_value = MAX(next_value, excluded.next_value)
+		"""
+	)
+	duplicate = conn.execute(
+		"SELECT invoice_number FROM Orders WHERE invoice_number IS NOT NULL GROUP BY invoice_number HAVING COUNT(*) > 1 LIMIT 1"
+	).fetchone()
+	if duplicate:
+		print(f"[WARNING] Duplicate invoice numbers found in Orders (e.g. {duplicate[0]}); UNIQUE index not created")
+		return
+	conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_orders_invoice_unique ON Orders(invoice_number)")
+	conn.execute("DROP INDEX IF EXISTS idx_orders_invoice")
+
+
+def _m004_order_day_indexes(conn: sqlite3.Connection) -> None:
+	"""Orders.invoice_day plus the open-order and status/day indexes."""
+	columns = {row[1] for row in conn.execute("PRAGMA table_xinfo(Orders)")}
+	if "invoice_day" not in columns:
+		# ALTER TABLE can only add VIRTUAL generated columns; the indexes below store the value anyway
+		conn.execute("ALTER TABLE Orders ADD COLUMN invoice_day TEXT GENERATED ALWAYS AS (substr(invoice_date, 1, 10)) VIRTUAL")
+	conn.execute("CREATE INDEX IF NOT EXISTS idx_orders_open ON Orders(invoice_date) WHERE status = 'OPEN'")
+	conn.execute("CREATE INDEX IF NOT EXISTS idx_orders_status_day ON Orders(status, invoice_day)")
+
+
+def _m005_sales_rollups(conn: sqlite3.Connection) -> None:
+	_execute_script(conn, SALES_ROLLUP_SQL)
+	_rebuild_sales_rollups(conn)
+
+
+def _m006_order_tax_summary(conn: sqlite3.Connection) -> None:
+	"""OrderTaxSummary, backfilled for existing orders from their items."""
+	_execute_script(conn, ORDER_TAX_SUMMARY_SQL)
+	last_id = 0
+	while True:
+		orders = conn.execute(
+			"""
+			SELECT order_id, invoice_date, cgst, sgst, igst FROM Orders
+			WHERE order_id > ? ORDER BY order_id LIMIT 1000
+			""",
+			(last_id,),
+		).fetchall()
+		if not orders:
+			return
+		items: Dict[int, list] = {}
+		for order_id, quantity, rate, gst_slab, hsn_code in conn.execute(
+			"SELECT order_id, quantity, rate, gst_slab, hsn_code FROM OrderItems WHERE order_id BETWEEN ? AND ?",
+			(orders[0][0], orders[-1][0]),
+		):
+			items.setdefault(order_id, []).append({"quantity": quantity, "rate": rate, "gst_slab": gst_slab, "hsn_code": hsn_code})
+		rows = []
+		for order_id, invoice_date, cgst, sgst, igst in orders:
+			totals = {"cgst": cgst, "sgst": sgst, "igst": igst}
+			rows.extend(_tax_summary_rows(order_id, totals, items.get(order_id, []), invoice_date or ""))
+		conn.executemany(_INSERT_TAX_SUMMARY_SQL, rows)
+		last_id = orders[-1][0]
+
+
+def _m007_print_jobs(conn: sqlite3.Connection) -> None:
+	_execute_script(conn, PRINT_JOBS_SQL)
+
+
+def _m008_kitchen_tickets(conn: sqlite3.Connection) -> None:
+	"""Kitchen stations/routes, and OrderItems.kot_quantity (quantity already sent to the kitchen)."""
+	_execute_script(conn, KITCHEN_STATIONS_SQL)
+	columns = {row[1] for row in conn.execute("PRAGMA table_info(OrderItems)")}
+	if "kot_quantity" not in columns:
+		conn.execute("ALTER TABLE OrderItems ADD COLUMN kot_quantity INTEGER NOT NULL DEFAULT 0")
+		# Items of existing orders were prepared long ago; only new items get tickets
+		conn.execute("UPDATE OrderItems SET kot_quantity = quantity")
+
+
+def _m009_restaurant_version(conn: sqlite3.Connection) -> None:
+	_execute_script(conn, RESTAURANT_VERSION_SQL)
+
+
+# Append only: a migration's position is its schema version
+MIGRATIONS: Tuple[Callable[[sqlite3.Connection], None], ...] = (
+	_m001_baseline,
+	_m002_seed_once,
+	_m003_invoice_sequences,
+	_m004_order_day_indexes,
+	_m005_sales_rollups,
+	_m006_order_tax_summary,
+	_m007_print_jobs,
+	_m008_kitchen_tickets,
+	_m009_restaurant_version,
+)
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+	return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+@with_lock_retry
+def _apply(version: int, db_path: Optional[Path]) -> None:
+	with transaction(db_path) as conn:
+		# Another process may have migrated while we waited for the write lock
+		if get_schema_version(conn) >= version:
+			return
+		MIGRATIONS[version - 1](conn)
+		conn.execute(f"PRAGMA user_version = {version}")
+
+
+def migrate(db_path: Optional[Path] = None) -> int:
+	"""Apply pending migrations. Returns the resulting schema version."""
+	with get_conn(db_path) as conn:
+		current = get_schema_version(conn)
+	for version in range(current + 1, SCHEMA_VERSION + 1):
+		_apply(version, db_path)
+	return max(current, SCHEMA_VERSION)
@@ -0,0 +1,236 @@
+"""
+Persistent connections to network (raw TCP / port 9100) receipt printers.
+
+Opening a TCP connection per receipt costs a handshake on every print and,
+with cheap LAN printers, invites bursts of resets during rush. A
+``PrinterConnection`` keeps one socket per printer open between jobs: jobs
+are queued and written back to back over that socket by one sender thread, so
+they never interleave. Before each job an idle socket is checked for a close
+or reset from the printer and replaced if needed. Failed connects back off
+exponentially with jitter; a job that arrives during the backoff waits for
+the next attempt (or fails after ``CONFIG.escpos_timeout``). Per-printer
+stats record jobs, bytes, errors, reconnects, queue wait and send latency.
+"""
+
+import atexit
+import queue
+import random
+import select
+import socket
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Any, Dict, Optional, Tuple
+
+from .config import CONFIG
+
+
+class PrinterConnection:
+	def __init__(self, host: str, port: int = 9100, timeout: Optional[float] = None):
+		self.host = host
+		self.port = port
+		self.timeout = CONFIG.escpos_timeout if timeout is None else timeout
+		self._sock: Optional[socket.socket] = None
+		self._jobs: "queue.Queue[Optional[Tuple[bytes, Future, float]]]" = queue.Queue()
+		self._lock = threading.Lock()
+		self._failures = 0  # connect failures in a row
+		self._retry_at = 0.0  # monotonic time of the next connect attempt
+		self._stats: Dict[str, float] = {
+			"jobs": 0, "bytes": 0, "errors": 0, "connects": 0, "reconnects": 0,
+			"wait_s": 0.0, "send_s": 0.0, "max_send_s": 0.0,
+		}
+		self._last_error = ""
+		self._closed = False
+		self._thread = threading.Thread(target=self._run, name=f"printer-{host}:{port}", daemon=True)
+		self._thread.start()
+
+	def submit(self, data: bytes) -> Future:
+		"""Queue a complete print job; the future resolves once it is written to the printer."""
+		future: Future = Future()
+		if self._closed:
+			future.set_exception(ConnectionError(f"Printer connection {self.host}:{self.port} is closed"))
+		else:
+			self._jobs.put((data, future, time.perf_counter()))
+		return future
+
+	def send(self, data: bytes, timeout: Optional[float] = None) -> None:
+		"""Print a job and wait for it to be written; raises on failure.
+
+		A job that times out while still queued is withdrawn, so a caller that
+		retries it (the spooler) never gets it printed twice.
+		"""
+		wait = self.timeout if timeout is None else timeout
+		future = self.submit(data)
+		try:
+			# Allow for the jobs queued ahead of this one
+			future.result(wait * (self._jobs.qsize() + 2))
+		except FutureTimeoutError:
+			if future.cancel():
+				raise
+			# Already being written: its own deadline bounds the wait, and its outcome is the job's
+			future.result()
+
+	def close(self) -> None:
+		self._closed = True
+		self._jobs.put(None)
+		self._thread.join(self.timeout + 1)
+		self._disconnect()
+
+	def stats(self) -> Dict[str, Any]:
+		with self._lock:
+			s = dict(self._stats)
+			jobs = int(s["jobs"]) or 1
+			return {
+				"printer": f"{self.host}:{self.port}",
+				"connected": self._sock is not None,
+				"queued": self._jobs.qsize(),
+				"jobs": int(s["jobs"]),
+				"bytes": int(s["bytes"]),
+				"errors": int(s["errors"]),
+				"connects": int(s["connects"]),
+				"reconnects": int(s["reconnects"]),
+				"avg_wait_ms": round(s["wait_s"] * 1000 / jobs, 3),
+				"avg_send_ms": round(s["send_s"] * 1000 / jobs, 3),
+				"max_send_ms": round(s["max_send_s"] * 1000, 3),
+				"last_error": self._last_error,
+			}
+
+	def _run(self) -> None:
+		while True:
+			job = self._jobs.get()
+			if job is None:
+				break
+			data, future, submitted = job
+			if not future.set_running_or_notify_cancel():
+				continue
+			started = time.perf_counter()
+			try:
+				self._write(data, time.monotonic() + self.timeout)
+			except Exception as e:
+				self._record_error(e)
+				future.set_exception(e)
+				continue
+			sent = time.perf_counter()
+			with self._lock:
+				self._stats["jobs"] += 1
+				self._stats["bytes"] += len(data)
+				self._stats["wait_s"] += started - submitted
+				self._stats["send_s"] += sent - started
+				self._stats["max_send_s"] = max(self._stats["max_send_s"], sent - started)
+			future.set_result(None)
+		# Fail whatever was still queued at close
+		while True:
+			try:
+				job = self._jobs.get_nowait()
+			except queue.Empty:
+				return
+			if job is not None and job[1].set_running_or_notify_cancel():
+				job[1].set_exception(ConnectionError(f"Printer connection {self.host}:{self.port} is closed"))
+
+	def _write(self, data: bytes, deadline: float) -> None:
+		sock = self._healthy_socket(deadline)
+		view = memoryview(data)
+		sent = 0
+		retried = False
+		while sent < len(data):
+			try:
+				sent += sock.send(view[sent:])
+			except OSError:
+				self._disconnect()
+				with self._lock:
+					self._stats["reconnects"] += 1
+				# Once part of the job went out a resend would print it twice; leave the retry to the spooler
+				if sent or retried:
+					raise
+				# The printer dropped the connection between our check and the write; retry once on a new one
+				retried = True
+				sock = self._healthy_socket(deadline)
+
+	def _healthy_socket(self, deadline: float) -> socket.socket:
+		if self._sock is not None and not self._is_alive(self._sock):
+			self._disconnect()
+			with self._lock:
+				self._stats["reconnects"] += 1
+		while self._sock is None:
+			delay = self._retry_at - time.monotonic()
+			if delay > 0:
+				if time.monotonic() + delay > deadline:
+					raise ConnectionError(f"Printer {self.host}:{self.port} unreachable ({self._last_error})")
+				time.sleep(delay)
+			self._connect()
+		return self._sock
+
+	@staticmethod
+	def _is_alive(sock: socket.socket) -> bool:
+		"""An idle printer socket only turns readable when the printer closed or reset it (or sent status bytes)."""
+		try:
+			readable, _, _ = select.select([sock], [], [], 0)
+			if not readable:
+				return True
+			return sock.recv(1024, socket.MSG_PEEK) != b"" and bool(sock.recv(1024))
+		except OSError:
+			return False
+
+	def _connect(self) -> None:
+		try:
+			sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+		except OSError as e:
+			self._failures += 1
+			backoff = min(CONFIG.escpos_reconnect_max_delay, CONFIG.escpos_reconnect_base_delay * (2 ** (self._failures - 1)))
+			self._retry_at = time.monotonic() + backoff * random.uniform(0.5, 1.0)
+			if self._failures > 1:
+				raise
+			self._record_error(e)  # first failure: one quick retry before giving up on the job
+			return
+		sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+		sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+		if hasattr(socket, "TCP_KEEPIDLE"):
+			sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, 30)
+		self._sock = sock
+		self._failures = 0
+		self._retry_at = 0.0
+		with self._lock:
+			self._stats["connects"] += 1
+
+	def _disconnect(self) -> None:
+		sock, self._sock = self._sock, None
+		if sock is not None:
+			try:
+				sock.close()
+			except OSError:
+				pass
+
+	def _record_error(self, error: Exception) -> None:
+		with self._lock:
+			self._stats["errors"] += 1
+			self._last_error = str(error) or type(error).__name__
+		print(f"[WARNING] Printer {self.host}:{self.port}: {self._last_error}")
+
+
+_CONNECTIONS: Dict[Tuple[str, int], PrinterConnection] = {}
+_CONNECTIONS_LOCK = threading.Lock()
+
+
+def get_printer_connection(host: str, port: int = 9100) -> PrinterConnection:
+	with _CONNECTIONS_LOCK:
+		conn = _CONNECTIONS.get((host, port))
+		if conn is None:
+			conn = _CONNECTIONS[(host, port)] = PrinterConnection(host, port)
+		return conn
+
+
+def printer_connection_stats() -> Dict[str, Dict[str, Any]]:
+	with _CONNECTIONS_LOCK:
+		conns = list(_CONNECTIONS.values())
+	return {f"{c.host}:{c.port}": c.stats() for c in conns}
+
+
+def close_printer_connections() -> None:
+	with _CONNECTIONS_LOCK:
+		conns = list(_CONNECTIONS.values())
+		_CONNECTIONS.clear()
+	for conn in conns:
+		conn.close()
+
+
+atexit.register(close_printer_connections)
@@ -1,9 +1,11 @@
 from pathlib import Path
 from typing import Optional
 import os
+import tempfile
 
 from .config import CONFIG
-from .invoice import save_invoice_text
+from .invoice import load_invoice_text, save_invoice_for_printing, save_invoice_text
+from .receipt import escpos_bytes
 
 try:
 	from escpos.printer import Usb, Network
@@ -12,29 +14,21 @@ except Exception:
 	_HAS_ESCPOS = False
 
 
-def _split_lines_for_width(text: str, width: int) -> str:
-	lines = []
-	for line in text.splitlines():
-		while len(line) > width:
-			lines.append(line[:width])
-			line = line[width:]
-		lines.append(line)
-	return "\n".join(lines)
-
-
 def print_invoice_os(invoice_number: str) -> Path:
 	path = save_invoice_text(invoice_number)
 	if os.name == 'posix':
-		os.system(f"lp '{path}' 2>/dev/null || open -P '{path}' 2>/dev/null || true")
+		# The store keeps invoices in day containers; print from a temp copy outside the invoices directory
+		with tempfile.NamedTemporaryFile("w", suffix=".txt", encoding="utf-8", delete=False) as f:
+			f.write(load_invoice_text(invoice_number) or "")
+		os.system(f"lp '{f.name}' 2>/dev/null || open -P '{f.name}' 2>/dev/null || true")
+		os.unlink(f.name)
 	return path
 
 
 def print_invoice_escpos(invoice_number: str, usb_vendor: Optional[int] = None, usb_product: Optional[int] = None, host: Optional[str] = None, port: Optional[int] = None) -> bool:
 	if not _HAS_ESCPOS:
 		return False
-	text_path = save_invoice_text(invoice_number)
-	text = Path(text_path).read_text(encoding='utf-8')
-	text = _split_lines_for_width(text, CONFIG.paper_width_chars)
+	_, lines = save_invoice_for_printing(invoice_number, CONFIG.paper_width_chars)
 	try:
 		printer = None
 		v = usb_vendor or CONFIG.escpos_vendor_id
@@ -47,9 +41,7 @@ def print_invoice_escpos(invoice_number: str, usb_vendor: Optional[int] = None,
 			printer = Network(h, port=po)
 		if not printer:
 			return False
-		for line in text.splitlines():
-			printer.text(line + "\n")
-		printer.cut()
+		printer._raw(escpos_bytes(lines, CONFIG.printer_encoding))
 		return True
 	except Exception:
 		return False
@@ -1,81 +1,61 @@
 from pathlib import Path
 from typing import Optional
 import os
+import socket
 import subprocess
+import tempfile
 import platform
 
 from .config import CONFIG
-from .invoice import save_invoice_text
+from .invoice import save_invoice_for_printing
+from .raster_cache import receipt_header_raster
+from .receipt import (
+	Blank, ItemRow, KeyValue, Receipt, Rule, Text, escpos_bytes, escpos_width, get_layout, render_text,
+)
 
 try:
-	from escpos.printer import Usb, Network
+	from escpos.printer import Usb
 	_HAS_ESCPOS = True
 except Exception:
 	_HAS_ESCPOS = False
 
 
-def _split_lines_for_width(text: str, width: int) -> str:
-	"""Split text lines to fit within specified width"""
-	lines = []
-	for line in text.splitlines():
-		while len(line) > width:
-			lines.append(line[:width])
-			line = line[width:]
-		lines.append(line)
-	return "\n".join(lines)
-
-
-def _format_for_full_width(text: str, width: int = 80) -> str:
-	"""Format text for full-width printing with proper alignment"""
-	lines = []
-	for line in text.splitlines():
-		# Center restaurant name
-		if line.startswith(CONFIG.restaurant_legal_name) or line.startswith("HUNGER"):
-			lines.append(line.center(width))
-		# Center headers like "TAX INVOICE"
-		elif line.startswith("TAX INVOICE") or line.startswith("RECEIPT"):
-			lines.append(line.center(width))
-		# Left-align other content
-		else:
-			lines.append(line.ljust(width))
-	return "\n".join(lines)
+# Set by configure_printer_for_full_width(); CONFIG is frozen, so the width lives here
+_full_width = False
 
 
 def _get_printer_width() -> int:
-	"""Get appropriate printer width based on system and printer type"""
-	if CONFIG.printer_type == "escpos_usb" or CONFIG.printer_type == "escpos_network":
-		# ESC/POS printers typically support 32-48 characters
-		return 48
-	else:
-		# For OS printing, use full page width
-		return 80
+	"""Characters per line for the configured printer and paper (full width: 48 on ESC/POS, 80 for OS printing)"""
+	return escpos_width(80 if _full_width else CONFIG.paper_width_mm, CONFIG.printer_type)
 
 
 def print_invoice_os(invoice_number: str) -> Path:
 	"""Print invoice using OS printing with full-width support"""
-	path = save_invoice_text(invoice_number)
-	
-	# Read the invoice text
-	with open(path, 'r', encoding='utf-8') as f:
-		text = f.read()
-	
-	# Format for full-width printing
+	# Store the invoice and lay it out for the printer width
 	width = _get_printer_width()
-	formatted_text = _format_for_full_width(text, width)
-	
-	# Write formatted text to a temporary file
-	temp_path = path.parent / f"formatted_{invoice_number}.txt"
-	with open(temp_path, 'w', encoding='utf-8') as f:
-		f.write(formatted_text)
+	path, lines = save_invoice_for_printing(invoice_number, width)
+	print_text_os(render_text(lines, width), prefix=f"formatted_{invoice_number}_")
+	return path
+
+
+def print_text_os(text: str, queue: Optional[str] = None, prefix: str = "print_") -> None:
+	"""Print plain text through the OS print commands; ``queue`` selects a printer (lp -d / lpr -P)"""
+	# Write formatted text to a temporary file (system temp dir, not the invoice store)
+	with tempfile.NamedTemporaryFile('w', prefix=prefix, suffix=".txt", encoding='utf-8', delete=False) as f:
+		f.write(text)
+	temp_path = Path(f.name)
 	
 	# Print using OS commands
+	printed = False
 	if os.name == 'posix':  # Unix/Linux/macOS
 		# Try different printing methods
+		lp = f"lp -d '{queue}'" if queue else "lp"
+		lpr = f"lpr -P '{queue}'" if queue else "lpr"
 		commands = [
-			f"lp '{temp_path}'",
-			f"lpr '{temp_path}'",
-			f"cat '{temp_path}' | lp",
-			f"cat '{temp_path}' | lpr"
+			f"{lp} '{temp_path}'",
+			f"{lpr} '{temp_path}'",
+			f"cat '{temp_path}' | {lp}",
+			f"cat '{temp_path}' | {lpr}"
 		]
 		
 		for cmd in commands:
@@ -83,16 +63,17 @@ def print_invoice_os(invoice_number: str) -> Path:
 				result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
 				if result.returncode == 0:
 					print(f"[INFO] Printed using: {cmd}")
+					printed = True
 					break
 			except Exception as e:
 				print(f"[WARNING] Print command failed: {cmd} - {e}")
 				continue
 	else:  # Windows
 		# Try different Windows printing methods
+		out_printer = f" -Name '{queue}'" if queue else ""
 		commands = [
-			f'notepad /p "{temp_path}"',
-			f'type "{temp_path}" | more',
-			f'powershell -Command "Get-Content \'{temp_path}\' | Out-Printer"'
+			f'notepad /p "{temp_path}"' if not queue else f'notepad /pt "{temp_path}" "{queue}"',
+			f'powershell -Command "Get-Content \'{temp_path}\' | Out-Printer{out_printer}"'
 		]
 		
 		for cmd in commands:
@@ -100,6 +81,7 @@ def print_invoice_os(invoice_number: str) -> Path:
 				result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
 				if result.returncode == 0:
 					print(f"[INFO] Printed using: {cmd}")
+					printed = True
 					break
 			except Exception as e:
 				print(f"[WARNING] Print command failed: {cmd} - {e}")
@@ -111,58 +93,51 @@ def print_invoice_os(invoice_number: str) -> Path:
 	except:
 		pass
 	
-	return path
+	if not printed:
+		# Raise so the spooler keeps the job and retries it
+		raise RuntimeError("No OS print command succeeded")
+
+
+def send_escpos(data: bytes, usb_vendor: Optional[int] = None, usb_product: Optional[int] = None, host: Optional[str] = None, port: Optional[int] = None, printer_type: Optional[str] = None, device: Optional[str] = None) -> bool:
+	"""Send a complete ESC/POS job to the configured (or given) printer in a single write"""
+	v = usb_vendor or CONFIG.escpos_vendor_id
+	p = usb_product or CONFIG.escpos_product_id
+	h = host or CONFIG.escpos_host
+	po = port or CONFIG.escpos_port
+	kind = printer_type or CONFIG.printer_type
+	dev = device or CONFIG.escpos_device
+	
+	if kind == 'escpos_file' and dev:
+		with open(dev, 'ab') as f:
+			f.write(data)
+		return True
+	if kind == 'escpos_network' and h:
+		if CONFIG.escpos_keepalive:
+			from .printer_connections import get_printer_connection
+			get_printer_connection(h, po).send(data)
+		else:
+			with socket.create_connection((h, po), timeout=CONFIG.escpos_timeout) as conn:
+				conn.sendall(data)
+		return True
+	if kind == 'escpos_usb' and v and p and _HAS_ESCPOS:
+		printer = Usb(v, p, 0)
+		try:
+			printer._raw(data)
+		finally:
+			printer.close()
+		return True
+	return False
 
 
 def print_invoice_escpos(invoice_number: str, usb_vendor: Optional[int] = None, usb_product: Optional[int] = None, host: Optional[str] = None, port: Optional[int] = None) -> bool:
 	"""Print invoice using ESC/POS with full-width support"""
-	if not _HAS_ESCPOS:
-		return False
-	
-	text_path = save_invoice_text(invoice_number)
-	text = Path(text_path).read_text(encoding='utf-8')
-	
-	# Format for full-width printing
-	width = _get_printer_width()
-	formatted_text = _format_for_full_width(text, width)
-	
-	try:
-		printer = None
-		v = usb_vendor or CONFIG.escpos_vendor_id
-		p = usb_product or CONFIG.escpos_product_id
-		h = host or CONFIG.escpos_host
-		po = port or CONFIG.escpos_port
-		
-		if CONFIG.printer_type == 'escpos_usb' and v and p:
-			printer = Usb(v, p, 0)
-		elif CONFIG.printer_type == 'escpos_network' and h:
-			printer = Network(h, port=po)
-		
-		if not printer:
-			return False
-		
-		# Set printer to use full width
-		printer.set(align='center', width=2, height=2)  # Center alignment for headers
-		
-		for line in formatted_text.splitlines():
-			if line.strip().startswith(CONFIG.restaurant_legal_name) or line.strip().startswith("HUNGER"):
-				# Center restaurant name
-				printer.set(align='center', width=2, height=2)
-				printer.text(line.strip() + "\n")
-			elif line.strip().startswith("TAX INVOICE") or line.strip().startswith("RECEIPT"):
-				# Center headers
-				printer.set(align='center', width=2, height=2)
-				printer.text(line.strip() + "\n")
-			else:
-				# Left-align other content
-				printer.set(align='left', width=1, height=1)
-				printer.text(line + "\n")
-		
-		printer.cut()
-		return True
-	except Exception as e:
-		print(f"[ERROR] ESC/POS printing failed: {e}")
-		return False
+	# Store the invoice, lay it out for the printer width and compile it into one buffer:
+	# alignment, bold and double size are inlined, the cut is the printer's own
+	_, lines = save_invoice_for_printing(invoice_number, _get_printer_width())
+	# The logo and banner are rasterised once and cached; each receipt only splices the bytes in
+	header = receipt_header_raster(80 if _full_width else CONFIG.paper_width_mm)
+	data = escpos_bytes(lines, CONFIG.printer_encoding, header=header)
+	return send_escpos(data, usb_vendor, usb_product, host, port)
 
 
 def print_invoice_full_width(invoice_number: str) -> bool:
@@ -171,7 +146,7 @@ def print_invoice_full_width(invoice_number: str) -> bool:
 		if CONFIG.printer_type == "os":
 			print_invoice_os(invoice_number)
 			return True
-		elif CONFIG.printer_type in ["escpos_usb", "escpos_network"]:
+		elif CONFIG.printer_type in ["escpos_usb", "escpos_network", "escpos_file"]:
 			return print_invoice_escpos(invoice_number)
 		else:
 			print(f"[ERROR] Unknown printer type: {CONFIG.printer_type}")
@@ -183,40 +158,39 @@ def print_invoice_full_width(invoice_number: str) -> bool:
 
 def configure_printer_for_full_width():
 	"""Configure printer settings for full-width printing"""
-	# Update config for full-width printing
-	global CONFIG
-	CONFIG.paper_width_chars = 80  # Use full page width
-	CONFIG.printer_encoding = "utf-8"  # Use UTF-8 encoding
+	global _full_width
+	_full_width = True
 	
 	print("[INFO] Printer configured for full-width printing")
-	print(f"[INFO] Paper width: {CONFIG.paper_width_chars} characters")
+	print(f"[INFO] Paper width: {_get_printer_width()} characters")
 	print(f"[INFO] Printer type: {CONFIG.printer_type}")
 
 
 def test_printer_width():
-	"""Test printer width with sample text"""
-	test_text = """
-HUNGER Restaurant
-123 Main Street, City
-GSTIN: 27ABCDE1234F1Z5   FSSAI: 12345678901234
-
-TAX INVOICE
-Invoice No: TEST001    Date: 2024-01-01
-
-Items:
- - Test Item 1 x1 @ ₹100.00 = ₹100.00
- - Test Item 2 x2 @ ₹50.00 = ₹100.00
-
-Subtotal: ₹200.00
-CGST: ₹18.00
-SGST: ₹18.00
-Total: ₹236.00
-
-Thank you for your business!
-"""
+	"""Test printer width with a sample receipt"""
+	sample = Receipt([
+		Text("HUNGER Restaurant", align="center", bold=True, size=2),
+		Text("123 Main Street, City", align="center"),
+		Text("GSTIN: 27ABCDE1234F1Z5", align="center"),
+		Text("FSSAI: 12345678901234", align="center"),
+		Blank(),
+		Text("TAX INVOICE", align="center", bold=True),
+		KeyValue("Invoice No:", "TEST001"),
+		KeyValue("Date:", "2024-01-01"),
+		Rule(),
+		ItemRow("Test Item 1", "1", "₹100.00", "₹100.00"),
+		ItemRow("Test Item 2 with a long name", "2", "₹50.00", "₹100.00"),
+		Rule(),
+		KeyValue("Subtotal", "₹200.00"),
+		KeyValue("CGST", "₹18.00"),
+		KeyValue("SGST", "₹18.00"),
+		KeyValue("Total", "₹236.00", bold=True),
+		Blank(),
+		Text("Thank you for your business!", align="center"),
+	])
 	
 	width = _get_printer_width()
-	formatted_text = _format_for_full_width(test_text, width)
+	formatted_text = render_text(get_layout(width).render(sample), width)
 	
 	print("=" * 80)
 	print("PRINTER WIDTH TEST")
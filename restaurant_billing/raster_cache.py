@@ -0,0 +1,145 @@
+"""
+Pre-rasterised receipt images (logo, header banner) for thermal printers.
+
+Turning a picture into ESC/POS raster bits (scale, dither, pack) is costly on
+a low-end POS CPU, and ``logo.png`` is a 2048x2048 image. ``image_raster``
+does it once per image content, printable width and head density, and keeps
+the finished ``GS v 0`` command bytes in memory and on disk under
+``assets/raster`` (named after the image hash, width and density). Later receipts
+only stat the file (the content hash is kept per path, mtime and size) and
+splice the cached bytes into their ESC/POS buffer. Editing the image changes
+its hash, so stale rasters are never printed.
+
+Pillow is only needed to build a raster; without it the cached rasters still
+print and receipts without a cache entry simply have no logo.
+"""
+
+import hashlib
+import os
+from pathlib import Path
+from threading import Lock
+from typing import Dict, Optional, Tuple
+
+from .config import CONFIG
+
+try:
+	from PIL import Image
+	_HAS_PIL = True
+except Exception:
+	_HAS_PIL = False
+
+
+_BAND_ROWS = 256  # rows per GS v 0 command; some printers cap the height of one image
+_DIGESTS: Dict[Tuple[str, int, int], str] = {}  # (path, mtime_ns, size) -> sha256
+_RASTERS: Dict[Tuple[str, int, int, int, int], bytes] = {}  # (sha256, width, density, max width, max height) -> bytes
+_LOCK = Lock()
+_INVERT = bytes(255 - i for i in range(256))
+
+
+def printable_dots(paper_width_mm: int, dots_per_mm: int) -> int:
+	"""Printable width of a thermal head in dots (48 mm on 58 mm paper, 72 mm on 80 mm paper)."""
+	return (72 if paper_width_mm >= 80 else 48) * dots_per_mm
+
+
+def raster_dir() -> Path:
+	return CONFIG.assets_path / "raster"
+
+
+def _digest(path: Path) -> Optional[str]:
+	try:
+		st = path.stat()
+	except OSError:
+		return None
+	key = (str(path), st.st_mtime_ns, st.st_size)
+	digest = _DIGESTS.get(key)
+	if digest is None:
+		digest = _DIGESTS[key] = hashlib.sha256(path.read_bytes()).hexdigest()
+	return digest
+
+
+def raster_bytes(image, width_dots: int) -> bytes:
+	"""GS v 0 commands printing a 1-bit Pillow image centred on a ``width_dots`` wide line."""
+	row_bytes = (width_dots + 7) // 8
+	canvas = Image.new("1", (row_bytes * 8, image.height), 1)
+	canvas.paste(image, ((row_bytes * 8 - image.width) // 2, 0))
+	# Pillow packs white as 1, ESC/POS prints 1 as black
+	bits = canvas.tobytes().translate(_INVERT)
+	out = bytearray()
+	for top in range(0, canvas.height, _BAND_ROWS):
+		rows = min(_BAND_ROWS, canvas.height - top)
+		out += b"\x1dv0\x00" + bytes([row_bytes & 0xFF, row_bytes >> 8, rows & 0xFF, rows >> 8])
+		out += bits[top * row_bytes:(top + rows) * row_bytes]
+	return bytes(out)
+
+
+def _cache_file(digest: str, width_dots: int, density: int, max_width: int, max_height: int) -> Path:
+	return raster_dir() / f"{digest[:32]}_{width_dots}x{max_width}x{max_height}_{density}.bin"
+
+
+def _rasterise(path: Path, width_dots: int, max_width: int, max_height: int) -> bytes:
+	with Image.open(path) as img:
+		img = img.convert("RGBA")
+		# Transparent areas print as paper, not black
+		flat = Image.new("RGBA", img.size, (255, 255, 255, 255))
+		flat.alpha_composite(img)
+		gray = flat.convert("L")
+	gray.thumbnail((max_width, max_height), Image.LANCZOS)
+	return raster_bytes(gray.convert("1"), width_dots)  # Floyd-Steinberg dithering
+
+
+def image_raster(path: Optional[Path], width_dots: int, density: int, max_width: Optional[int] = None, max_height: Optional[int] = None) -> bytes:
+	"""Cached ESC/POS raster of an image for a printer line of ``width_dots`` at ``density`` dots/mm.
+
+	The image is scaled down to fit ``max_width`` x ``max_height`` dots (default: the
+	line width, and as tall). Returns b"" when the image is missing or cannot be rasterised.
+	"""
+	if path is None:
+		return b""
+	path = Path(path)
+	max_width = min(max_width or width_dots, width_dots)
+	max_height = max_height or width_dots
+	with _LOCK:
+		digest = _digest(path)
+		if digest is None:
+			return b""
+		key = (digest, width_dots, density, max_width, max_height)
+		data = _RASTERS.get(key)
+		if data is not None:
+			return data
+		cache_file = _cache_file(digest, width_dots, density, max_width, max_height)
+		if cache_file.exists():
+			data = cache_file.read_bytes()
+		elif not _HAS_PIL:
+			return b""
+		else:
+			try:
+				data = _rasterise(path, width_dots, max_width, max_height)
+			except Exception as e:
+				print(f"[WARNING] Could not rasterise {path}: {e}")
+				return b""
+			cache_file.parent.mkdir(parents=True, exist_ok=True)
+			tmp = cache_file.with_suffix(f".{os.getpid()}.tmp")
+			tmp.write_bytes(data)
+			os.replace(tmp, cache_file)
+		_RASTERS[key] = data
+		return data
+
+
+def receipt_header_raster(paper_width_mm: Optional[int] = None, dots_per_mm: Optional[int] = None) -> bytes:
+	"""Logo (half the line wide) followed by the header banner (full width), for the receipt printer."""
+	density = dots_per_mm or CONFIG.printer_dots_per_mm
+	width = printable_dots(paper_width_mm or CONFIG.paper_width_mm, density)
+	logo = image_raster(CONFIG.receipt_logo_path, width, density, max_width=width // 2, max_height=width // 2)
+	banner = image_raster(CONFIG.receipt_banner_path, width, density, max_height=width // 2)
+	return logo + banner
+
+
+def clear_raster_cache() -> int:
+	"""Delete the cached rasters (they are rebuilt on the next print); returns the files removed."""
+	with _LOCK:
+		_RASTERS.clear()
+		removed = 0
+		for f in raster_dir().glob("*.bin"):
+			f.unlink()
+			removed += 1
+		return removed
@@ -0,0 +1,322 @@
+"""
+Structured receipts and a per-paper-width layout engine.
+
+A ``Receipt`` is a list of typed blocks (text, key/amount rows, item rows,
+rules). ``get_layout(width)`` compiles the column plan for a paper width once
+(58mm = 30 chars, 80mm = 48, A4 = 80) and ``Layout.render`` turns a receipt into
+``ReceiptLine``s in a single pass: words are wrapped, amounts right-aligned and
+item tables laid out in columns. Every backend consumes the same lines: plain
+text via ``render_text``, ESC/POS via ``escpos_bytes`` (one byte buffer per
+receipt, sent in a single write) and PDF via ``render_pdf``.
+"""
+
+import re
+import textwrap
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Union
+
+
+PAPER_WIDTHS = {"58mm": 30, "80mm": 48, "A4": 80}
+
+
+@dataclass(slots=True)
+class Text:
+	text: str
+	align: str = "left"  # left | center | right
+	bold: bool = False
+	size: int = 1  # 2 = double width and height
+
+
+@dataclass(slots=True)
+class KeyValue:
+	label: str
+	value: str
+	bold: bool = False
+
+
+@dataclass(slots=True)
+class ItemRow:
+	name: str
+	quantity: str
+	rate: str
+	amount: str
+
+
+@dataclass(slots=True)
+class Rule:
+	char: str = "-"
+
+
+@dataclass(slots=True)
+class Blank:
+	pass
+
+
+@dataclass(slots=True)
+class QRCode:
+	data: str  # e.g. a UPI payment link; printed natively on ESC/POS, left blank in text and PDF
+
+
+Block = Union[Text, KeyValue, ItemRow, Rule, Blank, QRCode]
+
+
+@dataclass(slots=True)
+class Receipt:
+	blocks: List[Block] = field(default_factory=list)
+
+	def add(self, block: Block) -> "Receipt":
+		self.blocks.append(block)
+		return self
+
+
+@dataclass(slots=True)
+class ReceiptLine:
+	"""One printed line: ``text`` is already padded/aligned to the layout width (in its own size)."""
+	text: str
+	align: str = "left"
+	bold: bool = False
+	size: int = 1
+	qr: str = ""  # QR payload instead of text
+
+
+def _wrap(text: str, width: int) -> List[str]:
+	if len(text) <= width and "\n" not in text and "\t" not in text:
+		# Most labels fit; textwrap would only drop the trailing blanks
+		return [text.rstrip()] if text.strip() else [""]
+	return textwrap.wrap(text, width, break_long_words=True, break_on_hyphens=False) or [""]
+
+
+def _align(text: str, width: int, align: str) -> str:
+	if align == "center":
+		return text.center(width).rstrip()
+	if align == "right":
+		return text.rjust(width)
+	return text
+
+
+class Layout:
+	"""Column plan for one paper width. Build through ``get_layout`` so each width is compiled once."""
+
+	def __init__(self, width: int):
+		self.width = width
+		# Narrow paper: item name on its own line(s), then "qty x rate" with the amount on the right.
+		# Wider paper: one row per item with name/qty/rate/amount columns.
+		self.stacked_items = width < 40
+		self.amount_width = 12 if width >= 40 else 10
+		if self.stacked_items:
+			self.item_header = _align("Item", width, "left")
+			self._detail_width = width - self.amount_width - 1
+		else:
+			self.qty_width = 5
+			self.rate_width = 10 if width < 60 else 12
+			self.name_width = width - self.qty_width - self.rate_width - self.amount_width - 3
+			self._row = f"{{:<{self.name_width}}} {{:>{self.qty_width}}} {{:>{self.rate_width}}} {{:>{self.amount_width}}}"
+			self.item_header = self._row.format("Item", "Qty", "Rate", "Amount")
+
+	def _item(self, row: ItemRow, out: List[ReceiptLine]) -> None:
+		if self.stacked_items:
+			out.extend(ReceiptLine(part) for part in _wrap(row.name, self.width))
+			detail = f"  {row.quantity} x {row.rate}"
+			out.append(ReceiptLine(f"{detail[:self._detail_width]:<{self._detail_width}} {row.amount:>{self.amount_width}}"))
+			return
+		names = _wrap(row.name, self.name_width)
+		out.append(ReceiptLine(self._row.format(names[0], row.quantity, row.rate, row.amount)))
+		out.extend(ReceiptLine(part) for part in names[1:])
+
+	def _key_value(self, block: KeyValue, out: List[ReceiptLine]) -> None:
+		room = self.width - len(block.value) - 1
+		if room >= len(block.label):
+			out.append(ReceiptLine(f"{block.label:<{room}} {block.value}", bold=block.bold))
+			return
+		# Label too long for one line: wrap it and put the amount on the last label line (or its own line)
+		parts = _wrap(block.label, self.width)
+		out.extend(ReceiptLine(p, bold=block.bold) for p in parts[:-1])
+		last = parts[-1]
+		if len(last) <= room:
+			out.append(ReceiptLine(f"{last:<{room}} {block.value}", bold=block.bold))
+		else:
+			out.append(ReceiptLine(last, bold=block.bold))
+			out.append(ReceiptLine(block.value.rjust(self.width), bold=block.bold))
+
+	def render(self, receipt: Receipt) -> List[ReceiptLine]:
+		out: List[ReceiptLine] = []
+		header_done = False
+		for block in receipt.blocks:
+			if isinstance(block, ItemRow):
+				if not header_done:
+					out.append(ReceiptLine(self.item_header, bold=True))
+					out.append(ReceiptLine("-" * self.width))
+					header_done = True
+				self._item(block, out)
+				continue
+			header_done = False
+			if isinstance(block, Text):
+				width = self.width // block.size
+				out.extend(
+					ReceiptLine(_align(part, width, block.align), block.align, block.bold, block.size)
+					for part in _wrap(block.text, width)
+				)
+			elif isinstance(block, KeyValue):
+				self._key_value(block, out)
+			elif isinstance(block, Rule):
+				out.append(ReceiptLine(block.char * self.width))
+			elif isinstance(block, QRCode):
+				out.append(ReceiptLine("", "center", qr=block.data))
+			else:
+				out.append(ReceiptLine(""))
+		return out
+
+
+@lru_cache(maxsize=None)
+def get_layout(width: int) -> Layout:
+	return Layout(width)
+
+
+def render_text(lines: List[ReceiptLine], width: int) -> str:
+	"""Plain text; double-size lines are re-aligned to the full width since text has no size."""
+	return "\n".join(line.text if line.size == 1 else _align(line.text.strip(), width, line.align) for line in lines)
+
+
+def _pdf_escape(text: str) -> str:
+	# Base-14 Courier is WinAnsi-encoded; the rupee sign is not in that set
+	text = text.replace("₹", "Rs.")
+	text = text.encode("cp1252", "replace").decode("cp1252")
+	return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def render_pdf(lines: List[ReceiptLine], path: Path, width: int = PAPER_WIDTHS["A4"]) -> Path:
+	"""Write laid-out lines to an A4 PDF file."""
+	path.parent.mkdir(parents=True, exist_ok=True)
+	path.write_bytes(pdf_bytes(lines, width))
+	return path
+
+
+def pdf_bytes(lines: List[ReceiptLine], width: int = PAPER_WIDTHS["A4"]) -> bytes:
+	"""Laid-out lines as an A4 PDF in Courier (no external PDF library needed)."""
+	page_w, page_h, margin = 595, 842, 36
+	font_size = (page_w - 2 * margin) / (0.6 * width)  # Courier glyphs are 0.6 em wide
+	leading = font_size * 1.25
+	per_page = int((page_h - 2 * margin) / leading)
+	pages: List[List[ReceiptLine]] = []
+	used = per_page
+	for line in lines:
+		if used + line.size > per_page:
+			pages.append([])
+			used = 0
+		pages[-1].append(line)
+		used += line.size
+
+	objects: List[bytes] = [b"", b""]  # catalog and page tree, filled in below
+	objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Courier /Encoding /WinAnsiEncoding >>")
+	objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Courier-Bold /Encoding /WinAnsiEncoding >>")
+	page_ids = []
+	for page in pages or [[]]:
+		ops = ["BT"]
+		y = page_h - margin
+		for line in page:
+			size = font_size * line.size
+			y -= leading * line.size
+			ops.append(f"/{'F2' if line.bold else 'F1'} {size:.2f} Tf 1 0 0 1 {margin} {y:.2f} Tm ({_pdf_escape(line.text)}) Tj")
+		ops.append("ET")
+		stream = "\n".join(ops).encode("cp1252", "replace")
+		objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+		content_id = len(objects)
+		objects.append(
+			b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] /Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> /Contents %d 0 R >>"
+			% (page_w, page_h, content_id)
+		)
+		page_ids.append(len(objects))
+	objects[0] = b"<< /Type /Catalog /Pages 2 0 R >>"
+	objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(b"%d 0 R" % i for i in page_ids), len(page_ids))
+
+	out = bytearray(b"%PDF-1.4\n")
+	offsets = []
+	for i, body in enumerate(objects, 1):
+		offsets.append(len(out))
+		out += b"%d 0 obj\n" % i + body + b"\nendobj\n"
+	xref = len(out)
+	out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+	out += b"".join(b"%010d 00000 n \n" % off for off in offsets)
+	out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+	return bytes(out)
+
+
+def escpos_width(paper_width_mm: int, printer_type: str) -> int:
+	"""Characters per line for a printer: thermal widths by paper size, A4 for OS printing."""
+	if printer_type == "os":
+		return PAPER_WIDTHS["A4"]
+	return PAPER_WIDTHS["80mm"] if paper_width_mm >= 80 else PAPER_WIDTHS["58mm"]
+
+
+ESC = b"\x1b"
+GS = b"\x1d"
+# Single-byte code pages selectable with ESC t; other encodings fall back to cp437
+ESCPOS_CODEPAGES = {"cp437": 0, "cp850": 2, "cp860": 3, "cp863": 4, "cp865": 5, "cp1252": 16, "cp866": 17, "cp852": 18, "cp858": 19}
+_ESCPOS_ALIGN = {"left": b"\x00", "center": b"\x01", "right": b"\x02"}
+
+
+_GAP = re.compile(r"(?<=\S)  +")
+
+
+def _escpos_rupees(text: str) -> str:
+	"""Thermal code pages have no rupee sign: write "Rs", taking the extra width out of a column gap."""
+	if "₹" not in text:
+		return text
+	text = text.replace("  ₹", " Rs")
+	extra = text.count("₹")
+	text = text.replace("₹", "Rs")
+	while extra:
+		gap = _GAP.search(text)
+		if gap is None:
+			break
+		text = text[:gap.start()] + text[gap.start() + 1:]
+		extra -= 1
+	return text
+
+
+def _escpos_qr(data: str, module: int) -> bytes:
+	"""GS ( k: model 2, module size, error correction M, store the data, print it."""
+	payload = data.encode("ascii", "replace")
+	store = len(payload) + 3
+	return b"".join((
+		GS, b"(k\x04\x001A2\x00",
+		GS, b"(k\x03\x001C", bytes([module]),
+		GS, b"(k\x03\x001E1",
+		GS, b"(k", bytes([store & 0xFF, store >> 8]), b"1P0", payload,
+		GS, b"(k\x03\x001Q0",
+	))
+
+
+def escpos_bytes(lines: List[ReceiptLine], encoding: str = "cp437", cut: bool = True, qr_module: int = 6, header: bytes = b"") -> bytes:
+	"""Laid-out lines as one ESC/POS job: reset, code page, style changes inlined where they differ, QR and cut.
+
+	``header`` is spliced in as is before the lines, e.g. the cached logo raster.
+	"""
+	encoding = encoding.lower().replace("-", "")
+	if encoding not in ESCPOS_CODEPAGES:
+		encoding = "cp437"
+	out = bytearray(ESC + b"@" + ESC + b"t" + bytes([ESCPOS_CODEPAGES[encoding]]))
+	out += header
+	align, bold, size = "left", False, 1
+	for line in lines:
+		if line.align != align:
+			out += ESC + b"a" + _ESCPOS_ALIGN.get(line.align, b"\x00")
+			align = line.align
+		if line.bold != bold:
+			out += ESC + (b"E\x01" if line.bold else b"E\x00")
+			bold = line.bold
+		if line.size != size:
+			out += GS + (b"!\x11" if line.size > 1 else b"!\x00")
+			size = line.size
+		if line.qr:
+			out += _escpos_qr(line.qr, qr_module)
+		else:
+			# The printer aligns itself, so aligned lines go without their padding
+			text = line.text if line.align == "left" else line.text.strip()
+			out += _escpos_rupees(text).encode(encoding, "replace")
+		out += b"\n"
+	if cut:
+		out += GS + b"VA\x03"  # feed three lines, then cut
+	return bytes(out)
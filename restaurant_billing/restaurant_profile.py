@@ -0,0 +1,145 @@
+"""
+Cached restaurant profile.
+
+The single ``Restaurant`` row (name, address, GSTIN, ...) is read once and kept
+in memory for invoices, e-invoices, UPI payments and the app header. Edits made
+through ``update_restaurant_profile`` drop the cache directly; edits made by
+another process or connection bump ``RestaurantVersion`` (a trigger on
+``Restaurant``), which is read on a small dedicated connection. That read is
+skipped while ``PRAGMA data_version`` is unchanged, i.e. nobody else has
+committed at all; commits to orders, print jobs or rollups change
+``data_version`` but not the profile version, so they do not reload the profile.
+"""
+
+import atexit
+import re
+import sqlite3
+from dataclasses import dataclass, fields
+from pathlib import Path
+from threading import Lock
+from typing import Any, Dict, Optional
+
+from .config import CONFIG
+from .db import transaction, with_lock_retry
+
+
+@dataclass(frozen=True, slots=True)
+class RestaurantProfile:
+	name: str
+	address: str
+	gstin: str
+	state_code: str
+	fssai_license: str
+
+	def as_dict(self) -> Dict[str, Any]:
+		return {f.name: getattr(self, f.name) for f in fields(self)}
+
+	@property
+	def upi_payee_name(self) -> str:
+		return CONFIG.upi_payee_name or self.name
+
+	def seller_details(self) -> Dict[str, Any]:
+		"""SellerDtls of an e-invoice; locality and PIN are read from the address when it ends in them."""
+		pin = re.search(r"\b(\d{6})\b", self.address)
+		parts = [p.strip() for p in self.address.split(",") if p.strip()]
+		# "123, MG Road, Mumbai, Maharashtra 400001": the locality is the part before the state/PIN
+		loc = parts[-2] if pin and len(parts) >= 2 and pin.group(1) in parts[-1] else "Mumbai"
+		return {
+			"Gstin": self.gstin,
+			"LglNm": self.name,
+			"Addr1": self.address,
+			"Loc": loc,
+			"Pin": int(pin.group(1)) if pin else 400001,
+			"Stcd": self.state_code,
+		}
+
+
+def _default_profile() -> RestaurantProfile:
+	return RestaurantProfile(CONFIG.restaurant_legal_name, "", CONFIG.restaurant_gst_number or "", CONFIG.default_state_code, "")
+
+
+class _ProfileCache:
+	def __init__(self):
+		self._lock = Lock()
+		self._conn: Optional[sqlite3.Connection] = None
+		self._db_path: Optional[Path] = None
+		self._data_version: Optional[int] = None
+		self._version: Optional[int] = None  # RestaurantVersion.version of the cached profile
+		self._profile: Optional[RestaurantProfile] = None
+
+	def _connection(self) -> sqlite3.Connection:
+		db_path = Path(CONFIG.db_path).resolve()
+		if self._conn is None or self._db_path != db_path:
+			self.close()
+			self._conn = sqlite3.connect(str(db_path), timeout=CONFIG.db_busy_timeout_ms / 1000.0, check_same_thread=False)
+			self._db_path = db_path
+		return self._conn
+
+	def get(self) -> RestaurantProfile:
+		with self._lock:
+			conn = self._connection()
+			data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+			if self._profile is not None and data_version == self._data_version:
+				return self._profile
+			self._data_version = data_version
+			version = self._profile_version(conn)
+			if self._profile is not None and version is not None and version == self._version:
+				return self._profile
+			try:
+				row = conn.execute("SELECT name, address, gstin, state_code, fssai_license FROM Restaurant LIMIT 1").fetchone()
+			except sqlite3.OperationalError:
+				row = None  # database not initialised yet
+			self._profile = RestaurantProfile(*(v or "" for v in row)) if row else _default_profile()
+			# Read before the row: a change in between only costs one more reload
+			self._version = version
+			return self._profile
+
+	@staticmethod
+	def _profile_version(conn: sqlite3.Connection) -> Optional[int]:
+		try:
+			row = conn.execute("SELECT version FROM RestaurantVersion WHERE id = 1").fetchone()
+		except sqlite3.OperationalError:
+			return None  # not migrated yet; reload on every data_version change
+		return row[0] if row else None
+
+	def invalidate(self) -> None:
+		with self._lock:
+			self._profile = None
+
+	def close(self) -> None:
+		if self._conn is not None:
+			self._conn.close()
+			self._conn = None
+			self._profile = None
+
+
+_CACHE = _ProfileCache()
+atexit.register(_CACHE.close)
+
+
+def get_restaurant_profile() -> RestaurantProfile:
+	return _CACHE.get()
+
+
+def invalidate_restaurant_profile() -> None:
+	"""Drop the cached profile; the next read reloads it."""
+	_CACHE.invalidate()
+
+
+@with_lock_retry
+def update_restaurant_profile(**changes: str) -> RestaurantProfile:
+	"""Change fields of the restaurant profile (name, address, gstin, state_code, fssai_license)."""
+	profile = get_restaurant_profile().as_dict()
+	unknown = set(changes) - set(profile)
+	if unknown:
+		raise ValueError(f"Unknown restaurant fields: {', '.join(sorted(unknown))}")
+	profile.update(changes)
+	with transaction() as conn:
+		# The table holds a single row
+		conn.execute("DELETE FROM Restaurant")
+		conn.execute(
+			"INSERT INTO Restaurant(name, address, gstin, state_code, fssai_license) VALUES (?, ?, ?, ?, ?)",
+			(profile["name"], profile["address"], profile["gstin"], profile["state_code"], profile["fssai_license"]),
+		)
+	invalidate_restaurant_profile()
+	return get_restaurant_profile()
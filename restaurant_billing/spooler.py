@@ -0,0 +1,290 @@
+"""
+Background print spooler.
+
+Print requests are rows in ``PrintJobs`` so nothing is lost when a printer is
+offline or the app is closed mid-print. ``enqueue_print`` only inserts a row
+and returns; a ``PrintSpooler`` runs one worker thread per printer that prints
+that printer's jobs oldest first. A failed job is retried with exponential
+backoff (with jitter) and holds back the jobs queued behind it on the same
+printer, so receipts keep their order, while other printers carry on. After
+``CONFIG.print_max_attempts`` the job is FAILED and waits for a manual retry.
+
+Run one spooler per database: at start-up it takes back jobs left PRINTING by
+a previous run.
+"""
+
+import json
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from .config import CONFIG
+from .db import get_conn, transaction, with_lock_retry
+
+
+QUEUED = "QUEUED"
+PRINTING = "PRINTING"
+DONE = "DONE"
+FAILED = "FAILED"
+
+RECEIPT_PRINTER = "receipt"
+
+_DONE_KEEP_DAYS = 7
+
+# kind -> handler(printer, payload); raising (or returning False) fails the attempt
+PrintHandler = Callable[[str, Dict[str, Any]], Any]
+_HANDLERS: Dict[str, PrintHandler] = {}
+
+
+def register_handler(kind: str, handler: PrintHandler) -> None:
+	_HANDLERS[kind] = handler
+
+
+def _print_invoice(printer: str, payload: Dict[str, Any]) -> bool:
+	from .printing_fixed import configure_printer_for_full_width, print_invoice_escpos, print_invoice_os
+
+	if payload.get("full_width"):
+		configure_printer_for_full_width()
+	# Not print_invoice_full_width: it hides the error, and the job's last_error should say what went wrong
+	if CONFIG.printer_type == "os":
+		print_invoice_os(payload["invoice_number"])
+		return True
+	if CONFIG.printer_type in ("escpos_usb", "escpos_network", "escpos_file"):
+		if not print_invoice_escpos(payload["invoice_number"]):
+			raise RuntimeError(f"No {CONFIG.printer_type} printer configured")
+		return True
+	raise ValueError(f"Unknown printer type: {CONFIG.printer_type}")
+
+
+register_handler("invoice", _print_invoice)
+
+
+@with_lock_retry
+def enqueue_print(kind: str, payload: Dict[str, Any], printer: str = RECEIPT_PRINTER) -> int:
+	"""Queue a print job and wake the spooler; returns the job id."""
+	with transaction() as conn:
+		job_id = conn.execute(
+			"INSERT INTO PrintJobs(printer, kind, payload, next_attempt_at) VALUES (?, ?, ?, ?) RETURNING job_id",
+			(printer, kind, json.dumps(payload), time.time()),
+		).fetchone()[0]
+	wake_spooler()
+	return job_id
+
+
+def wake_spooler() -> None:
+	"""Look at the queue now; call after committing jobs queued inside a larger transaction."""
+	spooler = _SPOOLER
+	if spooler is not None:
+		spooler.wake()
+
+
+def enqueue_invoice_print(invoice_number: str, full_width: bool = True) -> int:
+	return enqueue_print("invoice", {"invoice_number": invoice_number, "full_width": full_width})
+
+
+def retry_delay(attempts: int) -> float:
+	"""Seconds before the next attempt after ``attempts`` failures: doubling, capped, with jitter."""
+	delay = min(CONFIG.print_retry_max_delay, CONFIG.print_retry_base_delay * (2 ** max(attempts - 1, 0)))
+	return delay * random.uniform(0.5, 1.0)
+
+
+def list_print_jobs(statuses: Optional[List[str]] = None, limit: int = 100) -> List[Dict[str, Any]]:
+	"""Most recent jobs first, optionally only those in the given statuses."""
+	sql = "SELECT job_id, printer, kind, payload, status, attempts, next_attempt_at, last_error, created_at, updated_at FROM PrintJobs"
+	params: List[Any] = []
+	if statuses:
+		sql += f" WHERE status IN ({','.join('?' * len(statuses))})"
+		params.extend(statuses)
+	sql += " ORDER BY job_id DESC LIMIT ?"
+	params.append(limit)
+	with get_conn() as conn:
+		rows = conn.execute(sql, params).fetchall()
+	keys = ("job_id", "printer", "kind", "payload", "status", "attempts", "next_attempt_at", "last_error", "created_at", "updated_at")
+	jobs = [dict(zip(keys, row)) for row in rows]
+	for job in jobs:
+		job["payload"] = json.loads(job["payload"])
+	return jobs
+
+
+def print_job_counts() -> Dict[str, int]:
+	"""{status: jobs} for QUEUED, PRINTING and FAILED (DONE jobs are not counted)."""
+	with get_conn() as conn:
+		rows = conn.execute("SELECT status, COUNT(*) FROM PrintJobs WHERE status != 'DONE' GROUP BY status").fetchall()
+	counts = {QUEUED: 0, PRINTING: 0, FAILED: 0}
+	counts.update(dict(rows))
+	return counts
+
+
+@with_lock_retry
+def retry_print_job(job_id: int) -> bool:
+	"""Queue a FAILED job again with a fresh attempt count."""
+	with transaction() as conn:
+		cur = conn.execute(
+			"""
+			UPDATE PrintJobs SET status = 'QUEUED', attempts = 0, next_attempt_at = ?, updated_at = datetime('now','localtime')
+			WHERE job_id = ? AND status = 'FAILED'
+			""",
+			(time.time(), job_id),
+		)
+		changed = cur.rowcount > 0
+	if changed:
+		wake_spooler()
+	return changed
+
+
+@with_lock_retry
+def cancel_print_job(job_id: int) -> bool:
+	"""Drop a QUEUED or FAILED job (e.g. a receipt the customer no longer needs)."""
+	with transaction() as conn:
+		cur = conn.execute("DELETE FROM PrintJobs WHERE job_id = ? AND status IN ('QUEUED', 'FAILED')", (job_id,))
+		return cur.rowcount > 0
+
+
+class PrintSpooler:
+	def __init__(self, poll_seconds: Optional[float] = None):
+		self.poll_seconds = CONFIG.print_poll_seconds if poll_seconds is None else poll_seconds
+		self._wakeup = threading.Condition()
+		self._stopping = threading.Event()
+		self._workers: Dict[str, threading.Thread] = {}
+		self._dispatcher: Optional[threading.Thread] = None
+
+	def start(self) -> None:
+		self._recover()
+		self._dispatcher = threading.Thread(target=self._dispatch, name="print-spooler", daemon=True)
+		self._dispatcher.start()
+
+	def stop(self, timeout: float = 5.0) -> None:
+		self._stopping.set()
+		self.wake()
+		for thread in [self._dispatcher, *self._workers.values()]:
+			if thread is not None:
+				thread.join(timeout)
+
+	def wake(self) -> None:
+		with self._wakeup:
+			self._wakeup.notify_all()
+
+	def _wait(self, seconds: float) -> None:
+		with self._wakeup:
+			if not self._stopping.is_set():
+				self._wakeup.wait(max(seconds, 0.0))
+
+	@with_lock_retry
+	def _recover(self) -> None:
+		with transaction() as conn:
+			# A job left PRINTING was interrupted; printing it again beats losing it
+			conn.execute("UPDATE PrintJobs SET status = 'QUEUED' WHERE status = 'PRINTING'")
+			conn.execute(
+				"DELETE FROM PrintJobs WHERE status = 'DONE' AND created_at < datetime('now','localtime', ?)",
+				(f"-{_DONE_KEEP_DAYS} days",),
+			)
+
+	def _dispatch(self) -> None:
+		"""Start a worker for every printer that has queued jobs."""
+		while not self._stopping.is_set():
+			try:
+				with get_conn() as conn:
+					printers = [row[0] for row in conn.execute("SELECT DISTINCT printer FROM PrintJobs WHERE status = 'QUEUED'")]
+			except Exception as e:
+				print(f"[WARNING] Print spooler could not read the queue: {e}")
+				printers = []
+			for printer in printers:
+				worker = self._workers.get(printer)
+				if worker is None or not worker.is_alive():
+					worker = threading.Thread(target=self._work, args=(printer,), name=f"print-{printer}", daemon=True)
+					self._workers[printer] = worker
+					worker.start()
+			self._wait(self.poll_seconds)
+
+	def _next_job(self, printer: str) -> Optional[tuple]:
+		with get_conn() as conn:
+			# The oldest queued job, due or not: a job in backoff holds back the ones behind it
+			return conn.execute(
+				"""
+				SELECT job_id, kind, payload, attempts, next_attempt_at FROM PrintJobs
+				WHERE status = 'QUEUED' AND printer = ? ORDER BY job_id LIMIT 1
+				""",
+				(printer,),
+			).fetchone()
+
+	@with_lock_retry
+	def _claim(self, job_id: int) -> bool:
+		with transaction() as conn:
+			cur = conn.execute(
+				"UPDATE PrintJobs SET status = 'PRINTING', updated_at = datetime('now','localtime') WHERE job_id = ? AND status = 'QUEUED'",
+				(job_id,),
+			)
+			return cur.rowcount > 0
+
+	@with_lock_retry
+	def _finish(self, job_id: int, attempts: int, error: Optional[str]) -> None:
+		if error is None:
+			status, next_at = DONE, 0.0
+		elif attempts >= CONFIG.print_max_attempts:
+			status, next_at = FAILED, 0.0
+		else:
+			status, next_at = QUEUED, time.time() + retry_delay(attempts)
+		with transaction() as conn:
+			conn.execute(
+				"""
+				UPDATE PrintJobs SET status = ?, attempts = ?, next_attempt_at = ?, last_error = COALESCE(?, last_error),
+					updated_at = datetime('now','localtime')
+				WHERE job_id = ?
+				""",
+				(status, attempts, next_at, error, job_id),
+			)
+
+	def _work(self, printer: str) -> None:
+		while not self._stopping.is_set():
+			try:
+				job = self._next_job(printer)
+			except Exception as e:
+				print(f"[WARNING] Print spooler ({printer}) could not read the queue: {e}")
+				self._wait(self.poll_seconds)
+				continue
+			if job is None:
+				return  # the dispatcher starts a new worker when jobs arrive
+			job_id, kind, payload, attempts, next_at = job
+			if next_at > time.time():
+				self._wait(min(next_at - time.time(), self.poll_seconds))
+				continue
+			if not self._claim(job_id):
+				continue
+			self._finish(job_id, attempts + 1, self._run(printer, kind, json.loads(payload)))
+
+	def _run(self, printer: str, kind: str, payload: Dict[str, Any]) -> Optional[str]:
+		"""Print one job; returns the error text or None on success."""
+		handler = _HANDLERS.get(kind)
+		if handler is None:
+			return f"No print handler for {kind!r}"
+		try:
+			if handler(printer, payload) is False:
+				return "Printer reported failure"
+			return None
+		except Exception as e:
+			print(f"[WARNING] Print job ({kind} on {printer}) failed: {e}")
+			return str(e) or type(e).__name__
+
+
+_SPOOLER: Optional[PrintSpooler] = None
+_SPOOLER_LOCK = threading.Lock()
+
+
+def start_spooler() -> PrintSpooler:
+	global _SPOOLER
+	from . import kot  # noqa: F401  registers the "kot" handler before queued tickets are picked up
+
+	with _SPOOLER_LOCK:
+		if _SPOOLER is None:
+			_SPOOLER = PrintSpooler()
+			_SPOOLER.start()
+		return _SPOOLER
+
+
+def stop_spooler() -> None:
+	global _SPOOLER
+	with _SPOOLER_LOCK:
+		spooler, _SPOOLER = _SPOOLER, None
+	if spooler is not None:
+		spooler.stop()
@@ -12,7 +12,9 @@ from pathlib import Path
 project_root = Path(__file__).parent
 sys.path.insert(0, str(project_root))
 
-from restaurant_billing.db import init_db, get_conn, list_menu_items, create_order, list_open_orders, mark_order_paid, get_order_by_invoice
+from restaurant_billing.db import init_db, get_conn, transaction, get_pool_stats, list_menu_items, create_order, list_open_orders, mark_order_paid, get_order_by_invoice
+from restaurant_billing.db import get_orders_by_invoices, iter_orders
+from restaurant_billing.db import OPEN_ORDERS_SQL, ORDERS_BY_DAY_SQL
 from restaurant_billing.auth import create_user, verify_password, user_can, A_MANAGE_USERS, A_MANAGE_MENU, A_CREATE_ORDER, A_CHECKOUT_BILL
 from restaurant_billing.gst import compute_gst_for_order_items
 from restaurant_billing.utils import format_currency_inr
@@ -25,9 +27,41 @@ def test_database_initialization():
     
     try:
         # Initialize database
-        init_db()
-        print("✅ Database initialized successfully")
-        
+        from restaurant_billing.migrations import SCHEMA_VERSION
+        version = init_db()
+        if version != SCHEMA_VERSION or init_db() != SCHEMA_VERSION:
+            print(f"❌ Schema version {version}, expected {SCHEMA_VERSION}")
+            return False
+        print(f"✅ Database initialized successfully - schema v{version}")
+
+        # Upgraded databases continue the default series after the old numeric invoice numbers
+        import sqlite3
+        from restaurant_billing.migrations import _m003_invoice_sequences
+        legacy = sqlite3.connect(":memory:")
+        legacy.execute("CREATE TABLE Orders(order_id INTEGER PRIMARY KEY, invoice_number TEXT)")
+        legacy.executemany("INSERT INTO Orders(invoice_number) VALUES (?)", [("0001",), ("0042",), ("T1-0099",)])
+        _m003_invoice_sequences(legacy)
+        seeded = legacy.execute("SELECT next_value FROM InvoiceSequences WHERE series = 'default'").fetchone()
+        legacy.close()
+        if seeded != (43,):
+            print(f"❌ Default invoice series not seeded from existing numbers: {seeded}")
+            return False
+
+        # Old databases may hold two splits for one slab and day; the newer one is kept
+        from restaurant_billing.migrations import BASELINE_SCHEMA_SQL, _execute_script, _m002_seed_once
+        legacy = sqlite3.connect(":memory:")
+        _execute_script(legacy, BASELINE_SCHEMA_SQL)
+        legacy.executemany(
+            "INSERT INTO GSTSettings(slab_rate, cgst_rate, sgst_rate, applicable_from) VALUES (?, ?, ?, ?)",
+            [(18, 9, 9, "2024-01-01"), (18, 12, 6, "2024-01-01")],
+        )
+        _m002_seed_once(legacy)
+        rates = legacy.execute("SELECT cgst_rate, sgst_rate FROM GSTSettings WHERE slab_rate = 18").fetchall()
+        legacy.close()
+        if rates != [(12, 6)]:
+            print(f"❌ Duplicate GST settings not resolved: {rates}")
+            return False
+
         # Test connection
         with get_conn() as conn:
             cur = conn.execute("SELECT COUNT(*) FROM Users")
@@ -39,6 +73,101 @@ def test_database_initialization():
         print(f"❌ Database initialization failed: {e}")
         return False
 
+def test_connection_pool():
+    """Test pooled connection reuse and transaction rollback"""
+    print("\n🧪 Testing Connection Pool...")
+    
+    try:
+        before = get_pool_stats()
+        with get_conn() as outer:
+            with get_conn() as inner:
+                if inner is not outer:
+                    print("❌ Nested get_conn did not reuse the thread's connection")
+                    return False
+        list_menu_items()
+        after = get_pool_stats()
+        if after["opened"] != before["opened"] and before["opened"] > 0:
+            print(f"❌ Pool opened new connections instead of reusing: {after}")
+            return False
+        print(f"✅ Connections reused - {after}")
+        
+        # A failing transaction must leave nothing behind
+        try:
+            with transaction() as conn:
+                conn.execute("INSERT INTO StateCodes(code, name) VALUES ('ZZ', 'Pool Test')")
+                raise RuntimeError("rollback")
+        except RuntimeError:
+            pass
+        with get_conn() as conn:
+            count = conn.execute("SELECT COUNT(*) FROM StateCodes WHERE code = 'ZZ'").fetchone()[0]
+        if count:
+            print("❌ Transaction was not rolled back")
+            return False
+        print("✅ Transaction rollback working")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Connection pool test failed: {e}")
+        return False
+
+def test_async_db():
+    """Test that blocking DB calls run off the event loop"""
+    print("\n🧪 Testing Async DB Access...")
+    
+    import asyncio
+    import time
+    from restaurant_billing.async_db import AsyncDB
+    
+    async def scenario(adb):
+        ticks = []
+        async def ticker():
+            for _ in range(10):
+                start = time.perf_counter()
+                await asyncio.sleep(0.01)
+                ticks.append(time.perf_counter() - start)
+        menu, _, _ = await asyncio.gather(adb.run(list_menu_items), adb.run(time.sleep, 0.2), ticker())
+        return menu, max(ticks)
+    
+    adb = AsyncDB(workers=2, slow_ms=10000)
+    try:
+        menu, worst_tick = asyncio.run(scenario(adb))
+        if not menu or worst_tick > 0.1:
+            print(f"❌ Event loop stalled ({worst_tick * 1000:.0f} ms) or menu empty")
+            return False
+        stats = adb.stats()
+        if stats["calls"].get("list_menu_items", {}).get("calls") != 1:
+            print(f"❌ Per-call timing not recorded: {stats}")
+            return False
+        print(f"✅ Event loop stayed responsive (worst tick {worst_tick * 1000:.0f} ms), timings: {stats['calls']}")
+        return True
+    except Exception as e:
+        print(f"❌ Async DB test failed: {e}")
+        return False
+    finally:
+        adb.shutdown()
+
+def test_query_plans():
+    """Test that order queries stay on their indexes"""
+    print("\n🧪 Testing Query Plans...")
+    
+    checks = [
+        ("open orders", OPEN_ORDERS_SQL, (), "idx_orders_open"),
+        ("orders by day", ORDERS_BY_DAY_SQL, ("PAID", "2024-01-01", "2024-01-31"), "idx_orders_status_day"),
+        ("invoice lookup", "SELECT * FROM Orders WHERE invoice_number = ?", ("0001",), "idx_orders_invoice_unique"),
+    ]
+    try:
+        with get_conn() as conn:
+            for name, sql, params, index in checks:
+                plan = " | ".join(row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params))
+                if index not in plan or "TEMP B-TREE" in plan:
+                    print(f"❌ {name} query plan regressed: {plan}")
+                    return False
+                print(f"✅ {name}: {plan}")
+        return True
+    except Exception as e:
+        print(f"❌ Query plan test failed: {e}")
+        return False
+
 def test_user_management():
     """Test user creation, authentication, and permissions"""
     print("\n🧪 Testing User Management...")
@@ -153,12 +282,64 @@ def test_gst_calculations():
             print(f"❌ Service charge calculation failed - Expected: {expected_service_charge}, Got: {result['service_charge']}")
             return False
         
+        # Line taxes are rounded once in paise and totals are their exact sum: 3 x 33.33 @ 5% -> 2.50 + 2.50
+        exact = compute_gst_for_order_items({"Odd": {"quantity": 3, "rate": 33.33, "gst_slab": 5.0, "hsn_code": "996331"}})
+        if (exact["cgst"], exact["sgst"], exact["total"]) != (2.5, 2.5, 104.99):
+            print(f"❌ Paise rounding mismatch - Got: {exact}")
+            return False
+        print("✅ Paise-exact line taxes")
+        
+        # Effective-dated rates come from GSTSettings and edits invalidate the cache
+        from restaurant_billing.gst import set_gst_rate, get_rates_for_slab, invalidate_rate_cache
+        set_gst_rate(40.0, 15.0, 25.0, "2099-01-01")
+        try:
+            if get_rates_for_slab(40.0, "2099-06-01") != (15.0, 25.0) or get_rates_for_slab(40.0, "2098-12-31") != (20.0, 20.0):
+                print("❌ Effective-dated GST rates not applied")
+                return False
+            print("✅ Effective-dated GST rates working")
+        finally:
+            with get_conn() as conn:
+                conn.execute("DELETE FROM GSTSettings WHERE slab_rate = 40")
+            invalidate_rate_cache()
+        
         print(f"✅ GST calculation working - Total: {format_currency_inr(result['total'])}")
         return True
     except Exception as e:
         print(f"❌ GST calculation test failed: {e}")
         return False
 
+def test_cart():
+    """Test incremental cart totals against a full recompute"""
+    print("\n🧪 Testing Cart...")
+    
+    try:
+        from restaurant_billing.cart import Cart
+        from restaurant_billing.gst import compute_order_tax
+        
+        cart = Cart(service_charge_percent=5.0)
+        cart.add(1, "Naan", 40.0, 5.0, "996331", 2)
+        cart.add(2, "Naan", 45.5, 12.0, "996332", 1)  # same name, different item
+        cart.add(1, "Naan", 40.0, 5.0, "996331", 1)  # merges into item 1
+        cart.add(3, "Lassi", 33.33, 18.0, "996332", 3)
+        cart.set_quantity(3, 1)
+        cart.remove(2)
+        
+        if [(l.item_id, l.quantity) for l in cart] != [(1, 3), (3, 1)]:
+            print(f"❌ Cart lines wrong: {cart.items()}")
+            return False
+        full = compute_order_tax(cart.items(), service_charge_percent=5.0)
+        if (cart.subtotal, cart.cgst, cart.sgst, cart.service_charge, cart.total) != (full.subtotal, full.cgst, full.sgst, full.service_charge, full.total):
+            print(f"❌ Incremental totals differ from recompute: {cart.totals()} vs {full.as_totals()}")
+            return False
+        if cart.totals()["hsn_breakdown"] != full.as_totals()["hsn_breakdown"]:
+            print("❌ Incremental HSN breakdown differs from recompute")
+            return False
+        print(f"✅ Cart totals match recompute - Total: {format_currency_inr(cart.total / 100)}")
+        return True
+    except Exception as e:
+        print(f"❌ Cart test failed: {e}")
+        return False
+
 def test_order_management():
     """Test order creation and management"""
     print("\n🧪 Testing Order Management...")
@@ -227,6 +408,42 @@ def test_order_management():
             print("❌ Order payment marking failed")
             return False
         
+        # Test the bulk GST audit agrees with the stored totals, and catches a tampered column
+        from restaurant_billing.gst_audit import audit_orders
+        day = order["invoice_date"][:10]
+        def audit_fields():
+            return {m.field for _, chunk in audit_orders(day, day) for m in chunk if m.invoice_number == invoice_number}
+        clean = audit_fields()
+        with get_conn() as conn:
+            conn.execute("UPDATE Orders SET cgst = cgst + 1 WHERE invoice_number = ?", (invoice_number,))
+        if clean or audit_fields() != {"cgst"}:
+            print(f"❌ GST audit mismatch detection failed - clean run: {clean}")
+            return False
+
+        # Archived orders are audited too, and reported against their archive file
+        import sqlite3
+        import tempfile
+        from unittest import mock
+        from restaurant_billing.archive import ARCHIVE_SCHEMA_SQL, ORDER_COLUMNS, ORDER_ITEM_COLUMNS
+        with tempfile.TemporaryDirectory() as arc_dir:
+            arc_path = Path(arc_dir) / "orders_FY9999.db"
+            with get_conn() as conn:
+                order_row = conn.execute(f"SELECT {', '.join(ORDER_COLUMNS)} FROM Orders WHERE invoice_number = ?", (invoice_number,)).fetchone()
+                item_rows = conn.execute(f"SELECT {', '.join(ORDER_ITEM_COLUMNS)} FROM OrderItems WHERE order_id = ?", (order_row[0],)).fetchall()
+            arc = sqlite3.connect(arc_path)
+            for statement in ARCHIVE_SCHEMA_SQL:
+                arc.execute(statement)
+            arc.execute(f"INSERT INTO Orders({', '.join(ORDER_COLUMNS)}) VALUES ({', '.join('?' * len(ORDER_COLUMNS))})", order_row)
+            arc.executemany(f"INSERT INTO OrderItems({', '.join(ORDER_ITEM_COLUMNS)}) VALUES ({', '.join('?' * len(ORDER_ITEM_COLUMNS))})", item_rows)
+            arc.commit()
+            arc.close()
+            with mock.patch("restaurant_billing.archive.archives_for_range", return_value=[("9999", arc_path)]):
+                sources = {m.source for _, chunk in audit_orders(day, day) for m in chunk if m.invoice_number == invoice_number}
+        if sources != {"hot", arc_path.name}:
+            print(f"❌ GST audit did not cover the archive: {sources}")
+            return False
+        print("✅ GST audit working")
+        
         # Clean up
         with get_conn() as conn:
             conn.execute("DELETE FROM Orders WHERE invoice_number = ?", (invoice_number,))
@@ -239,6 +456,44 @@ def test_order_management():
         print(f"❌ Order management test failed: {e}")
         return False
 
+def test_invoice_numbering():
+    """Test that concurrent order creation never reuses an invoice number"""
+    print("\n🧪 Testing Invoice Numbering...")
+    
+    import threading
+    created = []
+    errors = []
+    items = [{"id": 1, "name": "Numbering Test", "rate": 10.0, "gst_slab": 5.0, "hsn_code": "996331", "quantity": 1}]
+    
+    def worker():
+        try:
+            for _ in range(5):
+                created.append(create_order(99, None, None, None, {"subtotal": 10.0, "total": 10.0}, items))
+        except Exception as e:
+            errors.append(e)
+    
+    try:
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        if errors:
+            print(f"❌ Order creation failed under concurrency: {errors[0]}")
+            return False
+        if len(set(created)) != len(created):
+            print(f"❌ Duplicate invoice numbers issued: {sorted(created)}")
+            return False
+        print(f"✅ {len(created)} unique invoice numbers issued concurrently")
+        
+        with get_conn() as conn:
+            conn.executemany("DELETE FROM Orders WHERE invoice_number = ?", [(n,) for n in created])
+        print("✅ Test data cleaned up")
+        return True
+    except Exception as e:
+        print(f"❌ Invoice numbering test failed: {e}")
+        return False
+
 def test_invoice_generation():
     """Test invoice generation"""
     print("\n🧪 Testing Invoice Generation...")
@@ -294,10 +549,211 @@ def test_invoice_generation():
             print("❌ Invoice generation failed - order not found")
             return False
         
+        # Test the per HSN/rate tax summary is stored with the order and printed
+        summary = order.get("tax_summary") or []
+        if [(r["hsn_code"], r["rate"], r["taxable"], r["cgst"], r["sgst"]) for r in summary] != [("996331", 12.0, 200.0, 12.0, 12.0)] or "HSN 996331 @12%" not in invoice_text:
+            print(f"❌ Order tax summary mismatch: {summary}")
+            return False
+        print("✅ Order tax summary stored and printed")
+        
+        # Test the receipt layout fits each paper width and feeds the PDF backend
+        from restaurant_billing.receipt import PAPER_WIDTHS, render_pdf
+        from restaurant_billing.invoice import layout_invoice
+        import tempfile
+        for width in PAPER_WIDTHS.values():
+            laid_out = layout_invoice(order, width)
+            if any(len(line.text) * line.size > width for line in laid_out) or not any(line.text.rstrip().endswith("₹222.00") for line in laid_out):
+                print(f"❌ Receipt layout overflows or misaligns at {width} chars")
+                return False
+        with tempfile.TemporaryDirectory() as tmp:
+            pdf = render_pdf(layout_invoice(order, PAPER_WIDTHS["A4"]), Path(tmp) / "invoice.pdf")
+            if not pdf.read_bytes().startswith(b"%PDF-"):
+                print("❌ Receipt PDF rendering failed")
+                return False
+        print("✅ Receipt layout working for 58mm, 80mm and A4")
+
+        # Test the ESC/POS job is one buffer with inlined styles, native QR and cut, sent in one write
+        from restaurant_billing.receipt import QRCode, escpos_bytes, get_layout, Receipt, Text
+        from restaurant_billing.fake_printer import FakeNetworkPrinter, FilePrinter
+        import socket
+        lines = layout_invoice(order, PAPER_WIDTHS["58mm"]) + get_layout(30).render(Receipt([Text("Scan to pay", align="center"), QRCode("upi://pay?pa=test@upi&am=222.00")]))
+        data = escpos_bytes(lines)
+        fake = FilePrinter()
+        fake._raw(data)
+        if not (data.startswith(b"\x1b@") and data.endswith(b"\x1dVA\x03")) or b"1P0upi://pay" not in data or b" Rs222.00" not in data or fake.writes != 1:
+            print("❌ ESC/POS buffer missing reset, QR, cut or amounts")
+            return False
+        with FakeNetworkPrinter() as lan:
+            with socket.create_connection(lan.address) as conn:
+                conn.sendall(data)
+            if not lan.wait_for(len(data)) or lan.received != data:
+                print("❌ Fake network printer did not receive the job")
+                return False
+        print(f"✅ ESC/POS receipt compiled into one {len(data)}-byte write")
+
+        # Test the logo is rasterised once, cached on disk by content hash and spliced into the buffer
+        from restaurant_billing import raster_cache
+        logo = project_root / "logo.png"
+        if not raster_cache._HAS_PIL:
+            # Without Pillow only prebuilt rasters print; seed one as another terminal would have built it
+            digest = raster_cache._digest(logo)
+            cached = raster_cache._cache_file(digest, 384, 8, 192, 192)
+            cached.parent.mkdir(parents=True, exist_ok=True)
+            cached.write_bytes(b"\x1dv0\x00\x30\x00\x01\x00" + b"\xff" * 48)
+        raster = raster_cache.image_raster(logo, 384, 8, max_width=192, max_height=192)
+        again = raster_cache.image_raster(logo, 384, 8, max_width=192, max_height=192)
+        data = escpos_bytes(lines, header=raster)
+        if not raster.startswith(b"\x1dv0\x00") or again is not raster or data[5:5 + len(raster)] != raster or not list(raster_cache.raster_dir().glob("*.bin")):
+            print("❌ Logo raster not cached or not spliced into the receipt")
+            return False
+        raster_cache.clear_raster_cache()
+        print(f"✅ Logo raster cached ({len(raster)} bytes) and spliced into the receipt")
+        
+        # Test the cached restaurant profile follows edits from this and other connections
+        import sqlite3
+        from restaurant_billing.restaurant_profile import get_restaurant_profile, update_restaurant_profile
+        original = get_restaurant_profile()
+        if get_restaurant_profile() is not original:
+            print("❌ Restaurant profile not cached")
+            return False
+        # Commits to other tables must not reload the profile
+        with transaction() as conn:
+            conn.execute("INSERT INTO StateCodes(code, name) VALUES ('ZY', 'Cache Test')")
+            conn.execute("DELETE FROM StateCodes WHERE code = 'ZY'")
+        if get_restaurant_profile() is not original:
+            print("❌ Restaurant profile reloaded after an unrelated commit")
+            return False
+        other = sqlite3.connect(str(CONFIG.db_path))
+        other.execute("UPDATE Restaurant SET name = 'Renamed Elsewhere'")
+        other.commit()
+        other.close()
+        seen_elsewhere = get_restaurant_profile().name
+        updated = update_restaurant_profile(name=original.name, address="12, Park Street, Kolkata, West Bengal 700016")
+        seller = updated.seller_details()
+        update_restaurant_profile(address=original.address)
+        if seen_elsewhere != "Renamed Elsewhere" or (seller["Loc"], seller["Pin"]) != ("Kolkata", 700016) or get_restaurant_profile() != original:
+            print("❌ Restaurant profile cache not invalidated on edit")
+            return False
+        print("✅ Restaurant profile cache working")
+        
+        # Test bulk regeneration writes per-day archives and resumes without re-rendering
+        import zipfile
+        from restaurant_billing.invoice_regen import regenerate_invoices, day_archive_path
+        with tempfile.TemporaryDirectory() as out_dir:
+            first = regenerate_invoices(Path(out_dir), invoice_numbers=[invoice_number], workers=1)
+            again = regenerate_invoices(Path(out_dir), invoice_numbers=[invoice_number], workers=1)
+            with zipfile.ZipFile(day_archive_path(Path(out_dir), order["invoice_date"][:10])) as zf:
+                archived_text = zf.read(f"{invoice_number}.txt").decode("utf-8")
+            if (first.rendered, again.rendered, again.skipped) != (1, 0, 1) or archived_text != build_invoice_text(order):
+                print("❌ Invoice regeneration/resume mismatch")
+                return False
+        print("✅ Bulk invoice regeneration working")
+        
+        # Test the day-sharded invoice store and the flat-file migration
+        from restaurant_billing.invoice import save_invoice_text, load_invoice_text
+        from restaurant_billing.invoice_store import migrate_flat_files, load_document
+        pack = save_invoice_text(invoice_number)
+        pack_size = pack.stat().st_size
+        # Reprints and print retries save the same text again; the append-only pack must not grow
+        if save_invoice_text(invoice_number) != pack or pack.stat().st_size != pack_size:
+            print("❌ Saving an unchanged invoice appended another copy")
+            return False
+        # Printing stores the same text and lays out the same receipt as the separate calls
+        from restaurant_billing.invoice import invoice_lines, save_invoice_for_printing
+        printed_pack, printed_lines = save_invoice_for_printing(invoice_number, 48)
+        if printed_pack != pack or pack.stat().st_size != pack_size or printed_lines != invoice_lines(invoice_number, 48):
+            print("❌ Invoice saved for printing differs from the stored invoice")
+            return False
+        with tempfile.TemporaryDirectory() as flat_dir:
+            (Path(flat_dir) / f"{invoice_number}_einvoice.json").write_text('{"legacy": true}', encoding="utf-8")
+            (Path(flat_dir) / f"formatted_{invoice_number}.txt").write_text("x", encoding="utf-8")
+            migrated = migrate_flat_files(Path(flat_dir))
+            left = list(Path(flat_dir).iterdir())
+        if load_invoice_text(invoice_number) != build_invoice_text(order) or migrated != (1, 1) or left or load_document(invoice_number, f"{invoice_number}_einvoice.json") != b'{"legacy": true}':
+            print("❌ Invoice store mismatch")
+            return False
+        print("✅ Invoice store and migration working")
+        
+        # Test the bulk e-invoice export: B2B orders over the threshold, validated, streamed as a JSON array
+        import json
+        from restaurant_billing.cart import Cart
+        from restaurant_billing.einvoice_batch import export_einvoice_batch, validate_einvoice
+        big_cart = Cart(service_charge_percent=5.0)
+        big_cart.add(item_id, "Invoice Test Item", 200.0, 12.0, "996331", quantity=250)
+        big_invoice = create_order(
+            table_number=2, customer_name="Bulk Buyer Pvt Ltd", customer_gstin="27ABCDE1234F1Z5", place_of_supply="Maharashtra",
+            totals=big_cart.totals(), items=big_cart.items(), status='PAID'
+        )
+        buyers = {"27ABCDE1234F1Z5": {"Addr1": "5, Linking Road", "Loc": "Mumbai", "Pin": 400050}}
+        with tempfile.TemporaryDirectory() as out_dir:
+            result = export_einvoice_batch(invoice_numbers=[big_invoice, invoice_number], buyers=buyers, out_dir=Path(out_dir))
+            docs = json.loads(result.files[0].read_text(encoding="utf-8")) if result.files else []
+        if (result.written, result.skipped, result.invalid) != (1, 1, 0) or [d["DocDtls"]["No"] for d in docs] != [big_invoice]:
+            print(f"❌ Bulk e-invoice export mismatch: {result}")
+            return False
+        del docs[0]["BuyerDtls"]["Addr1"]
+        if validate_einvoice(docs[0]) != ["$.BuyerDtls.Addr1: required"]:
+            print("❌ E-invoice validation missed a required field")
+            return False
+        print("✅ Bulk e-invoice export and validation working")
+        
+        # Test batch fetch and streaming return the same order with its items
+        batch = get_orders_by_invoices([invoice_number, "NO-SUCH-INVOICE", invoice_number])
+        day = order["invoice_date"][:10]
+        streamed = [o for o in iter_orders(day, day, batch_size=1) if o["invoice_number"] == invoice_number]
+        if list(batch) == [invoice_number] and batch[invoice_number]["items"] == order["items"] and len(streamed) == 1 and streamed[0]["items"] == order["items"]:
+            print("✅ Batch order fetch and streaming working")
+        else:
+            print("❌ Batch order fetch/streaming mismatch")
+            return False
+        
+        # Test the GSTR-1 export lists this B2B invoice with its stored tax
+        import json
+        import tempfile
+        from restaurant_billing.gst_returns import export_gstr1
+        with tempfile.TemporaryDirectory() as out_dir:
+            gstr1 = json.loads(export_gstr1(day[:7], Path(out_dir))["json"].read_text(encoding="utf-8"))
+        b2b = {inv["inum"]: inv for party in gstr1["b2b"] for inv in party["inv"]}
+        if invoice_number not in b2b or b2b[invoice_number]["itms"][0]["itm_det"]["camt"] != 12.0:
+            print("❌ GSTR-1 export missing the B2B invoice")
+            return False
+
+        # An order copied to an archive but not yet deleted from the hot database is counted once
+        import sqlite3
+        from unittest import mock
+        from restaurant_billing.archive import ARCHIVE_SCHEMA_SQL, ORDER_COLUMNS, TAX_SUMMARY_COLUMNS
+        from restaurant_billing.gst_returns import build_gstr3b
+        with tempfile.TemporaryDirectory() as arc_dir:
+            arc_path = Path(arc_dir) / "orders_FY9999.db"
+            with get_conn() as conn:
+                order_row = conn.execute(f"SELECT {', '.join(ORDER_COLUMNS)} FROM Orders WHERE invoice_number = ?", (invoice_number,)).fetchone()
+                summary_rows = conn.execute(f"SELECT {', '.join(TAX_SUMMARY_COLUMNS)} FROM OrderTaxSummary WHERE order_id = ?", (order_row[0],)).fetchall()
+            arc = sqlite3.connect(arc_path)
+            for statement in ARCHIVE_SCHEMA_SQL:
+                arc.execute(statement)
+            arc.execute(f"INSERT INTO Orders({', '.join(ORDER_COLUMNS)}) VALUES ({', '.join('?' * len(ORDER_COLUMNS))})", order_row)
+            arc.executemany(f"INSERT INTO OrderTaxSummary({', '.join(TAX_SUMMARY_COLUMNS)}) VALUES ({', '.join('?' * len(TAX_SUMMARY_COLUMNS))})", summary_rows)
+            arc.commit()
+            arc.close()
+            hot_3b = build_gstr3b(day[:7])
+            with mock.patch("restaurant_billing.archive.archives_for_range", return_value=[("9999", arc_path)]):
+                both_3b = build_gstr3b(day[:7])
+                gstr1 = json.loads(export_gstr1(day[:7], Path(arc_dir))["json"].read_text(encoding="utf-8"))
+                streamed = [o["invoice_number"] for o in iter_orders(day, day)]
+        inums = [inv["inum"] for party in gstr1["b2b"] for inv in party["inv"]]
+        if inums.count(invoice_number) != 1 or both_3b != hot_3b:
+            print("❌ GST returns counted an order present in both the archive and the hot database twice")
+            return False
+        if streamed.count(invoice_number) != 1:
+            print("❌ iter_orders yielded an order present in both the archive and the hot database twice")
+            return False
+        print("✅ GSTR-1 export working")
+        
         # Clean up
         with get_conn() as conn:
-            conn.execute("DELETE FROM Orders WHERE invoice_number = ?", (invoice_number,))
-            conn.execute("DELETE FROM OrderItems WHERE order_id IN (SELECT order_id FROM Orders WHERE invoice_number = ?)", (invoice_number,))
+            for number in (invoice_number, big_invoice):
+                conn.execute("DELETE FROM Orders WHERE invoice_number = ?", (number,))
+                conn.execute("DELETE FROM OrderItems WHERE order_id IN (SELECT order_id FROM Orders WHERE invoice_number = ?)", (number,))
             conn.execute("DELETE FROM MenuItems WHERE id = ?", (item_id,))
         print("✅ Test data cleaned up")
         
@@ -306,6 +762,261 @@ def test_invoice_generation():
         print(f"❌ Invoice generation test failed: {e}")
         return False
 
+def test_print_spooler():
+    """Test that queued print jobs are retried per printer without blocking others"""
+    print("\n🧪 Testing Print Spooler...")
+    
+    import time
+    from restaurant_billing.spooler import PrintSpooler, enqueue_print, list_print_jobs, register_handler
+    
+    calls = []
+    def flaky(printer, payload):
+        calls.append((printer, payload["n"]))
+        if calls.count(("test-offline", 1)) == 1 and printer == "test-offline":
+            raise OSError("printer offline")
+        return True
+    register_handler("test", flaky)
+    
+    spooler = PrintSpooler(poll_seconds=0.05)
+    job_ids = []
+    try:
+        job_ids = [enqueue_print("test", {"n": 1}, printer="test-offline"), enqueue_print("test", {"n": 2}, printer="test-online")]
+        spooler.start()
+        deadline = time.time() + 10
+        while time.time() < deadline:
+            jobs = {j["job_id"]: j for j in list_print_jobs() if j["job_id"] in job_ids}
+            if all(j["status"] == "DONE" for j in jobs.values()):
+                break
+            time.sleep(0.05)
+        offline, online = jobs[job_ids[0]], jobs[job_ids[1]]
+        if offline["status"] != "DONE" or offline["attempts"] != 2 or online["attempts"] != 1:
+            print(f"❌ Jobs not retried as expected: {offline}, {online}")
+            return False
+        if calls.index(("test-online", 2)) > 1:
+            print(f"❌ Offline printer held back the other printer: {calls}")
+            return False
+        print(f"✅ Failed job retried after backoff ({offline['last_error']}), other printer unaffected")
+        
+        # The invoice handler lets the cause through so the job's last_error names it
+        from restaurant_billing.spooler import _print_invoice
+        try:
+            _print_invoice("receipt", {"invoice_number": "NO-SUCH-INVOICE"})
+            print("❌ Invoice print handler reported success for a missing invoice")
+            return False
+        except ValueError as e:
+            print(f"✅ Invoice print failure surfaced: {e}")
+        return True
+    except Exception as e:
+        print(f"❌ Print spooler test failed: {e}")
+        return False
+    finally:
+        spooler.stop()
+        with get_conn() as conn:
+            conn.executemany("DELETE FROM PrintJobs WHERE job_id = ?", [(j,) for j in job_ids])
+
+
+def test_network_printer():
+    """Test that network print jobs share one kept-alive connection and survive a reset"""
+    print("\n🧪 Testing Network Printer Connection...")
+    
+    import threading
+    import time
+    from restaurant_billing.fake_printer import FakeNetworkPrinter
+    from restaurant_billing.printer_connections import PrinterConnection
+    
+    try:
+        lan = FakeNetworkPrinter(port=9100)
+    except OSError:
+        lan = FakeNetworkPrinter()  # 9100 taken on this machine
+    conn = None
+    try:
+        lan.start()
+        conn = PrinterConnection(*lan.address, timeout=2.0)
+        jobs = [b"\x1b@receipt %d\n\x1dVA\x03" % i for i in range(50)]
+        for future in [conn.submit(job) for job in jobs[:25]]:
+            future.result(5)
+        lan.wait_for(sum(map(len, jobs[:25])))
+        lan.drop()  # the printer resets the connection
+        time.sleep(0.1)
+        for job in jobs[25:]:
+            conn.send(job)
+        if not lan.wait_for(sum(map(len, jobs))) or lan.received != b"".join(jobs):
+            print("❌ Jobs lost or interleaved across the reconnect")
+            return False
+        stats = conn.stats()
+        if lan.connections != 2 or stats["reconnects"] != 1 or stats["jobs"] != 50:
+            print(f"❌ Expected one kept-alive connection per reset: {lan.connections} connections, {stats}")
+            return False
+        print(f"✅ 50 jobs over {lan.connections} connections (one reset), avg send {stats['avg_send_ms']} ms")
+
+        # A job that times out while queued is withdrawn, so the spooler's retry does not print it twice
+        gate = threading.Event()
+        write = conn._write
+        def gated_write(data, deadline):
+            if data == b"[slow]":
+                gate.wait(5)
+            write(data, deadline)
+        conn._write = gated_write
+        before = len(lan.received)
+        slow = conn.submit(b"[slow]")
+        try:
+            conn.send(b"[timed out]", timeout=0.05)
+            print("❌ Send behind a stuck job did not time out")
+            return False
+        except TimeoutError:
+            pass
+        gate.set()
+        slow.result(5)
+        conn.send(b"[next]")
+        lan.wait_for(before + len(b"[slow][next]"))
+        time.sleep(0.1)
+        if lan.received[before:] != b"[slow][next]":
+            print(f"❌ Timed-out job still printed: {lan.received[before:]!r}")
+            return False
+        print("✅ Timed-out job withdrawn from the queue")
+
+        # A write cut off partway is not resent on a new connection; that would print the start twice
+        conn._write = write
+        class HalfSocket:
+            def send(self, data):
+                if not hasattr(self, "cut"):
+                    self.cut = True
+                    return 4
+                raise ConnectionResetError("reset mid-job")
+            def sendall(self, data):
+                self.send(data)
+                self.send(data)
+            def close(self):
+                pass
+        conn._sock = HalfSocket()
+        conn._is_alive = lambda sock: True
+        before = len(lan.received)
+        try:
+            conn.send(b"[partial job]")
+            print("❌ A partly sent job was reported as printed")
+            return False
+        except ConnectionResetError:
+            pass
+        del conn._is_alive
+        conn.send(b"[after]")
+        lan.wait_for(before + len(b"[after]"))
+        time.sleep(0.1)
+        if lan.received[before:] != b"[after]":
+            print(f"❌ Partly sent job was resent: {lan.received[before:]!r}")
+            return False
+        print("✅ Partly sent job left to the spooler instead of resent")
+
+        lan.stop()
+        try:
+            conn.send(b"offline", timeout=1.0)
+            print("❌ Send to an offline printer did not fail")
+            return False
+        except OSError:
+            pass
+        if conn.stats()["errors"] < 1:
+            print("❌ Printer errors not counted")
+            return False
+        print("✅ Offline printer reported as an error")
+        return True
+    except Exception as e:
+        print(f"❌ Network printer test failed: {e}")
+        return False
+    finally:
+        if conn is not None:
+            conn.close()
+        lan.stop()
+
+
+def test_kitchen_tickets():
+    """Test KOT routing by category and add-on deltas"""
+    print("\n🧪 Testing Kitchen Order Tickets...")
+    
+    import tempfile
+    import time
+    from restaurant_billing.cart import Cart
+    from restaurant_billing.db import add_order_items
+    from restaurant_billing.kot import KitchenStation, delete_station, save_station, send_kot, set_route
+    from restaurant_billing.spooler import PrintSpooler, list_print_jobs
+    
+    menu = {item["name"]: item for item in list_menu_items()}
+    def cart_items(**quantities):
+        cart = Cart()
+        for name, quantity in quantities.items():
+            item = menu[name.replace("_", " ")]
+            cart.add(item["id"], item["name"], item["price"], item["gst_slab"], item["hsn_code"], quantity)
+        return cart
+    
+    tmp = tempfile.TemporaryDirectory()
+    captures = {name: Path(tmp.name) / f"{name}.bin" for name in ("kitchen", "tandoor", "bar")}
+    spooler = PrintSpooler(poll_seconds=0.05)
+    invoice_number = None
+    kot_jobs = []
+    def wait_printed(job_ids):
+        deadline = time.time() + 10
+        while time.time() < deadline:
+            if all(j["status"] == "DONE" for j in list_print_jobs() if j["job_id"] in job_ids):
+                return True
+            time.sleep(0.05)
+        return False
+    try:
+        for name, path in captures.items():
+            save_station(KitchenStation(name, "escpos_file", device=str(path)))
+        set_route(menu["Paneer Tikka"]["category"], "tandoor")
+        set_route(menu["Lassi"]["category"], "bar")
+        spooler.start()
+        
+        cart = cart_items(Paneer_Tikka=2, Lassi=1, Dal_Tadka=1)
+        invoice_number = create_order(7, None, None, None, cart.totals(), cart.items())
+        jobs = send_kot(invoice_number)
+        kot_jobs.extend(jobs.values())
+        if sorted(jobs) != ["bar", "kitchen", "tandoor"] or not wait_printed(set(jobs.values())):
+            print(f"❌ Tickets not routed to every station: {jobs}")
+            return False
+        if b"2 x Paneer Tikka" not in captures["tandoor"].read_bytes() or b"Lassi" in captures["tandoor"].read_bytes():
+            print("❌ Tandoor ticket has the wrong lines")
+            return False
+        resent = send_kot(invoice_number)
+        kot_jobs.extend(resent.values())
+        if resent:
+            print("❌ Items were sent to the kitchen twice")
+            return False
+        print(f"✅ Order routed to {len(jobs)} stations by category")
+        
+        tandoor_before = captures["tandoor"].read_bytes()
+        if not add_order_items(invoice_number, cart_items(Lassi=2).items()):
+            print("❌ Could not add items to the open order")
+            return False
+        jobs = send_kot(invoice_number)
+        kot_jobs.extend(jobs.values())
+        if list(jobs) != ["bar"] or not wait_printed(set(jobs.values())):
+            print(f"❌ Add-on ticket went to the wrong stations: {jobs}")
+            return False
+        bar = captures["bar"].read_bytes()
+        add_on = bar[bar.rfind(b"KOT BAR"):]
+        if b"ADD-ON" not in add_on or b"2 x Lassi" not in add_on or captures["tandoor"].read_bytes() != tandoor_before:
+            print("❌ Add-on ticket does not carry only the new lines")
+            return False
+        order = get_order_by_invoice(invoice_number)
+        expected = cart_items(Paneer_Tikka=2, Lassi=3, Dal_Tadka=1).totals()["total"]
+        if abs(order["total"] - expected) > 0.001:
+            print(f"❌ Order not re-totalled after add-on: {order['total']} != {expected}")
+            return False
+        print("✅ Add-on printed as a delta ticket and order re-totalled")
+        return True
+    except Exception as e:
+        print(f"❌ Kitchen ticket test failed: {e}")
+        return False
+    finally:
+        spooler.stop()
+        with get_conn() as conn:
+            if invoice_number:
+                conn.execute("DELETE FROM Orders WHERE invoice_number = ?", (invoice_number,))
+            conn.executemany("DELETE FROM PrintJobs WHERE job_id = ?", [(j,) for j in kot_jobs])
+        for name in captures:
+            delete_station(name)
+        tmp.cleanup()
+
+
 def test_configuration():
     """Test configuration and settings"""
     print("\n🧪 Testing Configuration...")
@@ -343,11 +1054,19 @@ def run_all_tests():
     
     tests = [
         ("Database Initialization", test_database_initialization),
+        ("Connection Pool", test_connection_pool),
+        ("Async DB Access", test_async_db),
+        ("Query Plans", test_query_plans),
         ("User Management", test_user_management),
         ("Menu Management", test_menu_management),
         ("GST Calculations", test_gst_calculations),
+        ("Cart", test_cart),
         ("Order Management", test_order_management),
+        ("Invoice Numbering", test_invoice_numbering),
         ("Invoice Generation", test_invoice_generation),
+        ("Print Spooler", test_print_spooler),
+        ("Network Printer", test_network_printer),
+        ("Kitchen Tickets", test_kitchen_tickets),
         ("Configuration", test_configuration)
     ]
     